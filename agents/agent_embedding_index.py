@@ -0,0 +1,303 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from agents.ann_index import BruteForceSearch
+from agents.similarity_threshold import SimilarityThresholdEstimator
+
+logger = logging.getLogger()
+
+INITIAL_CAPACITY = 64
+EMBEDDING_DTYPE = np.float64
+PERSIST_INTERVAL = 300  # seconds
+
+
+class AgentEmbeddingIndex:
+    """
+    Keeps the purpose embeddings of all known agents in one pre-normalized
+    matrix (one row per agent), so a similarity lookup is a single
+    matrix-vector product instead of one cosine call per agent.
+
+    Agents whose purpose embedding is not known yet are kept as pending and
+    embedded lazily on the next lookup. Every insert and removal also feeds
+    the affected row's similarities into a threshold estimator.
+
+    Which rows are scored for a lookup is decided by a pluggable search
+    backend (exact by default, see ``agents.ann_index``). When a persist path
+    is given, the matrix, estimator and backend state are stored there so
+    they can be restored at startup instead of being rebuilt.
+    """
+
+    def __init__(self, threshold_estimator: Optional[SimilarityThresholdEstimator] = None, search_backend: Optional[BruteForceSearch] = None, persist_path: Optional[str] = None):
+        self.threshold_estimator = threshold_estimator or SimilarityThresholdEstimator()
+        self.search_backend = search_backend or BruteForceSearch()
+        self.persist_path = persist_path
+        self._lock = threading.RLock()
+        self._matrix: Optional[np.ndarray] = None
+        self._agents: List[Any] = []
+        self._keys: List[Any] = []
+        self._rows: Dict[Any, int] = {}
+        self._pending: Dict[Any, Any] = {}
+        self._dirty = False
+        self._last_persisted = time.monotonic()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._agents) + len(self._pending)
+
+    def __contains__(self, agent) -> bool:
+        with self._lock:
+            return self._key(agent) in self._rows or self._key(agent) in self._pending
+
+    @property
+    def agents(self) -> List[Any]:
+        """Returns the agents that currently have a row in the matrix."""
+        with self._lock:
+            return [agent for agent in self._agents if agent is not None]
+
+    @property
+    def similarity_threshold(self) -> float:
+        """Returns the maintained similarity threshold of the indexed agents."""
+        return self.threshold_estimator.threshold
+
+    def add(self, agent) -> None:
+        """
+        Adds an agent to the index. Agents without a purpose embedding are
+        deferred until embeddings are resolved. Agents restored from the
+        persisted index are attached to their existing row.
+        """
+        with self._lock:
+            key = self._key(agent)
+            row = self._rows.get(key)
+            if row is not None and self._agents[row] is None:
+                self._agents[row] = agent
+                if agent.purpose_embedding is None:
+                    agent.purpose_embedding = self._matrix[row].copy()
+                return
+
+            if row is not None or key in self._pending:
+                self.remove(agent)
+
+            if agent.purpose_embedding is None:
+                self._pending[key] = agent
+                return
+            self._insert_row(agent)
+
+        self._after_mutation()
+
+    def remove(self, agent) -> None:
+        """Removes an agent from the index by swapping the last row into its slot."""
+        with self._lock:
+            if self._pending.pop(self._key(agent), None) is not None:
+                return
+            row = self._rows.get(self._key(agent))
+            if row is None:
+                return
+            self._remove_row(row)
+
+        self._after_mutation()
+
+    def discard_unattached(self) -> int:
+        """
+        Removes rows restored from the persisted index that no agent has been
+        attached to, e.g. agents deleted since the index was saved.
+
+        :return: Number of removed rows.
+        """
+        with self._lock:
+            stale = [row for row, agent in enumerate(self._agents) if agent is None]
+            for row in reversed(stale):
+                self._remove_row(row)
+
+        if stale:
+            self._after_mutation()
+        return len(stale)
+
+    def clear(self) -> None:
+        """Removes all agents from the index."""
+        with self._lock:
+            self._matrix = None
+            self._agents = []
+            self._keys = []
+            self._rows = {}
+            self._pending = {}
+            self.threshold_estimator.reset()
+
+    def snapshot(self) -> np.ndarray:
+        """Returns a copy of the normalized embedding matrix."""
+        with self._lock:
+            if self._matrix is None:
+                return np.empty((0, 0), dtype=EMBEDDING_DTYPE)
+            return self._matrix[:len(self._agents)].copy()
+
+    def resolve_pending(self, embed_all: Callable[[List[str]], List[np.ndarray]]) -> None:
+        """
+        Computes missing purpose embeddings for pending agents and inserts them.
+
+        :param embed_all: Function returning the embeddings for a list of purposes, in one batch.
+        """
+        with self._lock:
+            pending = list(self._pending.values())
+
+        missing = [agent for agent in pending if agent.purpose_embedding is None]
+        if missing:
+            for agent, embedding in zip(missing, embed_all([agent.purpose for agent in missing])):
+                agent.purpose_embedding = embedding
+
+        with self._lock:
+            for agent in pending:
+                if self._pending.pop(self._key(agent), None) is not None:
+                    self._insert_row(agent)
+
+        if pending:
+            self._after_mutation()
+
+    def search(self, purpose_embedding: np.ndarray) -> Tuple[Optional[Any], float]:
+        """
+        Finds the agent whose purpose embedding is most similar to the given one.
+
+        :param purpose_embedding: The embedding to compare against.
+        :return: Tuple of the closest agent and its cosine similarity.
+        """
+        with self._lock:
+            count = len(self._agents)
+            if not count:
+                return None, -np.inf
+
+            query = self._normalize(purpose_embedding)
+            rows = self.search_backend.candidates(self._matrix, count, query)
+            if rows is None:
+                similarities = self._matrix[:count] @ query
+                best = int(np.argmax(similarities))
+                return self._agents[best], float(similarities[best])
+
+            similarities = self._matrix[rows] @ query
+            best = int(np.argmax(similarities))
+            return self._agents[rows[best]], float(similarities[best])
+
+    def similarities(self, purpose_embedding: np.ndarray) -> np.ndarray:
+        """Returns the cosine similarity of the given embedding to every indexed agent."""
+        with self._lock:
+            if not self._agents:
+                return np.empty(0, dtype=EMBEDDING_DTYPE)
+            return self._matrix[:len(self._agents)] @ self._normalize(purpose_embedding)
+
+    def save(self) -> None:
+        """Writes the index to its persist path, if one is configured."""
+        if not self.persist_path:
+            return
+
+        with self._lock:
+            count = len(self._agents)
+            state = {
+                "keys": np.array([str(key) for key in self._keys], dtype=str),
+                "matrix": self.snapshot().astype(np.float32),
+                **{f"threshold_{name}": value for name, value in self.threshold_estimator.state().items()},
+                **self.search_backend.state(),
+            }
+            self._dirty = False
+            self._last_persisted = time.monotonic()
+
+        temp_path = f"{self.persist_path}.tmp.npz"
+        try:
+            np.savez(temp_path, **state)
+            os.replace(temp_path, self.persist_path)
+            logger.info(f"Saved embedding index with {count} agents to {self.persist_path}.")
+        except OSError as e:
+            logger.exception(f"Error saving embedding index: {e}")
+
+    def save_if_dirty(self) -> None:
+        """Writes the index if it changed since it was last saved."""
+        if self._dirty:
+            self.save()
+
+    def load(self) -> bool:
+        """
+        Restores the index from its persist path. Restored rows stay unattached
+        until the agent with the same id is added.
+
+        :return: True if the index was restored.
+        """
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return False
+
+        try:
+            with np.load(self.persist_path) as data:
+                state = {name: data[name] for name in data.files}
+        except Exception as e:
+            logger.exception(f"Error loading embedding index, rebuilding it: {e}")
+            return False
+
+        with self._lock:
+            keys = [str(key) for key in state["keys"]]
+            self._matrix = None
+            if keys:
+                matrix = state["matrix"]
+                self._matrix = np.zeros((max(INITIAL_CAPACITY, len(keys) * 2), matrix.shape[1]), dtype=EMBEDDING_DTYPE)
+                self._matrix[:len(keys)] = matrix
+            self._agents = [None] * len(keys)
+            self._keys = keys
+            self._rows = {key: row for row, key in enumerate(keys)}
+            self._pending = {}
+            self.threshold_estimator.load_state({
+                name[len("threshold_"):]: value for name, value in state.items() if name.startswith("threshold_")
+            })
+            self.search_backend.load_state(state)
+        logger.info(f"Loaded embedding index with {len(keys)} agents from {self.persist_path}.")
+        return True
+
+    def _insert_row(self, agent) -> None:
+        vector = self._normalize(agent.purpose_embedding)
+        count = len(self._agents)
+
+        if self._matrix is None or self._matrix.shape[1] != vector.shape[0]:
+            if self._matrix is not None and count:
+                raise ValueError(
+                    f"Embedding dimension mismatch: expected {self._matrix.shape[1]}, got {vector.shape[0]}"
+                )
+            self._matrix = np.zeros((INITIAL_CAPACITY, vector.shape[0]), dtype=EMBEDDING_DTYPE)
+        elif count == self._matrix.shape[0]:
+            grown = np.zeros((self._matrix.shape[0] * 2, self._matrix.shape[1]), dtype=EMBEDDING_DTYPE)
+            grown[:count] = self._matrix
+            self._matrix = grown
+
+        self.threshold_estimator.add(self._matrix[:count] @ vector)
+        self._matrix[count] = vector
+        self._agents.append(agent)
+        self._keys.append(self._key(agent))
+        self._rows[self._key(agent)] = count
+        self.search_backend.insert(self._matrix, count + 1)
+
+    def _remove_row(self, row: int) -> None:
+        last = len(self._agents) - 1
+        similarities = np.delete(self._matrix[:last + 1] @ self._matrix[row], row)
+        self.threshold_estimator.remove(similarities)
+        self.search_backend.remove(row, last)
+        del self._rows[self._keys[row]]
+
+        if row != last:
+            self._matrix[row] = self._matrix[last]
+            self._agents[row] = self._agents[last]
+            self._keys[row] = self._keys[last]
+            self._rows[self._keys[row]] = row
+        self._agents.pop()
+        self._keys.pop()
+
+    def _after_mutation(self) -> None:
+        self._dirty = True
+        self.threshold_estimator.schedule_exact_recompute(self.snapshot)
+        if self.persist_path and time.monotonic() - self._last_persisted > PERSIST_INTERVAL:
+            self.save()
+
+    @staticmethod
+    def _key(agent):
+        return getattr(agent, "id", None) or id(agent)
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=EMBEDDING_DTYPE).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
@@ -1,4 +1,5 @@
 import logging
+from integrations.model_routing import EVALUATION_ROUTE
 from integrations.openaiwrapper import OpenAIAPIWrapper
 from prompt_management.prompts import AGENT_EVALUATION_PROMPT
 # Basic logging setup
@@ -19,7 +20,9 @@ class AgentEvaluator:
 
         try:
             formatted_prompt = AGENT_EVALUATION_PROMPT.format(input=input_text, prompt=prompt, output=output)
-            response = self.openai_api.chat_completion(messages=[{"role": "system", "content": formatted_prompt}])
+            response = self.openai_api.chat_completion(
+                messages=[{"role": "system", "content": formatted_prompt}], temperature=0, cache=True, route=EVALUATION_ROUTE
+            )
 
             if "5" in response or "4" in response:
                 return True
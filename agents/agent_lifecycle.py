@@ -1,8 +1,11 @@
 import logging
 from typing import List
 from agents.microagent import MicroAgent
+from integrations.model_routing import PROMPT_ENGINEERING_ROUTE
 from integrations.openaiwrapper import OpenAIAPIWrapper
 from agents.agent_similarity import AgentSimilarity
+from agents.agent_embedding_index import AgentEmbeddingIndex
+from agents.similarity_threshold import SimilarityThresholdEstimator
 from agents.agent_persistence_manager import AgentPersistenceManager
 from numpy import ndarray
 from prompt_management.prompts import (
@@ -17,11 +20,12 @@ DEFAULT_MAX_AGENTS = 2000
 PRIME_AGENT_WEIGHT = 25
 
 class AgentLifecycle:
-    def __init__(self, openai_wrapper: OpenAIAPIWrapper, agent_persistence_manager: AgentPersistenceManager, max_agents: int = DEFAULT_MAX_AGENTS):
+    def __init__(self, openai_wrapper: OpenAIAPIWrapper, agent_persistence_manager: AgentPersistenceManager, max_agents: int = DEFAULT_MAX_AGENTS, exact_similarity_threshold: bool = False, embedding_index: AgentEmbeddingIndex = None):
         self.agents: List[MicroAgent] = []
         self.openai_wrapper = openai_wrapper
         self.agent_persistence = agent_persistence_manager
         self.max_agents = max_agents
+        self.embedding_index = embedding_index or AgentEmbeddingIndex(SimilarityThresholdEstimator(exact_in_background=exact_similarity_threshold))
 
     def stop_all_agents(self) -> None:
         """Stops all agents."""
@@ -35,6 +39,9 @@ class AgentLifecycle:
 
     def cleanup_agents(self):
         """Remove all agents with status stopped = True in an efficient manner."""
+        for agent in self.agents:
+            if agent.stopped:
+                self.embedding_index.remove(agent)
         self.agents = [agent for agent in self.agents if not agent.stopped]
 
     def create_prime_agent(self) -> None:
@@ -43,11 +50,17 @@ class AgentLifecycle:
             PRIME_PROMPT, PRIME_NAME, 0, self, 
             self.openai_wrapper, PRIME_AGENT_WEIGHT, True, True
         )
-        self.agents.append(prime_agent)
+        self.add_agent(prime_agent)
 
     def add_agent(self, agent: MicroAgent) -> None:
         """Adds an agent to the list of agents."""
         self.agents.append(agent)
+        self.embedding_index.add(agent)
+
+    def add_agents(self, agents: List[MicroAgent]) -> None:
+        """Adds several agents to the list of agents."""
+        for agent in agents:
+            self.add_agent(agent)
 
 
 
@@ -66,8 +79,9 @@ class AgentLifecycle:
         Retrieves or creates an agent based on the given purpose.
         Optionally creates a new agent regardless of similarity if force_new is True.
         """
+        purpose_embedding = None
         if not force_new:
-            agent_similarity = AgentSimilarity(self.openai_wrapper, self.agents)
+            agent_similarity = AgentSimilarity(self.openai_wrapper, self.agents, self.embedding_index)
             purpose_embedding = agent_similarity.get_embedding(purpose)
             closest_agent, highest_similarity = agent_similarity.find_closest_agent(purpose_embedding)
             similarity_threshold = agent_similarity.calculate_similarity_threshold()
@@ -76,22 +90,24 @@ class AgentLifecycle:
                 closest_agent.usage_count += 1
                 return closest_agent
 
-        return self._create_and_add_agent(purpose, depth, sample_input, parent_agent=parent_agent)
+        # forced agents race each other and need distinct, sampled prompts
+        return self._create_and_add_agent(purpose, depth, sample_input, parent_agent=parent_agent, purpose_embedding=purpose_embedding, deterministic_prompt=not force_new)
 
-    def _create_and_add_agent(self, purpose: str, depth: int, sample_input: str, parent_agent=None) -> MicroAgent:
+    def _create_and_add_agent(self, purpose: str, depth: int, sample_input: str, parent_agent=None, purpose_embedding: ndarray = None, deterministic_prompt: bool = False) -> MicroAgent:
         """Helper method to create and add a new agent."""
         if len(self.agents) >= self.max_agents:
             self._remove_least_used_agent()
 
-        new_agent = MicroAgent(self._generate_llm_prompt(purpose, sample_input), purpose, depth, self, self.openai_wrapper, parent=parent_agent)
+        new_agent = MicroAgent(self._generate_llm_prompt(purpose, sample_input, deterministic_prompt), purpose, depth, self, self.openai_wrapper, parent=parent_agent, purpose_embedding=purpose_embedding)
         new_agent.usage_count = 1
-        self.agents.append(new_agent)
+        self.add_agent(new_agent)
         return new_agent
 
     def _remove_least_used_agent(self):
         """Removes the least used agent."""
         least_used_agent = min(self.agents, key=lambda agent: agent.usage_count)
         self.agents.remove(least_used_agent)
+        self.embedding_index.remove(least_used_agent)
 
     def save_agent(self, agent: MicroAgent) -> None:
         """Saves the given agent with error handling."""
@@ -104,15 +120,18 @@ class AgentLifecycle:
     
     def remove_agent(self, agent: MicroAgent) -> None:
         """Removes the given agent with error handling."""
+        self.embedding_index.remove(agent)
         try:
             self.agent_persistence.remove_agent(agent)
         except Exception as e:
             logger.exception(f"Error in saving agent: {e}")
             raise
 
-    def _generate_llm_prompt(self, goal: str, sample_input: str) -> str:
+    def _generate_llm_prompt(self, goal: str, sample_input: str, deterministic: bool = False) -> str:
         """
         Generates a prompt for the LLM based on the given goal and sample input.
+        Deterministic prompts are generated at temperature 0 and served from
+        the completion cache when the same goal and input were seen before.
         """
         messages = [
             {"role": "system", "content": PROMPT_ENGINEERING_SYSTEM_PROMPT},
@@ -120,7 +139,9 @@ class AgentLifecycle:
         ]
 
         try:
-            return self.openai_wrapper.chat_completion(messages=messages)
+            if deterministic:
+                return self.openai_wrapper.chat_completion(messages=messages, temperature=0, cache=True, route=PROMPT_ENGINEERING_ROUTE)
+            return self.openai_wrapper.chat_completion(messages=messages, route=PROMPT_ENGINEERING_ROUTE)
         except Exception as e:
             logger.exception(f"Error generating LLM prompt: {e}")
             return ""
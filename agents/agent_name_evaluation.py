@@ -1,5 +1,6 @@
 import logging
-from integrations.memoize import memoize_to_sqlite
+from integrations.memoize import CachePolicy, memoize_to_sqlite
+from integrations.model_routing import NAME_EVALUATION_ROUTE
 from integrations.openaiwrapper import OpenAIAPIWrapper
 from prompt_management.prompts import AGENT_NAME_EVALUATION_PROMPT
 logger = logging.getLogger()
@@ -7,6 +8,8 @@ logger = logging.getLogger()
 #feature flag
 DISABLE_AGENT_NAME_EVALUATION = True
 
+NAME_EVALUATION_CACHE_POLICY = CachePolicy(max_rows=10_000, ttl=30 * 24 * 3600)
+
 class AgentNameEvaluator:
     """
     Evaluates AI name responses using OpenAI's GPT model.
@@ -15,7 +18,7 @@ class AgentNameEvaluator:
     def __init__(self, openai_wrapper: OpenAIAPIWrapper):
         self.openai_api = openai_wrapper
 
-    @memoize_to_sqlite(func_name="evaluate", filename="agent_name_evals.db")
+    @memoize_to_sqlite(func_name="evaluate", filename="agent_name_evals.db", policy=NAME_EVALUATION_CACHE_POLICY)
     def evaluate(self, input_text: str, agent_name: str) -> str:
         """
         Returns evaluation agents response (score from 1-5) 
@@ -25,7 +28,7 @@ class AgentNameEvaluator:
 
         try:
             formatted_prompt = AGENT_NAME_EVALUATION_PROMPT.format(input=input_text, agent_name=agent_name)
-            response = self.openai_api.chat_completion(messages=[{"role": "system", "content": formatted_prompt}])
+            response = self.openai_api.chat_completion(messages=[{"role": "system", "content": formatted_prompt}], route=NAME_EVALUATION_ROUTE)
 
             print (f"Agent name {agent_name} evaluated as {response}")
             print(f"Input was {input_text}")
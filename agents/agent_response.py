@@ -1,9 +1,15 @@
 import logging
-from integrations.openaiwrapper import OpenAIAPIWrapper
+from concurrent.futures import ALL_COMPLETED
+from agents.agent_scheduler import AgentScheduler
+from agents.conversation_transcript import ConversationTranscript, get_transcript_budget
+from integrations.model_routing import REACT_ROUTE
+from integrations.openaiwrapper import OpenAIAPIWrapper, is_truthy
 from agents.parallel_agent_executor import ParallelAgentExecutor
+from agents.response_streaming import agent_invocations, current_token_listener, read_until_action, stream_tokens_to
 from prompt_management.prompts import (
     REACT_STEP_POST, REACT_STEP_PROMPT, REACT_SYSTEM_PROMPT, REACT_PLAN_PROMPT, STATIC_PRE_PROMPT, STATIC_PRE_PROMPT_PRIME, REACT_STEP_PROMPT_PRIME, REACT_STEP_POST_PRIME
 )
+from utils.utility import get_env_variable
 
 logger = logging.getLogger()
 
@@ -15,6 +21,8 @@ class AgentResponse:
         self.agent = agent
         self.creator = creator
         self.depth = depth
+        # streaming is also used whenever a token listener is set for the current thread
+        self.streaming = is_truthy(get_env_variable("MICROAGENTS_STREAMING", "false", False))
 
     def number_to_emoji(self, number):
         """Converts a number to an emoji."""
@@ -26,24 +34,24 @@ class AgentResponse:
     def generate_response(self, input_text, dynamic_prompt, max_depth):
         runtime_context = self._generate_runtime_context(dynamic_prompt)
         system_prompt = self._compose_system_prompt(runtime_context, dynamic_prompt)
-        conversation_accumulator = ""
+        transcript = ConversationTranscript(get_transcript_budget(self.openai_wrapper.router.resolve(REACT_ROUTE).model))
         thought_number = 0
         action_number = 0
         found_new_solution = False
 
         for _ in range(max_depth):
-            react_prompt = self._build_react_prompt(input_text, conversation_accumulator, thought_number, action_number)
+            react_prompt = self._build_react_prompt(input_text, transcript.render(), thought_number, action_number)
             self.agent.update_status(f"🤔 (Iteration {thought_number})")
             response = self._generate_chat_response(system_prompt, react_prompt)
-            conversation_accumulator, thought_number, action_number = self._process_response(
-                response, conversation_accumulator, thought_number, action_number, input_text
+            thought_number, action_number = self._process_response(
+                response, transcript, thought_number, action_number, input_text
             )
 
             if "Query Solved" in response:
                 found_new_solution = True
                 break
 
-        return self._conclude_output(conversation_accumulator, input_text), conversation_accumulator, found_new_solution, thought_number
+        return self._conclude_output(transcript.render(), input_text), transcript.full_text(), found_new_solution, thought_number
 
     def _compose_system_prompt(self, runtime_context, dynamic_prompt):
         pre_prompt = STATIC_PRE_PROMPT_PRIME if self.agent.is_prime else STATIC_PRE_PROMPT
@@ -55,42 +63,49 @@ class AgentResponse:
         return f"Your Purpose: {dynamic_prompt}. Available agents (Feel free to invent new ones if required!): {available_agents_info}."
 
 
-    def _build_react_prompt(self, input_text, conversation_accumulator, thought_number, action_number):
+    def _build_react_prompt(self, input_text, conversation, thought_number, action_number):
         thought_prompt = REACT_STEP_PROMPT_PRIME if self.agent.is_prime else REACT_STEP_PROMPT
         action_prompt = REACT_STEP_POST_PRIME if self.agent.is_prime else REACT_STEP_POST
         return (
             f"Question: {input_text}\n"
-            f"{conversation_accumulator}\n"
+            f"{conversation}\n"
             f"Thought {thought_number}: {thought_prompt}\n"
             f"Action {action_number}: {action_prompt}"
         )
 
     def _generate_chat_response(self, system_prompt, react_prompt):
-        return self.openai_wrapper.chat_completion(
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": react_prompt}
-            ]
-        )
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": react_prompt}
+        ]
+        if not self._is_streaming():
+            return self.openai_wrapper.chat_completion(messages=messages, route=REACT_ROUTE)
+
+        listener = current_token_listener()
+        on_token = (lambda token: listener(token, False)) if listener else None
+        response = read_until_action(self.openai_wrapper.chat_completion_stream(messages=messages, route=REACT_ROUTE), on_token)
+        if listener is not None:
+            listener("\n", False)
+        return response
+
+    def _is_streaming(self):
+        return self.streaming or current_token_listener() is not None
 
-    def _process_response(self, response, conversation_accumulator, thought_number, action_number, input_text):
-        updated_accumulator = self._append_response_to_accumulator(conversation_accumulator, response)
+    def _process_response(self, response, transcript, thought_number, action_number, input_text):
+        transcript.add_response(response)
         thought_number += 1
         action_number += 1
 
         if self._is_python_code(response):
             exec_response = self._execute_python_code(response)
-            updated_accumulator = self._append_execution_response(updated_accumulator, exec_response, thought_number)
+            self._append_execution_response(transcript, exec_response, thought_number)
 
         if self._is_agent_invocation(response):
-            agent_name, updated_input_text = self._parse_agent_info(response)
-            delegated_response, updated_accumulator = self._handle_agent_delegation(agent_name, updated_input_text, updated_accumulator, thought_number, action_number)
-            action_number += 1
+            invocations = self._parse_agent_invocations(response)
+            self._handle_agent_delegations(invocations, transcript, thought_number, action_number)
+            action_number += len(invocations)
 
-        return updated_accumulator, thought_number, action_number
-
-    def _append_response_to_accumulator(self, accumulator, response):
-        return accumulator + f"\n{response}"
+        return thought_number, action_number
 
     def _is_python_code(self, response):
         return "```python" in response
@@ -100,24 +115,71 @@ class AgentResponse:
         self.agent.number_of_code_executions += 1
         return self.code_execution.execute_external_code(response)
 
-    def _append_execution_response(self, accumulator, exec_response, thought_number):
-        return accumulator + f"\nObservation: Executed Python code\nOutput: {exec_response}"
+    def _append_execution_response(self, transcript, exec_response, thought_number):
+        transcript.add_observation(f"Observation: Executed Python code\nOutput: {exec_response}")
 
     def _is_agent_invocation(self, response):
         return "Use Agent[" in response
 
-    def _handle_agent_delegation(self, agent_name, input_text, accumulator, thought_number, action_number):
-        self.agent.update_active_agents(self.agent.purpose, agent_name)
+    def _handle_agent_delegations(self, invocations, transcript, thought_number, action_number):
+        """
+        Delegates to every agent invoked in a step. Independent invocations
+        run concurrently on the agent scheduler, and their observations are
+        added in the order the agents were invoked, numbered as consecutive
+        actions from action_number.
+        """
+        if len(invocations) == 1:
+            agent_name, input_text = invocations[0]
+            self._handle_agent_delegation(agent_name, input_text, transcript, thought_number, action_number)
+            return
+
+        agent_names = ', '.join(agent_name for agent_name, _ in invocations)
+        self.agent.update_status('⏳ ' + agent_names + '..')
+        self.agent.update_active_agents(self.agent.purpose, agent_names)
+        scheduler = AgentScheduler.get_default()
+        # delegates run in a copy of the context, without the token listener. They only wait for
+        # the racers their executors submit at the next depth, so they take no depth slot themselves
+        with stream_tokens_to(None):
+            futures = [scheduler.submit(self._delegate, agent_name, input_text, depth=None) for agent_name, input_text in invocations]
+        scheduler.wait(futures, return_when=ALL_COMPLETED)
+
+        for index, ((agent_name, _), future) in enumerate(zip(invocations, futures)):
+            self._add_delegation_observation(agent_name, future.result(), transcript, thought_number, action_number + index)
+
+    def _handle_agent_delegation(self, agent_name, input_text, transcript, thought_number, action_number):
         self.agent.update_status('⏳ ' + agent_name + '..')
+        self.agent.update_active_agents(self.agent.purpose, agent_name)
+        # only the agent answering the user streams its tokens
+        with stream_tokens_to(None):
+            delegated_response = self._delegate(agent_name, input_text)
+        self._add_delegation_observation(agent_name, delegated_response, transcript, thought_number, action_number)
+        return delegated_response
+
+    def _delegate(self, agent_name, input_text):
+        """Returns the response of the agent with the given purpose. Agents cannot delegate to themselves."""
         if agent_name == self.agent.purpose:
-            accumulator += f"\nOutput {thought_number}: Unable to use Agent {agent_name}\nIt is not possible to call yourself!"
-            return "", accumulator
-        else:
-            parallel_executor = ParallelAgentExecutor(self.manager)
-            delegated_response = parallel_executor.create_and_run_agents(agent_name, self.depth + 1, input_text, self.agent)
+            return ""
+        parallel_executor = ParallelAgentExecutor(self.manager)
+        return parallel_executor.create_and_run_agents(agent_name, self.depth + 1, input_text, self.agent)
 
-            accumulator += f"\nOutput {thought_number}: Delegated task to Agent {agent_name}\nOutput of Agent {action_number}: {delegated_response}"
-            return delegated_response, accumulator
+    def _add_delegation_observation(self, agent_name, delegated_response, transcript, thought_number, action_number):
+        if agent_name == self.agent.purpose:
+            transcript.add_observation(f"Output {thought_number}: Unable to use Agent {agent_name}\nIt is not possible to call yourself!")
+        else:
+            transcript.add_observation(f"Output {thought_number}: Delegated task to Agent {agent_name}\nOutput of Agent {action_number}: {delegated_response}")
+
+    def _parse_agent_invocations(self, response):
+        """
+        Returns the agent name and input of every distinct agent invocation
+        in the action of a step. An invocation missing its closing bracket
+        is read up to the end of the step.
+        """
+        invocations = []
+        for invocation in agent_invocations(response):
+            agent_info = self._parse_agent_info(invocation)
+            if agent_info not in invocations:
+                invocations.append(agent_info)
+        return invocations or [self._parse_agent_info(response)]
 
     def _parse_agent_info(self, response):
         agent_info = response.split('Use Agent[')[1].split(']')[0]
@@ -133,9 +195,17 @@ class AgentResponse:
         react_prompt += f"\nThe original question / task was: {input_text}\n"
         react_prompt += f"\nUse beautiful markdown formatting in your output, e.g. include images using ![Drag Racing](https://example.com/Dragster.jpg)\n"
         self.agent.update_status('🧐 Reviewing..')
-        return self.openai_wrapper.chat_completion(
-            messages=[
-                {"role": "system", "content": REACT_SYSTEM_PROMPT},
-                {"role": "user", "content": react_prompt}
-            ]
-        )
\ No newline at end of file
+        messages = [
+            {"role": "system", "content": REACT_SYSTEM_PROMPT},
+            {"role": "user", "content": react_prompt}
+        ]
+        if not self._is_streaming():
+            return self.openai_wrapper.chat_completion(messages=messages, route=REACT_ROUTE)
+
+        listener = current_token_listener()
+        output = ""
+        for token in self.openai_wrapper.chat_completion_stream(messages=messages, route=REACT_ROUTE):
+            output += token
+            if listener is not None:
+                listener(token, True)
+        return output.strip()
\ No newline at end of file
@@ -0,0 +1,223 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future
+from typing import Dict, Iterable, Optional, Set, Tuple
+from utils.utility import get_env_variable
+
+logger = logging.getLogger()
+
+DEFAULT_MAX_WORKERS = 8
+
+
+class ScheduledTask:
+    """A queued call, run in the context it was submitted from."""
+
+    def __init__(self, fn, args, depth: Optional[int]):
+        self.fn = fn
+        self.args = args
+        self.depth = depth
+        self.context = contextvars.copy_context()
+        self.future = Future()
+        self.queued_at = time.monotonic()
+
+    def run(self) -> None:
+        if not self.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = self.context.run(self.fn, *self.args)
+        except Exception as e:
+            self.future.set_exception(e)
+        else:
+            self.future.set_result(result)
+
+
+class AgentScheduler:
+    """
+    Process-wide bounded pool running agents for every ParallelAgentExecutor,
+    so nested delegation cannot start threads and LLM calls without limit.
+
+    Tasks are run in submission order, except that tasks of a depth already
+    running its limit of tasks wait for a slot. A caller waiting for its own
+    tasks runs them itself when no worker is free (caller-runs). Tasks that
+    only wait for agents of a depth, rather than running one, are submitted
+    without a depth so they never hold the slots their agents need.
+
+    The pool size is read from MICROAGENTS_MAX_WORKERS and the per-depth
+    limits from MICROAGENTS_DEPTH_LIMITS, a JSON object such as {"3": 2}.
+    Depths without a limit are only bounded by the pool.
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, depth_limits: Optional[Dict[int, int]] = None):
+        self.max_workers = max_workers
+        self.depth_limits = depth_limits or {}
+        self._condition = threading.Condition()
+        self._queue = deque()
+        self._workers = 0
+        self._idle_workers = 0
+        self._running_by_depth: Dict[int, int] = {}
+        self._submitted = 0
+        self._completed = 0
+        self._cancelled = 0
+        self._caller_runs = 0
+        self._max_queue_length = 0
+        self._total_queue_wait = 0.0
+        self._max_queue_wait = 0.0
+
+    @classmethod
+    def get_default(cls) -> "AgentScheduler":
+        """Returns the process-wide scheduler configured from the environment."""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls.from_environment()
+            return cls._default
+
+    @classmethod
+    def from_environment(cls) -> "AgentScheduler":
+        max_workers = get_env_variable("MICROAGENTS_MAX_WORKERS", None, False)
+        depth_limits = get_env_variable("MICROAGENTS_DEPTH_LIMITS", None, False)
+        return cls(
+            int(max_workers) if max_workers else DEFAULT_MAX_WORKERS,
+            {int(depth): int(limit) for depth, limit in json.loads(depth_limits).items()} if depth_limits else None
+        )
+
+    def submit(self, fn, *args, depth: Optional[int] = 0) -> Future:
+        """
+        Queues fn(*args) to run on the pool in a copy of the current context.
+
+        :param depth: Delegation depth of the agent the call runs, for the per-depth limits. None takes no depth slot.
+        :return: Future of the call's result. Cancelling it drops the call if it has not started.
+        """
+        task = ScheduledTask(fn, args, depth)
+        task.future.add_done_callback(self._notify)
+        with self._condition:
+            self._queue.append(task)
+            self._submitted += 1
+            self._max_queue_length = max(self._max_queue_length, len(self._queue))
+            if len(self._queue) > self._idle_workers and self._workers < self.max_workers:
+                self._workers += 1
+                self._idle_workers += 1
+                threading.Thread(target=self._work, name=f"agent-worker-{self._workers}", daemon=True).start()
+            self._condition.notify_all()
+        return task.future
+
+    def wait(self, futures: Iterable[Future], timeout: Optional[float] = None, return_when: str = FIRST_COMPLETED) -> Tuple[Set[Future], Set[Future]]:
+        """
+        Like concurrent.futures.wait, but runs the caller's own queued tasks
+        in the calling thread while every worker is busy. A task run this way
+        is not interrupted by the timeout.
+        """
+        futures = set(futures)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._condition:
+                task = None
+                while task is None:
+                    done = {future for future in futures if future.done()}
+                    if done == futures or (done and return_when == FIRST_COMPLETED):
+                        return done, futures - done
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return done, futures - done
+                    if self._idle_workers == 0:
+                        task = self._take_task(lambda queued: queued.future in futures)
+                    if task is None:
+                        self._condition.wait(remaining)
+                self._caller_runs += 1
+            self._run(task)
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until no task is queued or running, e.g. for cancelled racers
+        to stop before the resources they use are torn down.
+
+        :return: False if tasks were still outstanding after the timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while any(not task.future.cancelled() for task in self._queue) or any(self._running_by_depth.values()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def stats(self) -> dict:
+        """Returns queue and pool metrics."""
+        with self._condition:
+            started = self._submitted - len(self._queue) - self._cancelled
+            return {
+                "workers": self._workers,
+                "max_workers": self.max_workers,
+                "busy_workers": self._workers - self._idle_workers,
+                "queued": len(self._queue),
+                "max_queue_length": self._max_queue_length,
+                "running_by_depth": dict(self._running_by_depth),
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "cancelled": self._cancelled,
+                "caller_runs": self._caller_runs,
+                "mean_queue_wait": self._total_queue_wait / started if started else 0.0,
+                "max_queue_wait": self._max_queue_wait,
+            }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (
+            f"{stats['completed']}/{stats['submitted']} agent tasks completed on {stats['workers']} workers, "
+            f"{stats['caller_runs']} run by waiting callers, up to {stats['max_queue_length']} queued, "
+            f"mean queue wait {stats['mean_queue_wait']:.2f}s"
+        )
+
+    def _notify(self, _future) -> None:
+        with self._condition:
+            self._condition.notify_all()
+
+    def _has_capacity(self, depth: Optional[int]) -> bool:
+        if depth is None:
+            return True
+        limit = self.depth_limits.get(depth)
+        return limit is None or self._running_by_depth.get(depth, 0) < limit
+
+    def _take_task(self, accept=lambda task: True) -> Optional[ScheduledTask]:
+        """Dequeues the oldest accepted task whose depth has a free slot. Needs the lock."""
+        for task in list(self._queue):
+            if task.future.cancelled():
+                self._queue.remove(task)
+                self._cancelled += 1
+            elif accept(task) and self._has_capacity(task.depth):
+                self._queue.remove(task)
+                wait = time.monotonic() - task.queued_at
+                self._total_queue_wait += wait
+                self._max_queue_wait = max(self._max_queue_wait, wait)
+                self._running_by_depth[task.depth] = self._running_by_depth.get(task.depth, 0) + 1
+                return task
+        return None
+
+    def _run(self, task: ScheduledTask) -> None:
+        try:
+            task.run()
+        finally:
+            with self._condition:
+                self._running_by_depth[task.depth] -= 1
+                self._completed += 1
+                self._condition.notify_all()
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                task = self._take_task()
+                while task is None:
+                    self._condition.wait()
+                    task = self._take_task()
+                self._idle_workers -= 1
+            self._run(task)
+            with self._condition:
+                self._idle_workers += 1
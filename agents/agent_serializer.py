@@ -1,6 +1,7 @@
 import json
 import numpy as np
 from agents.microagent import MicroAgent
+from integrations.usage_tracking import UsageTotals
 
 class AgentSerializer:
     @staticmethod
@@ -26,6 +27,7 @@ class AgentSerializer:
             "evolve_count": agent.evolve_count,
             "number_of_code_executions": agent.number_of_code_executions,
             "last_input": agent.last_input,
+            "usage": agent.usage.to_dict(),
         }
 
     @staticmethod
@@ -55,4 +57,5 @@ class AgentSerializer:
         agent.evolve_count = data.get("evolve_count", 0)
         agent.number_of_code_executions = data.get("number_of_code_executions", 0)
         agent.last_input = data.get("last_input", "")
+        agent.usage = UsageTotals.from_dict(data.get("usage", {}))
         return agent
\ No newline at end of file
@@ -2,7 +2,7 @@ import logging
 
 import numpy as np
 from typing import List, Tuple, Optional
-from sklearn.metrics.pairwise import cosine_similarity
+from agents.agent_embedding_index import AgentEmbeddingIndex
 from integrations.openaiwrapper import OpenAIAPIWrapper
 
 logger = logging.getLogger()
@@ -13,15 +13,17 @@ class Agent:
         self.purpose_embedding=None
 
 class AgentSimilarity:
-    def __init__(self, openai_wrapper: OpenAIAPIWrapper, agents: List[Agent]):
+    def __init__(self, openai_wrapper: OpenAIAPIWrapper, agents: List[Agent], index: Optional[AgentEmbeddingIndex] = None):
         """
         Initializes the AgentSimilarity object.
 
         :param openai_wrapper: Instance of OpenAIAPIWrapper to interact with OpenAI API.
         :param agents: List of Agent objects.
+        :param index: Embedding index maintained for the agents. If omitted, a temporary one is built per lookup.
         """
         self.openai_wrapper = openai_wrapper
         self.agents = agents
+        self.index = index
 
     def get_embedding(self, text: str) -> np.ndarray:
         """
@@ -41,26 +43,30 @@ class AgentSimilarity:
             logger.exception(f"Error retrieving embedding: {e}")
             raise ValueError(f"Error retrieving embedding: {e}")
 
+    def get_embeddings(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Retrieves the embeddings for several texts in batched requests.
+
+        :param texts: Texts to get embeddings for.
+        :return: Embeddings as numpy arrays, in order.
+        """
+        try:
+            return [np.array(response['data'][0]['embedding']) for response in self.openai_wrapper.get_embeddings(texts)]
+        except Exception as e:
+            logger.exception(f"Error retrieving embeddings: {e}")
+            raise ValueError(f"Error retrieving embeddings: {e}")
 
     def calculate_similarity_threshold(self) -> float:
         """
-        Calculates the 98th percentile of the similarity threshold across all agents.
+        Returns the 98th percentile of the pairwise similarities across all agents.
+        The percentile is maintained incrementally by the embedding index.
 
         :return: 98th percentile of similarity threshold.
         """
         try:
-            embeddings=[]
-            for agent in self.agents:
-                if agent.purpose_embedding is None:
-                   agent.purpose_embedding = self.get_embedding(agent.purpose)
-
-                embeddings.append(agent.purpose_embedding)
-
-            if len(embeddings) < 250:
-                return 0.999
-
-            similarities = [cosine_similarity([e1], [e2])[0][0] for i, e1 in enumerate(embeddings) for e2 in embeddings[i+1:]]
-            return np.percentile(similarities, 98) if similarities else 0.999
+            index = self._get_index()
+            index.resolve_pending(self.get_embeddings)
+            return index.similarity_threshold
         except Exception as e:
             logger.exception(f"Error calculating similarity threshold: {e}")
             raise ValueError(f"Error calculating similarity threshold: {e}")
@@ -73,21 +79,20 @@ class AgentSimilarity:
         :param purpose_embedding: The embedding of the purpose to find the closest agent for.
         :return: Tuple of the closest agent and the highest similarity score.
         """
-        closest_agent: Optional[Agent] = None
-        highest_similarity: float = -np.inf
-
         try:
-            for agent in self.agents:
-                if agent.purpose_embedding is None:
-                   agent.purpose_embedding = self.get_embedding(agent.purpose)
-
-                similarity = cosine_similarity([agent.purpose_embedding], [purpose_embedding])[0][0]
-
-                if similarity > highest_similarity:
-                    highest_similarity = similarity
-                    closest_agent = agent
-
-            return closest_agent, highest_similarity
+            index = self._get_index()
+            index.resolve_pending(self.get_embeddings)
+            return index.search(purpose_embedding)
         except Exception as e:
             logger.exception(f"Error finding closest agent: {e}")
             raise ValueError(f"Error finding closest agent: {e}")
+
+    def _get_index(self) -> AgentEmbeddingIndex:
+        """Returns the maintained index, or builds a temporary one from the agent list."""
+        if self.index is not None:
+            return self.index
+
+        index = AgentEmbeddingIndex()
+        for agent in self.agents:
+            index.add(agent)
+        return index
@@ -0,0 +1,154 @@
+import logging
+
+import numpy as np
+from typing import Dict, Optional
+
+logger = logging.getLogger()
+
+DEFAULT_NPROBE = 8
+MIN_TRAIN_SIZE = 1024
+KMEANS_ITERATIONS = 5
+KMEANS_SAMPLES_PER_LIST = 32
+RETRAIN_GROWTH_FACTOR = 4
+
+
+class BruteForceSearch:
+    """
+    Search backend that scores every indexed row. Exact, and the default for
+    registries up to a few thousand agents.
+    """
+
+    name = "brute"
+
+    def insert(self, matrix: np.ndarray, count: int) -> None:
+        """Called after row ``count - 1`` of the matrix has been written."""
+
+    def remove(self, row: int, last: int) -> None:
+        """Called when ``row`` is removed and the ``last`` row is moved into its slot."""
+
+    def candidates(self, matrix: np.ndarray, count: int, query: np.ndarray) -> Optional[np.ndarray]:
+        """Returns the rows to score for the query, or None to score all rows."""
+        return None
+
+    def state(self) -> Dict[str, np.ndarray]:
+        """Returns the arrays needed to restore the backend."""
+        return {}
+
+    def load_state(self, state: Dict[str, np.ndarray]) -> None:
+        """Restores the backend from arrays returned by ``state``."""
+
+
+class IVFFlatSearch(BruteForceSearch):
+    """
+    Inverted-file search backend. Rows are assigned to the nearest of
+    ``nlist`` centroids trained with spherical k-means; a lookup only scores
+    the rows of the ``nprobe`` closest lists. Raising ``nprobe`` trades
+    latency for recall, ``nprobe >= nlist`` is exact.
+
+    Until ``min_train_size`` rows exist, and whenever the registry has grown
+    by ``RETRAIN_GROWTH_FACTOR`` since the last training, the centroids are
+    (re)trained from the current rows.
+    """
+
+    name = "ivf"
+
+    def __init__(self, nprobe: int = DEFAULT_NPROBE, nlist: Optional[int] = None, min_train_size: int = MIN_TRAIN_SIZE, seed: int = 0):
+        self.nprobe = nprobe
+        self.nlist = nlist
+        self.min_train_size = min_train_size
+        self._rng = np.random.default_rng(seed)
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._retrain_at = min_train_size
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    def insert(self, matrix: np.ndarray, count: int) -> None:
+        if count >= self._retrain_at:
+            self.train(matrix[:count])
+            return
+
+        if self._centroids is not None:
+            self._ensure_capacity(count)
+            self._assignments[count - 1] = int(np.argmax(self._centroids @ matrix[count - 1]))
+
+    def remove(self, row: int, last: int) -> None:
+        if self._centroids is not None and row != last:
+            self._assignments[row] = self._assignments[last]
+
+    def candidates(self, matrix: np.ndarray, count: int, query: np.ndarray) -> Optional[np.ndarray]:
+        if self._centroids is None or self.nprobe >= len(self._centroids):
+            return None
+
+        probes = np.argpartition(-(self._centroids @ query), self.nprobe)[:self.nprobe]
+        rows = np.flatnonzero(np.isin(self._assignments[:count], probes))
+        return rows if len(rows) else None
+
+    def train(self, vectors: np.ndarray) -> None:
+        """Trains the centroids on the given normalized rows and reassigns all of them."""
+        count = len(vectors)
+        nlist = self.nlist or max(1, int(np.sqrt(count)))
+        nlist = min(nlist, count)
+
+        sample_size = min(count, nlist * KMEANS_SAMPLES_PER_LIST)
+        sample = vectors[self._rng.choice(count, sample_size, replace=False)]
+        centroids = sample[self._rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(KMEANS_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for list_id in range(nlist):
+                members = sample[labels == list_id]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    if norm > 0:
+                        centroids[list_id] = centroid / norm
+
+        self._centroids = centroids
+        self._assignments = np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+        self._retrain_at = count * RETRAIN_GROWTH_FACTOR
+        logger.info(f"Trained IVF index with {nlist} lists on {count} agents.")
+
+    def state(self) -> Dict[str, np.ndarray]:
+        if self._centroids is None:
+            return {"ivf_retrain_at": np.array(self._retrain_at)}
+        return {
+            "ivf_centroids": self._centroids,
+            "ivf_assignments": self._assignments,
+            "ivf_retrain_at": np.array(self._retrain_at),
+        }
+
+    def load_state(self, state: Dict[str, np.ndarray]) -> None:
+        if "ivf_centroids" in state:
+            self._centroids = np.array(state["ivf_centroids"])
+            self._assignments = np.array(state["ivf_assignments"], dtype=np.int32)
+        if "ivf_retrain_at" in state:
+            self._retrain_at = int(state["ivf_retrain_at"])
+
+    def _ensure_capacity(self, count: int) -> None:
+        if len(self._assignments) < count:
+            grown = np.zeros(max(count, len(self._assignments) * 2), dtype=np.int32)
+            grown[:len(self._assignments)] = self._assignments
+            self._assignments = grown
+
+
+SEARCH_BACKENDS = {
+    BruteForceSearch.name: BruteForceSearch,
+    IVFFlatSearch.name: IVFFlatSearch,
+}
+
+
+def create_search_backend(name: str = BruteForceSearch.name, nprobe: int = DEFAULT_NPROBE) -> BruteForceSearch:
+    """
+    Creates a search backend by name.
+
+    :param name: "brute" for exact search or "ivf" for the inverted-file index.
+    :param nprobe: Number of lists probed per lookup by the IVF backend.
+    """
+    if name not in SEARCH_BACKENDS:
+        raise ValueError(f"Unknown search backend '{name}'. Choose one of: {', '.join(SEARCH_BACKENDS)}")
+    if name == IVFFlatSearch.name:
+        return IVFFlatSearch(nprobe=nprobe)
+    return SEARCH_BACKENDS[name]()
@@ -0,0 +1,126 @@
+import json
+import logging
+
+from typing import Dict, List, Optional
+
+from integrations.rate_limiter import estimate_tokens
+from utils.utility import get_env_variable
+
+logger = logging.getLogger()
+
+RESPONSE = "response"
+OBSERVATION = "observation"
+
+# tokens of the ReAct transcript sent per request; MICROAGENTS_TRANSCRIPT_BUDGETS overrides or extends it
+DEFAULT_TRANSCRIPT_BUDGETS: Dict[str, int] = {
+    "gpt-4-1106-preview": 12000,
+    "gpt-4-turbo": 12000,
+    "gpt-4": 4000,
+    "gpt-4-32k": 16000,
+    "gpt-3.5-turbo": 8000,
+}
+DEFAULT_TRANSCRIPT_BUDGET = 6000
+DEFAULT_RECENT_STEPS = 2
+ELIDED_PREVIEW_CHARACTERS = 300
+
+
+def get_transcript_budget(model: str) -> int:
+    """
+    Returns the token budget of a transcript sent to model.
+    MICROAGENTS_TRANSCRIPT_BUDGETS holds a JSON object mapping model or
+    deployment names to tokens, MICROAGENTS_TRANSCRIPT_BUDGET the budget
+    of models missing from the table.
+    """
+    budgets = dict(DEFAULT_TRANSCRIPT_BUDGETS)
+    overrides = get_env_variable("MICROAGENTS_TRANSCRIPT_BUDGETS", None, False)
+    if overrides:
+        budgets.update({name: int(tokens) for name, tokens in json.loads(overrides).items()})
+    default = int(get_env_variable("MICROAGENTS_TRANSCRIPT_BUDGET", DEFAULT_TRANSCRIPT_BUDGET, False))
+    return budgets.get(model, default)
+
+
+class TranscriptSegment:
+    """A response or observation of a ReAct step with its token count."""
+
+    def __init__(self, kind: str, step: int, text: str):
+        self.kind = kind
+        self.step = step
+        self.text = text
+        self.tokens = estimate_tokens(text)
+        if len(text) > ELIDED_PREVIEW_CHARACTERS:
+            self.elided = f"{text[:ELIDED_PREVIEW_CHARACTERS]} [... {self.tokens} tokens elided]"
+        else:
+            self.elided = text
+        self.elided_tokens = estimate_tokens(self.elided)
+
+
+class ConversationTranscript:
+    """
+    The responses and observations of a ReAct loop. Rendering keeps the
+    transcript within a token budget: observations of older steps are
+    elided to a preview first, then older responses, and the oldest steps
+    are omitted if that is still not enough. The most recent steps are
+    always kept verbatim. Token counts are computed once per segment, so
+    rendering does not re-count the whole transcript.
+    """
+
+    def __init__(self, budget: int = DEFAULT_TRANSCRIPT_BUDGET, recent_steps: int = DEFAULT_RECENT_STEPS):
+        """
+        :param budget: Maximum tokens of a rendered transcript.
+        :param recent_steps: Number of most recent steps that are never shortened.
+        """
+        self.budget = budget
+        self.recent_steps = recent_steps
+        self.segments: List[TranscriptSegment] = []
+        self.steps = 0
+        self.tokens = 0
+
+    def add_response(self, response: str) -> None:
+        """Starts a new step with the model's response."""
+        self.steps += 1
+        self._add(TranscriptSegment(RESPONSE, self.steps, f"\n{response}"))
+
+    def add_observation(self, observation: str) -> None:
+        """Adds the output of an action to the current step."""
+        self._add(TranscriptSegment(OBSERVATION, self.steps, f"\n{observation}"))
+
+    def _add(self, segment: TranscriptSegment) -> None:
+        self.segments.append(segment)
+        self.tokens += segment.tokens
+
+    def full_text(self) -> str:
+        """The transcript without any elision."""
+        return "".join(segment.text for segment in self.segments)
+
+    def render(self, budget: Optional[int] = None) -> str:
+        """Returns the transcript shortened to at most budget tokens, or to its recent steps if those exceed it."""
+        budget = self.budget if budget is None else budget
+        if self.tokens <= budget:
+            return self.full_text()
+
+        texts = [segment.text for segment in self.segments]
+        tokens = [segment.tokens for segment in self.segments]
+        total = self.tokens
+        older = [index for index, segment in enumerate(self.segments) if segment.step <= self.steps - self.recent_steps]
+
+        for kind in (OBSERVATION, RESPONSE):
+            for index in older:
+                if total <= budget:
+                    break
+                segment = self.segments[index]
+                if segment.kind == kind:
+                    total -= tokens[index] - segment.elided_tokens
+                    texts[index], tokens[index] = segment.elided, segment.elided_tokens
+
+        omitted_steps = set()
+        for index in older:
+            if total <= budget:
+                break
+            total -= tokens[index]
+            texts[index] = ""
+            omitted_steps.add(self.segments[index].step)
+
+        if omitted_steps:
+            texts.insert(0, f"\n[{len(omitted_steps)} earlier steps omitted]")
+        logger.debug(f"Rendered transcript of {self.tokens} tokens in {total} tokens (budget {budget})")
+        return "".join(texts)
@@ -1,6 +1,9 @@
 import logging
+import threading
 import uuid
+from integrations.cancellation import cancellation_scope, check_cancelled
 from integrations.openaiwrapper import OpenAIAPIWrapper
+from integrations.usage_tracking import UsageTotals, track_agent
 from agents.agent_evaluation import AgentEvaluator
 from agents.agent_response import AgentResponse
 from agents.agent_similarity import AgentSimilarity
@@ -32,6 +35,7 @@ class MicroAgent:
         self.openai_wrapper = openai_wrapper
         self.evolve_count = 0
         self.number_of_code_executions = 0 
+        self.usage = UsageTotals()
         self.current_status = None
         self.active_agents = {} 
         self.last_input = ""
@@ -40,6 +44,9 @@ class MicroAgent:
         self.stopped = False
         self.is_prime = is_prime
         self.stop_execution = False
+        self.cancellation = None
+        # serializes becoming a working agent with being stopped or deleted
+        self._state_lock = threading.Lock()
 
         if parent:
             self.parent_id = parent.id if parent else None
@@ -62,7 +69,7 @@ class MicroAgent:
         self.agent_evaluator = AgentEvaluator(self.openai_wrapper)
         self.code_executor = CodeExecution()
         self.agent_responder = AgentResponse(self.openai_wrapper, self.agent_lifecycle, self.code_executor, self, agent_lifecycle, depth)
-        self.agent_similarity = AgentSimilarity(self.openai_wrapper, self.agent_lifecycle.agents)
+        self.agent_similarity = AgentSimilarity(self.openai_wrapper, self.agent_lifecycle.agents, self.agent_lifecycle.embedding_index)
         self.prompt_evolver = PromptEvolution(self.openai_wrapper, self.agent_lifecycle)
         self.response_extractor = ResponseExtraction(self.openai_wrapper)
         self.response_handler = ResponseHandler(self)
@@ -82,9 +89,16 @@ class MicroAgent:
         logger.info(f"Active agents updated: {self.active_agents}")
 
     def set_agent_as_working(self):
-        """Set the agent as a working agent."""
-        self.working_agent = True
-        self.agent_lifecycle.save_agent(self)
+        """
+        Set the agent as a working agent. Raises AgentStoppedException or
+        RequestCancelled instead if the agent was stopped, deleted or
+        cancelled, e.g. while it was being evaluated.
+        """
+        with self._state_lock:
+            self.check_for_stopped()
+            check_cancelled()
+            self.working_agent = True
+            self.agent_lifecycle.save_agent(self)
         logger.info(f"Agent {self.purpose} set as working agent.")
 
     def get_children(self):
@@ -96,10 +110,12 @@ class MicroAgent:
 
     def set_agent_deleted(self): 
         """Set the agent as deleted."""
-        self.working_agent = False
-        self.current_status = "❌ Deleted"
-        self.stopped = True
-        self.stop_execution = True
+        with self._state_lock:
+            self.working_agent = False
+            self.current_status = "❌ Deleted"
+            self.stopped = True
+            self.stop_execution = True
+        self.cancel_requests()
         self.agent_lifecycle.remove_agent(self)
         logger.info(f"Agent {self.purpose} set as deleted.")
 
@@ -113,15 +129,27 @@ class MicroAgent:
 
     def respond(self, input_text, evolve_count=0):
         """
-        Generate a response to the given input text.
+        Generate a response to the given input text. The API usage of the
+        response is added to the agent's usage totals. Stopping the agent
+        cancels the API calls of the response, including those of the
+        agents it delegates to.
         """
-        return self.response_handler.respond(input_text, evolve_count)
+        with track_agent(self.usage), cancellation_scope() as token:
+            self.cancellation = token
+            return self.response_handler.respond(input_text, evolve_count)
     
     def stop(self): 
         """Stop the agent."""
-        self.stop_execution = True
-        if not self.is_working_agent():
-            self.stopped = True
+        with self._state_lock:
+            self.stop_execution = True
+            if not self.is_working_agent():
+                self.stopped = True
+        self.cancel_requests()
+
+    def cancel_requests(self):
+        """Aborts the API calls of the current response and of the agents it delegated to."""
+        if self.cancellation is not None:
+            self.cancellation.cancel()
 
     def reset(self):
         """Reset the agent's stopped status."""
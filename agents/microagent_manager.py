@@ -1,10 +1,14 @@
+import atexit
 import logging
 
 from typing import List, Optional, Any
 from agents.agent_lifecycle import AgentLifecycle 
 from agents.agent_similarity import AgentSimilarity
+from agents.agent_embedding_index import AgentEmbeddingIndex
 from agents.agent_persistence_manager import AgentPersistenceManager 
+from agents.ann_index import DEFAULT_NPROBE, create_search_backend
 from integrations.openaiwrapper import OpenAIAPIWrapper
+from utils.utility import get_env_variable
 
 logger= logging.getLogger()
 
@@ -17,9 +21,27 @@ class MicroAgentManager:
         self.max_agents = max_agents
         self.openai_wrapper = openai_wrapper
         self.agent_persistence = AgentPersistenceManager(db_filename)
-        self.agent_lifecycle = AgentLifecycle(self.openai_wrapper, self.agent_persistence, max_agents)
+        self.agent_lifecycle = AgentLifecycle(self.openai_wrapper, self.agent_persistence, max_agents, embedding_index=self._create_embedding_index(db_filename))
         self.load_agents()
 
+    def _create_embedding_index(self, db_filename: str) -> AgentEmbeddingIndex:
+        """
+        Creates the agent embedding index. Setting MICROAGENTS_AGENT_INDEX to
+        "brute" or "ivf" selects the search backend and persists the index
+        next to the agent database, so it is restored instead of rebuilt at startup.
+        """
+        backend_name = get_env_variable("MICROAGENTS_AGENT_INDEX", None, False)
+        if backend_name is None:
+            return AgentEmbeddingIndex()
+
+        nprobe = int(get_env_variable("MICROAGENTS_AGENT_INDEX_NPROBE", str(DEFAULT_NPROBE), False))
+        persist_path = None if db_filename == ":memory:" else f"{db_filename}.{backend_name}.npz"
+        index = AgentEmbeddingIndex(search_backend=create_search_backend(backend_name, nprobe), persist_path=persist_path)
+        if persist_path:
+            index.load()
+            atexit.register(index.save_if_dirty)
+        return index
+
     def stop_all_agents(self) -> None:
         """Stops all agents."""
         self.agent_lifecycle.stop_all_agents()
@@ -31,7 +53,8 @@ class MicroAgentManager:
     def load_agents(self):
         """Loads agents from the database."""
         loaded_agents = self.agent_persistence.load_all_agents(self.agent_lifecycle, self.openai_wrapper)
-        self.agent_lifecycle.agents.extend(loaded_agents)
+        self.agent_lifecycle.add_agents(loaded_agents)
+        self.agent_lifecycle.embedding_index.discard_unattached()
         logger.info(f"Loaded {len(loaded_agents)} agents from the database.")
 
 
@@ -1,16 +1,34 @@
-import threading
-import queue
+import logging
+import time
+
+from concurrent.futures import FIRST_COMPLETED
 
 from agents.agent_name_evaluation import AgentNameEvaluator
+from agents.agent_scheduler import AgentScheduler
+from agents.race_statistics import RaceStatistics
+from agents.response_streaming import stream_tokens_to
 from integrations.openaiwrapper import OpenAIAPIWrapper
+from utils.utility import get_env_variable
+
+logger = logging.getLogger()
 
 class ParallelAgentExecutor:
-    def __init__(self, agent_manager, max_parallel_agents=3):
+    def __init__(self, agent_manager, max_parallel_agents=3, deadline=None, scheduler=None, race_statistics=None):
+        """
+        :param max_parallel_agents: Most new agents racing for a purpose. Fewer race for purposes whose agents usually succeed.
+        :param deadline: Seconds to wait for a winning agent, defaults to MICROAGENTS_AGENT_DEADLINE or no limit.
+        :param scheduler: Pool running the racers, defaults to the process-wide AgentScheduler.
+        :param race_statistics: Outcome history choosing the race width, defaults to the process-wide RaceStatistics.
+        """
         self.agent_manager = agent_manager
+        self.scheduler = scheduler or AgentScheduler.get_default()
+        self.race_statistics = race_statistics or RaceStatistics.get_default()
         self.max_parallel_agents = max_parallel_agents
-        self.response_queue = queue.Queue()
-        self.agents_and_threads = []
-        self.execution_completed = threading.Event()
+        if deadline is None:
+            deadline = get_env_variable("MICROAGENTS_AGENT_DEADLINE", None, False)
+        self.deadline = float(deadline) if deadline is not None else None
+        self.agents_and_futures = []
+        self.cancellation_report = None
         self.agent_name_evaluator = AgentNameEvaluator(agent_manager.openai_wrapper)
 
     def create_and_run_agents(self, purpose, depth, input_text, parent_agent=None):
@@ -28,41 +46,133 @@ class ParallelAgentExecutor:
         
         initial_agent.set_agent_deleted()
 
-        for _ in range(self.max_parallel_agents):
-            new_agent = self.agent_manager.get_or_create_agent(purpose, depth, input_text, force_new=True, parent_agent=parent_agent)
-            new_thread = threading.Thread(target=self.run_agent, args=(new_agent, input_text))
-            new_thread.start()
-            self.agents_and_threads.append((new_agent, new_thread))
+        cluster = self.race_statistics.cluster_for(purpose, initial_agent.purpose_embedding)
+        width = self.race_statistics.acquire_width(cluster, self.max_parallel_agents)
+        try:
+            started = time.monotonic()
+            for _ in range(width):
+                new_agent = self.agent_manager.get_or_create_agent(purpose, depth, input_text, force_new=True, parent_agent=parent_agent)
+                # racers run in a copy of the context, so their API usage counts towards the request
+                future = self.scheduler.submit(self.run_agent, new_agent, input_text, depth=depth)
+                self.agents_and_futures.append((new_agent, future))
 
-        while not self.execution_completed.is_set() and any(thread.is_alive() for _, thread in self.agents_and_threads):
-            pass
+            winning_agent, winning_response = self.determine_winning_agent()
+            self.record_race(cluster, time.monotonic() - started if winning_agent else None)
+        finally:
+            self.race_statistics.release_width(width)
 
-        winning_agent, winning_response = self.determine_winning_agent()
         if winning_agent:
             self.set_other_agents_as_deleted(winning_agent)
+        else:
+            # racers still running after the deadline are given up on
+            self.cancel_agents([agent for agent, future in self.agents_and_futures if not future.done()])
 
         return winning_response
 
     def run_agent(self, agent, input_text):
-        try:
+        """Runs a racing agent, returning it with its response, or None if the agent did not succeed."""
+        with stream_tokens_to(None):
             response = agent.respond(input_text)
-            if agent.is_working_agent():
-                self.response_queue.put((agent, response))
-                self.execution_completed.set()
-        except Exception as e:
-            pass
+        return (agent, response) if agent.is_working_agent() else None
 
     def determine_winning_agent(self):
-        if not self.response_queue.empty():
-            return self.response_queue.get()
+        """
+        Blocks without using CPU until the first racer succeeds, every
+        racer has failed or the deadline has passed.
+        """
+        deadline = None if self.deadline is None else time.monotonic() + self.deadline
+        pending = {future for _, future in self.agents_and_futures}
+        while pending:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            done, pending = self.scheduler.wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                logger.warning(f"No agent succeeded within the deadline of {self.deadline}s")
+                break
+            for future in done:
+                if not future.cancelled() and future.exception() is None and future.result() is not None:
+                    return future.result()
         return None, None
 
+    def record_race(self, cluster, latency):
+        """
+        Adds the outcomes of the racers that finished to the history of the
+        purpose's cluster. Racers still running when the race ended are left
+        out, as their outcome is unknown: counting them as failures would
+        cap the success rate near 1/width, so races would never narrow.
+        """
+        outcomes = [
+            (future.exception() is None and future.result() is not None, agent.evolve_count)
+            for agent, future in self.agents_and_futures
+            if future.done() and not future.cancelled()
+        ]
+        self.race_statistics.record(cluster, outcomes, latency)
+
     def set_other_agents_as_deleted(self, winning_agent):
-        for agent, _ in self.agents_and_threads:
-            if agent != winning_agent:
+        """Cancels the racers that lost to the winning agent."""
+        self.cancel_agents([agent for agent, _ in self.agents_and_futures if agent is not winning_agent], winning_agent)
+
+    def cancel_agents(self, agents, winning_agent=None):
+        """
+        Deletes the given racers and every agent they delegated to. Deleting
+        stops their ReAct loops at the next step and aborts their API calls
+        where possible. The usage they had so far and the usage saved,
+        estimated from the winning agent's, are logged and kept in
+        cancellation_report.
+        """
+        if not agents:
+            return
+        for agent, future in self.agents_and_futures:
+            if any(agent is cancelled for cancelled in agents):
+                future.cancel()
+        subtrees = [delegation_subtree(agent) for agent in agents]
+        self.cancellation_report = cancellation_report(subtrees, delegation_subtree(winning_agent) if winning_agent else [])
+        for subtree in subtrees:
+            for agent in subtree:
                 agent.set_agent_deleted()
-                for child in agent.get_children():
-                    child.set_agent_deleted()
+        logger.info(
+            f"Cancelled {len(agents)} racing agents and {self.cancellation_report['agents'] - len(agents)} delegates: "
+            f"{self.cancellation_report['tokens_used']} tokens used, "
+            f"about {self.cancellation_report['tokens_saved']} tokens and {self.cancellation_report['api_seconds_saved']:.1f}s of API time saved"
+        )
 
     def is_working_agent(self):
-        return any(agent.is_working_agent() for agent, _ in self.agents_and_threads)
\ No newline at end of file
+        return any(agent.is_working_agent() for agent, _ in self.agents_and_futures)
+
+
+def delegation_subtree(agent):
+    """Returns the agent and every agent it created, directly or through its delegates."""
+    subtree, seen = [], set()
+    pending = [agent]
+    while pending:
+        current = pending.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        subtree.append(current)
+        pending.extend(current.get_children())
+    return subtree
+
+
+def subtree_usage(subtree):
+    """Returns the tokens and API seconds the agents of a subtree used."""
+    totals = [agent.usage for agent in subtree if getattr(agent, "usage", None) is not None]
+    return sum(usage.total_tokens for usage in totals), sum(usage.latency for usage in totals)
+
+
+def cancellation_report(cancelled_subtrees, winning_subtree):
+    """
+    Summarizes cancelled racers. A cancelled racer is assumed to need as
+    many tokens and as much API time as the winner did, so the savings are
+    the winner's usage minus what each racer had used when it was cancelled.
+    """
+    winner_tokens, winner_seconds = subtree_usage(winning_subtree)
+    report = {"agents": 0, "tokens_used": 0, "api_seconds_used": 0.0, "tokens_saved": 0, "api_seconds_saved": 0.0}
+    for subtree in cancelled_subtrees:
+        tokens, seconds = subtree_usage(subtree)
+        report["agents"] += len(subtree)
+        report["tokens_used"] += tokens
+        report["api_seconds_used"] += seconds
+        if winning_subtree:
+            report["tokens_saved"] += max(winner_tokens - tokens, 0)
+            report["api_seconds_saved"] += max(winner_seconds - seconds, 0.0)
+    return report
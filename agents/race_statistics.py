@@ -0,0 +1,173 @@
+import logging
+import math
+import threading
+
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from utils.utility import get_env_variable
+
+logger = logging.getLogger()
+
+DEFAULT_SUCCESS_TARGET = 0.9
+DEFAULT_RACE_BUDGET = 6  # racers beyond the first, across all concurrent races
+DEFAULT_CLUSTER_SIMILARITY = 0.9
+MAX_CLUSTERS = 1000
+
+
+class PurposeCluster:
+    """Outcomes of the agents raced for a group of similar purposes."""
+
+    def __init__(self, name: str, centroid: Optional[np.ndarray] = None):
+        self.name = name
+        self.centroid = centroid
+        self.races = 0
+        self.races_won = 0
+        self.attempts = 0
+        self.successes = 0
+        self.total_evolutions = 0
+        self.total_latency = 0.0
+
+    @property
+    def success_rate(self) -> float:
+        """Smoothed chance of a single new agent succeeding, 0.5 without history."""
+        return (self.successes + 1) / (self.attempts + 2)
+
+    def stats(self) -> dict:
+        return {
+            "races": self.races,
+            "races_won": self.races_won,
+            "attempts": self.attempts,
+            "successes": self.successes,
+            "success_rate": self.success_rate,
+            "mean_evolutions": self.total_evolutions / self.attempts if self.attempts else 0.0,
+            "mean_latency": self.total_latency / self.races_won if self.races_won else 0.0,
+        }
+
+
+class RaceStatistics:
+    """
+    Process-wide outcome history of racing agents, used to choose how many
+    new agents race for a purpose.
+
+    Purposes are grouped by embedding: a purpose joins the first cluster
+    whose centroid is at least MICROAGENTS_CLUSTER_SIMILARITY similar, or
+    starts a new one. A race is as wide as needed for at least one agent to
+    succeed with probability MICROAGENTS_RACE_SUCCESS_TARGET, given the
+    cluster's success rate. Racers beyond the first of every race share
+    the MICROAGENTS_RACE_BUDGET, so concurrent races narrow when it runs out.
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, success_target: float = DEFAULT_SUCCESS_TARGET, budget: int = DEFAULT_RACE_BUDGET, cluster_similarity: float = DEFAULT_CLUSTER_SIMILARITY):
+        self.success_target = success_target
+        self.budget = budget
+        self.cluster_similarity = cluster_similarity
+        self.clusters: List[PurposeCluster] = []
+        self._clusters_by_purpose: Dict[str, PurposeCluster] = {}
+        self._extra_racers = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_default(cls) -> "RaceStatistics":
+        """Returns the process-wide race statistics configured from the environment."""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls.from_environment()
+            return cls._default
+
+    @classmethod
+    def from_environment(cls) -> "RaceStatistics":
+        target = get_env_variable("MICROAGENTS_RACE_SUCCESS_TARGET", None, False)
+        budget = get_env_variable("MICROAGENTS_RACE_BUDGET", None, False)
+        similarity = get_env_variable("MICROAGENTS_CLUSTER_SIMILARITY", None, False)
+        return cls(
+            float(target) if target else DEFAULT_SUCCESS_TARGET,
+            int(budget) if budget else DEFAULT_RACE_BUDGET,
+            float(similarity) if similarity else DEFAULT_CLUSTER_SIMILARITY
+        )
+
+    def cluster_for(self, purpose: str, purpose_embedding: Optional[np.ndarray] = None) -> PurposeCluster:
+        """
+        Returns the cluster of a purpose, creating it on first use. Purposes
+        without an embedding are only grouped with the same purpose.
+        """
+        with self._lock:
+            cluster = self._clusters_by_purpose.get(purpose)
+            if cluster is not None:
+                return cluster
+
+            embedding = None
+            if purpose_embedding is not None:
+                embedding = np.asarray(purpose_embedding, dtype=np.float64)
+                embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+                for candidate in self.clusters:
+                    if candidate.centroid is not None and float(candidate.centroid @ embedding) >= self.cluster_similarity:
+                        cluster = candidate
+                        break
+
+            if cluster is None:
+                cluster = PurposeCluster(purpose, embedding)
+                self.clusters.append(cluster)
+                if len(self.clusters) > MAX_CLUSTERS:
+                    self._forget_least_raced()
+            if len(self._clusters_by_purpose) < MAX_CLUSTERS:
+                self._clusters_by_purpose[purpose] = cluster
+            return cluster
+
+    def race_width(self, cluster: PurposeCluster, max_width: int) -> int:
+        """Returns the racers needed to reach the success target, between 1 and max_width."""
+        failure_rate = 1 - cluster.success_rate
+        if failure_rate <= 1 - self.success_target:
+            return 1
+        needed = math.ceil(math.log(1 - self.success_target) / math.log(failure_rate))
+        return max(1, min(needed, max_width))
+
+    def acquire_width(self, cluster: PurposeCluster, max_width: int) -> int:
+        """
+        Returns the width of a race about to start, reserving its racers
+        beyond the first from the global budget. Pass the result to
+        release_width once the race is over.
+        """
+        wanted = self.race_width(cluster, max_width)
+        with self._lock:
+            extra = min(wanted - 1, max(self.budget - self._extra_racers, 0))
+            self._extra_racers += extra
+        if extra < wanted - 1:
+            logger.info(f"Race budget exhausted, racing {extra + 1} of {wanted} agents for '{cluster.name}'")
+        return extra + 1
+
+    def release_width(self, width: int) -> None:
+        with self._lock:
+            self._extra_racers -= width - 1
+
+    def record(self, cluster: PurposeCluster, outcomes: List[Tuple[bool, int]], latency: Optional[float]) -> None:
+        """
+        Records a finished race. Racers cut short before finishing are left out.
+
+        :param outcomes: Whether each finished racer succeeded and how often it evolved its prompt.
+        :param latency: Seconds until the winner finished, or None if no racer succeeded.
+        """
+        with self._lock:
+            cluster.races += 1
+            cluster.attempts += len(outcomes)
+            cluster.successes += sum(1 for succeeded, _ in outcomes if succeeded)
+            cluster.total_evolutions += sum(evolutions for _, evolutions in outcomes)
+            if latency is not None:
+                cluster.races_won += 1
+                cluster.total_latency += latency
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "clusters": {cluster.name: cluster.stats() for cluster in self.clusters},
+                "extra_racers": self._extra_racers,
+                "budget": self.budget,
+            }
+
+    def _forget_least_raced(self) -> None:
+        """Drops the cluster with the fewest races, other than the newest. Needs the lock."""
+        forgotten = min(self.clusters[:-1], key=lambda cluster: cluster.races)
+        self.clusters.remove(forgotten)
+        self._clusters_by_purpose = {purpose: cluster for purpose, cluster in self._clusters_by_purpose.items() if cluster is not forgotten}
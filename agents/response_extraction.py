@@ -1,3 +1,4 @@
+from integrations.model_routing import EXTRACTION_ROUTE
 from integrations.openaiwrapper import OpenAIAPIWrapper
 from prompt_management.prompts import STANDARD_SYSTEM_PROMPT, EXTRACTION_PROMPT_TEMPLATE
 
@@ -49,4 +50,7 @@ class ResponseExtraction:
         return self.openai_wrapper.chat_completion(
             messages=messages,
             max_tokens=100,
+            temperature=0,
+            cache=True,
+            route=EXTRACTION_ROUTE,
         )
@@ -1,5 +1,6 @@
 import logging
 from agents.agent_stopped_exception import AgentStoppedException
+from integrations.cancellation import RequestCancelled
 from utils.utility import time_function
 
 logger = logging.getLogger()
@@ -31,6 +32,7 @@ class ResponseHandler:
             if not self.micro_agent.working_agent and (solution or evolve_count == MAX_EVOLVE_COUNT):
                 self.micro_agent.update_status('🕵️  Judging..')
                 if self.micro_agent.agent_evaluator.evaluate(input_text, self.micro_agent.dynamic_prompt, response):
+                    # racers cancelled during the evaluation drop their result
                     self.micro_agent.set_agent_as_working()
             elif not self.micro_agent.working_agent and evolve_count < MAX_EVOLVE_COUNT:
                 self.micro_agent.evolve_count += 1
@@ -44,7 +46,7 @@ class ResponseHandler:
             self.micro_agent.update_active_agents(self.micro_agent.purpose)
 
             return response
-        except AgentStoppedException:
+        except (AgentStoppedException, RequestCancelled):
             logger.info("Agent execution was stopped.")
             return "Agent execution was stopped."
         except Exception as e:
@@ -0,0 +1,92 @@
+import contextlib
+import contextvars
+import re
+
+from typing import Callable, Iterable, List, Optional
+
+# listener(token, is_final_answer)
+TokenListener = Callable[[str, bool], None]
+
+AGENT_INVOCATION_PATTERN = re.compile(r"Use Agent\[[^\]]*\]")
+PYTHON_BLOCK_PATTERN = re.compile(r"```python.*?```", re.DOTALL)
+# lines the model starts when it goes on to make up the next step
+STEP_MARKER_PATTERN = re.compile(r"^\s*(?:Observation|Output|Thought|Question|Query Solved)\b", re.MULTILINE)
+
+_token_listener = contextvars.ContextVar("token_listener", default=None)
+
+
+@contextlib.contextmanager
+def stream_tokens_to(listener: TokenListener):
+    """
+    Sends the streamed tokens of agents responding in the current thread to
+    the listener. Agents started in other threads, such as parallel racers,
+    are not streamed.
+    """
+    token = _token_listener.set(listener)
+    try:
+        yield
+    finally:
+        _token_listener.reset(token)
+
+
+def current_token_listener() -> Optional[TokenListener]:
+    """Returns the token listener of the current context, if any."""
+    return _token_listener.get()
+
+
+def agent_invocations(text: str) -> List[str]:
+    """
+    Returns the agent invocations of a ReAct step's action: the first one
+    and every one following it before the model starts another step.
+    """
+    first = AGENT_INVOCATION_PATTERN.search(text)
+    if first is None:
+        return []
+    marker = STEP_MARKER_PATTERN.search(text, first.end())
+    end = marker.start() if marker else len(text)
+    return [match.group(0) for match in AGENT_INVOCATION_PATTERN.finditer(text, 0, end)]
+
+
+def action_end(text: str) -> Optional[int]:
+    """
+    Returns the end of the action of a ReAct step, or None if the action
+    may not be complete yet. A fenced python block ends the action, while
+    agent invocations last until the model starts another step, as a step
+    may delegate to several agents.
+    """
+    invocation = AGENT_INVOCATION_PATTERN.search(text)
+    python_block = PYTHON_BLOCK_PATTERN.search(text)
+    if python_block and (invocation is None or python_block.start() < invocation.start()):
+        return python_block.end()
+    if invocation is None:
+        return None
+    marker = STEP_MARKER_PATTERN.search(text, invocation.end())
+    if marker is None:
+        return None
+    return max(match.end() for match in AGENT_INVOCATION_PATTERN.finditer(text, 0, marker.start()))
+
+
+def read_until_action(chunks: Iterable[str], on_token: Callable[[str], None] = None) -> str:
+    """
+    Reads a streamed ReAct step until it contains a complete action. The
+    stream is closed as soon as the action is complete, and anything the
+    model wrote after it is dropped.
+
+    :param chunks: Streamed content deltas.
+    :param on_token: Called with every delta read.
+    :return: The step up to the end of its first action, or the whole step.
+    """
+    text = ""
+    try:
+        for chunk in chunks:
+            text += chunk
+            if on_token is not None:
+                on_token(chunk)
+            end = action_end(text)
+            if end is not None:
+                return text[:end].strip()
+        return text.strip()
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
@@ -0,0 +1,163 @@
+import logging
+import threading
+
+import numpy as np
+from typing import Dict, Optional
+
+logger = logging.getLogger()
+
+THRESHOLD_PERCENTILE = 98
+DEFAULT_SIMILARITY_THRESHOLD = 0.999
+MIN_AGENTS_FOR_THRESHOLD = 250
+HISTOGRAM_BINS = 4000
+
+
+class SimilarityThresholdEstimator:
+    """
+    Streaming estimate of a percentile of all pairwise agent similarities.
+
+    Pairwise similarities are accumulated in a fixed-width histogram over
+    [-1, 1], so adding or removing an agent only costs the similarities of
+    that agent's row, and the current threshold is read in O(1).
+    Optionally an exact percentile is recomputed in a background thread and
+    preferred while it is still up to date.
+    """
+
+    def __init__(self, percentile: float = THRESHOLD_PERCENTILE, bins: int = HISTOGRAM_BINS, exact_in_background: bool = False):
+        self.percentile = percentile
+        self.exact_in_background = exact_in_background
+        self._edges = np.linspace(-1.0, 1.0, bins + 1)
+        self._counts = np.zeros(bins, dtype=np.int64)
+        self._lock = threading.Lock()
+        self._agent_count = 0
+        self._version = 0
+        self._sketch_threshold = DEFAULT_SIMILARITY_THRESHOLD
+        self._exact_threshold: Optional[float] = None
+        self._exact_version = -1
+        self._exact_running = False
+
+    @property
+    def threshold(self) -> float:
+        """Returns the current similarity threshold."""
+        if self._agent_count < MIN_AGENTS_FOR_THRESHOLD:
+            return DEFAULT_SIMILARITY_THRESHOLD
+        if self._exact_version == self._version and self._exact_threshold is not None:
+            return self._exact_threshold
+        return self._sketch_threshold
+
+    @property
+    def pair_count(self) -> int:
+        """Returns the number of pairwise similarities currently accounted for."""
+        return int(self._counts.sum())
+
+    def add(self, similarities: np.ndarray) -> None:
+        """
+        Accounts for a newly added agent.
+
+        :param similarities: Similarities of the new agent to all previously present agents.
+        """
+        with self._lock:
+            self._counts += self._histogram(similarities)
+            self._agent_count += 1
+            self._refresh()
+
+    def remove(self, similarities: np.ndarray) -> None:
+        """
+        Accounts for a removed agent.
+
+        :param similarities: Similarities of the removed agent to all remaining agents.
+        """
+        with self._lock:
+            self._counts -= self._histogram(similarities)
+            np.maximum(self._counts, 0, out=self._counts)
+            self._agent_count = max(self._agent_count - 1, 0)
+            self._refresh()
+
+    def reset(self) -> None:
+        """Forgets all accumulated similarities."""
+        with self._lock:
+            self._counts[:] = 0
+            self._agent_count = 0
+            self._refresh()
+
+    def state(self) -> Dict[str, np.ndarray]:
+        """Returns the arrays needed to restore the estimator."""
+        with self._lock:
+            return {"counts": self._counts.copy(), "agent_count": np.array(self._agent_count)}
+
+    def load_state(self, state: Dict[str, np.ndarray]) -> None:
+        """Restores the estimator from arrays returned by ``state``."""
+        with self._lock:
+            counts = state.get("counts")
+            if counts is not None and len(counts) == len(self._counts):
+                self._counts[:] = counts
+                self._agent_count = int(state.get("agent_count", 0))
+            self._refresh()
+
+    def recompute_exact(self, normalized_matrix: np.ndarray, version: Optional[int] = None) -> float:
+        """
+        Computes the exact percentile over all pairs of the given pre-normalized rows.
+
+        :param normalized_matrix: Matrix with one normalized embedding per row.
+        :param version: Version of the estimator the matrix was taken at.
+        :return: The exact threshold.
+        """
+        count = normalized_matrix.shape[0]
+        if count < 2:
+            exact = DEFAULT_SIMILARITY_THRESHOLD
+        else:
+            gram = normalized_matrix @ normalized_matrix.T
+            exact = float(np.percentile(gram[np.triu_indices(count, k=1)], self.percentile))
+
+        with self._lock:
+            if version is None or version == self._version:
+                self._exact_threshold = exact
+                self._exact_version = self._version
+        return exact
+
+    def schedule_exact_recompute(self, snapshot) -> None:
+        """
+        Recomputes the exact threshold in a background thread, if enabled.
+
+        :param snapshot: Callable returning a copy of the normalized embedding matrix.
+        """
+        if not self.exact_in_background or self._agent_count < MIN_AGENTS_FOR_THRESHOLD:
+            return
+
+        with self._lock:
+            if self._exact_running:
+                return
+            self._exact_running = True
+            version = self._version
+
+        def run():
+            try:
+                self.recompute_exact(snapshot(), version)
+            except Exception as e:
+                logger.exception(f"Error recomputing similarity threshold: {e}")
+            finally:
+                with self._lock:
+                    self._exact_running = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _histogram(self, similarities: np.ndarray) -> np.ndarray:
+        values = np.clip(np.asarray(similarities, dtype=np.float64).ravel(), -1.0, 1.0)
+        return np.histogram(values, bins=self._edges)[0]
+
+    def _refresh(self) -> None:
+        self._version += 1
+        total = int(self._counts.sum())
+        if total == 0:
+            self._sketch_threshold = DEFAULT_SIMILARITY_THRESHOLD
+            return
+
+        rank = self.percentile / 100.0 * (total - 1)
+        cumulative = np.cumsum(self._counts)
+        bin_index = int(np.searchsorted(cumulative, rank, side="right"))
+        bin_index = min(bin_index, len(self._counts) - 1)
+        below = cumulative[bin_index - 1] if bin_index > 0 else 0
+        in_bin = self._counts[bin_index]
+        fraction = (rank - below + 0.5) / in_bin if in_bin else 0.0
+        lower, upper = self._edges[bin_index], self._edges[bin_index + 1]
+        self._sketch_threshold = float(lower + min(max(fraction, 0.0), 1.0) * (upper - lower))
@@ -0,0 +1,314 @@
+"""
+End-to-end benchmark of the agent orchestration pipeline.
+
+Runs the questions of main.py through MicroAgentManager and
+ParallelAgentExecutor against the synthetic LLM backend, with the agent
+registry pre-seeded to different sizes, and writes the results as JSON so
+runs on different commits can be compared:
+
+    python -m benchmarks.end_to_end --agents 10 200 2000 --question-set 2 --output results.json
+
+Every registry size runs in its own process, so the memory high-water mark
+and thread counts of one run do not leak into the next.
+"""
+import argparse
+import ast
+import contextlib
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from typing import List
+
+from agents.microagent_manager import MicroAgentManager
+from agents.agent_scheduler import AgentScheduler
+from agents.parallel_agent_executor import ParallelAgentExecutor
+from agents.race_statistics import RaceStatistics
+from integrations.completion_cache import SQLiteCompletionCache
+from integrations.embedding_cache import SQLiteEmbeddingCache
+from integrations.fake_llm import FakeOpenAIClient, LatencyDistribution, SyntheticBackend
+from integrations.openaiwrapper import OpenAIAPIWrapper
+from integrations.sqlite_agent_persistence import SQLiteAgentPersistence
+
+logger = logging.getLogger()
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_AGENT_COUNTS = [10, 200, 2000]
+DEFAULT_CHAT_LATENCY = "lognormal:0.2:0.5"
+DEFAULT_EMBEDDING_LATENCY = "constant:0.02"
+
+
+def load_question_set(name: str) -> List[str]:
+    """
+    Reads a question set from main.py without importing it, so the
+    benchmark does not depend on the console UI packages.
+    """
+    with open(os.path.join(REPOSITORY_ROOT, "main.py"), "r", encoding="utf-8") as source:
+        module = ast.parse(source.read())
+    for node in module.body:
+        if isinstance(node, ast.Assign) and any(getattr(target, "id", None) == name for target in node.targets):
+            return ast.literal_eval(node.value)
+    raise ValueError(f"main.py has no question set {name}")
+
+
+def percentiles(values: List[float]) -> dict:
+    values = sorted(values)
+
+    def percentile(p):
+        return values[min(int(p * len(values)), len(values) - 1)] if values else 0.0
+
+    return {
+        "p50": percentile(0.5),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "max": values[-1] if values else 0.0,
+    }
+
+
+class MeasuredFakeClient(FakeOpenAIClient):
+    """Synthetic client that counts LLM calls and the wall and CPU time spent inside them."""
+
+    def __init__(self, backend):
+        super().__init__(backend)
+        self._lock = threading.Lock()
+        self.calls = {"chat": 0, "embedding": 0}
+        self.wait_seconds = 0.0
+        self.cpu_seconds = 0.0
+
+    def _create_chat_completion(self, **kwargs):
+        return self._measure("chat", super()._create_chat_completion, kwargs)
+
+    def _create_embedding(self, **kwargs):
+        return self._measure("embedding", super()._create_embedding, kwargs)
+
+    def _measure(self, kind, create, kwargs):
+        started, started_cpu = time.perf_counter(), time.thread_time()
+        try:
+            return create(**kwargs)
+        finally:
+            with self._lock:
+                self.calls[kind] += 1
+                self.wait_seconds += time.perf_counter() - started
+                self.cpu_seconds += time.thread_time() - started_cpu
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"calls": dict(self.calls), "wait_seconds": self.wait_seconds, "cpu_seconds": self.cpu_seconds}
+
+
+class ThreadCounter:
+    """
+    Counts the threads started while active and the peak number of live
+    threads. Live threads only grow when a thread starts, so checking at
+    every start finds the exact peak.
+    """
+
+    def __init__(self):
+        self.started = 0
+        self.peak = threading.active_count()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        threading.setprofile(self._on_thread_start)
+        return self
+
+    def __exit__(self, *exc_info):
+        threading.setprofile(None)
+
+    def _on_thread_start(self, frame, event, arg):
+        # runs once in every new thread, then removes itself
+        sys.setprofile(None)
+        with self._lock:
+            self.started += 1
+            self.peak = max(self.peak, threading.active_count())
+
+
+def seed_registry(db_filename: str, backend: SyntheticBackend, agent_count: int) -> None:
+    """Saves agent_count working agents with synthetic purpose embeddings to the agent database."""
+    persistence = SQLiteAgentPersistence(db_filename)
+    for number in range(agent_count):
+        purpose = f"Seeded Agent {number}"
+        persistence.save_agent({
+            "dynamic_prompt": f"You are {purpose}.",
+            "purpose": purpose,
+            "purpose_embedding": backend.embedding(purpose),
+            "depth": 2,
+            "max_depth": 3,
+            "usage_count": 1,
+            "id": str(uuid.uuid4()),
+            "parent_id": None,
+            "working_agent": True,
+            "is_prime": False,
+            "evolve_count": 0,
+            "number_of_code_executions": 0,
+            "last_input": "",
+        })
+
+
+@contextlib.contextmanager
+def cache_directory(directory: str):
+    """Keeps the databases of memoized calls, such as agent name evaluations, in the directory."""
+    previous = os.environ.get("MICROAGENTS_CACHE_DIR")
+    os.environ["MICROAGENTS_CACHE_DIR"] = directory
+    try:
+        yield
+    finally:
+        if previous is None:
+            os.environ.pop("MICROAGENTS_CACHE_DIR", None)
+        else:
+            os.environ["MICROAGENTS_CACHE_DIR"] = previous
+
+
+def run_workload(agent_count: int, questions: List[str], args) -> dict:
+    """Runs the questions against a registry of agent_count agents and returns the measurements."""
+    backend = SyntheticBackend(
+        LatencyDistribution.parse(args.chat_latency, seed=args.seed),
+        LatencyDistribution.parse(args.embedding_latency, seed=args.seed),
+        args.embedding_dimensions
+    )
+    client = MeasuredFakeClient(backend)
+
+    with tempfile.TemporaryDirectory() as directory, cache_directory(directory):
+        db_filename = os.path.join(directory, "agents.db")
+        seed_registry(db_filename, backend, agent_count)
+        wrapper = OpenAIAPIWrapper(
+            client,
+            embedding_cache=SQLiteEmbeddingCache(os.path.join(directory, "embeddings.db")),
+            completion_cache=SQLiteCompletionCache(os.path.join(directory, "completions.db"))
+        )
+
+        started = time.perf_counter()
+        manager = MicroAgentManager(wrapper, max_agents=agent_count + args.max_new_agents, db_filename=db_filename)
+        manager.create_agents()
+        startup_seconds = time.perf_counter() - started
+
+        latencies, calls_per_question = [], []
+        before = client.snapshot()
+        cpu_before = time.process_time()
+        with ThreadCounter() as threads:
+            for question in questions:
+                calls_before = client.snapshot()["calls"]
+                started = time.perf_counter()
+                ParallelAgentExecutor(manager).create_and_run_agents("Bootstrap Agent", 1, question)
+                latencies.append(time.perf_counter() - started)
+                calls_after = client.snapshot()["calls"]
+                calls_per_question.append({kind: calls_after[kind] - calls_before[kind] for kind in calls_after})
+        cpu_seconds = time.process_time() - cpu_before
+        after = client.snapshot()
+        threads_after_run = threading.active_count()
+        registry_size = len(manager.get_agents())
+        manager.stop_all_agents()
+        # cancelled racers may still be writing to the databases in the directory
+        AgentScheduler.get_default().drain()
+
+    llm_cpu_seconds = after["cpu_seconds"] - before["cpu_seconds"]
+    return {
+        "agents": agent_count,
+        "questions": len(questions),
+        "startup_seconds": startup_seconds,
+        "latency_seconds": percentiles(latencies),
+        "cpu_seconds": {
+            "total": cpu_seconds,
+            "llm_client": llm_cpu_seconds,
+            "framework": cpu_seconds - llm_cpu_seconds,
+            "framework_per_question": (cpu_seconds - llm_cpu_seconds) / len(questions),
+        },
+        "llm_wait_seconds": after["wait_seconds"] - before["wait_seconds"],
+        "llm_calls": {kind: after["calls"][kind] - before["calls"][kind] for kind in after["calls"]},
+        "llm_calls_per_question": {
+            kind: percentiles([calls[kind] for calls in calls_per_question]) for kind in after["calls"]
+        },
+        # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024),
+        "threads": {"started": threads.started, "peak": threads.peak, "after_run": threads_after_run},
+        "registry_size_after_run": registry_size,
+        "routes": wrapper.router.stats(),
+        "scheduler": AgentScheduler.get_default().stats(),
+        "races": RaceStatistics.get_default().stats(),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPOSITORY_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_in_subprocess(agent_count: int, args) -> dict:
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as result_file:
+        result_path = result_file.name
+    try:
+        command = [
+            sys.executable, "-m", "benchmarks.end_to_end", "--worker",
+            "--agents", str(agent_count), "--output", result_path,
+            "--question-set", args.question_set, "--repeat", str(args.repeat),
+            "--chat-latency", args.chat_latency, "--embedding-latency", args.embedding_latency,
+            "--embedding-dimensions", str(args.embedding_dimensions),
+            "--max-new-agents", str(args.max_new_agents), "--seed", str(args.seed),
+        ]
+        subprocess.run(command, cwd=REPOSITORY_ROOT, check=True)
+        with open(result_path, "r", encoding="utf-8") as result:
+            return json.load(result)
+    finally:
+        os.remove(result_path)
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the agent orchestration pipeline.")
+    parser.add_argument("--agents", type=int, nargs="+", default=DEFAULT_AGENT_COUNTS, help="Registry sizes to benchmark.")
+    parser.add_argument("--question-set", choices=["1", "2"], default="1", help="QUESTION_SET or QUESTION_SET_2 of main.py.")
+    parser.add_argument("--repeat", type=int, default=1, help="Times the question set is asked.")
+    parser.add_argument("--chat-latency", default=DEFAULT_CHAT_LATENCY, help="Latency distribution of chat completions.")
+    parser.add_argument("--embedding-latency", default=DEFAULT_EMBEDDING_LATENCY, help="Latency distribution of embedding calls.")
+    parser.add_argument("--embedding-dimensions", type=int, default=1536)
+    parser.add_argument("--max-new-agents", type=int, default=1000, help="Agents the run may create before the least used are evicted.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file for the results, printed to stdout when omitted.")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    question_set = "QUESTION_SET" if args.question_set == "1" else "QUESTION_SET_2"
+    questions = load_question_set(question_set) * args.repeat
+
+    if args.worker:
+        results = run_workload(args.agents[0], questions, args)
+    else:
+        results = {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "question_set": question_set,
+            "config": {
+                "repeat": args.repeat,
+                "chat_latency": args.chat_latency,
+                "embedding_latency": args.embedding_latency,
+                "embedding_dimensions": args.embedding_dimensions,
+                "seed": args.seed,
+            },
+            "runs": [run_in_subprocess(agent_count, args) for agent_count in args.agents],
+        }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as result:
+            result.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
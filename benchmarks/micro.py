@@ -0,0 +1,275 @@
+"""
+Microbenchmarks of the similarity, serialization and persistence hot paths.
+
+Every case runs for each combination of agent count and embedding
+dimension. Results can be stored as a baseline and later runs compared
+against it; the comparison fails when a case got slower than the allowed
+regression:
+
+    python -m benchmarks.micro --save-baseline micro_baseline.json
+    python -m benchmarks.micro --baseline micro_baseline.json --max-regression 0.25
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from agents.agent_embedding_index import AgentEmbeddingIndex
+from agents.agent_persistence_manager import AgentPersistenceManager
+from agents.agent_serializer import AgentSerializer
+from agents.agent_similarity import Agent, AgentSimilarity
+from integrations.completion_cache import SQLiteCompletionCache
+from integrations.embedding_cache import SQLiteEmbeddingCache
+from integrations.fake_llm import FakeOpenAIClient, SyntheticBackend
+from integrations.memoize import SQLiteConnectionPool, SQLiteMemoization
+from integrations.openaiwrapper import OpenAIAPIWrapper
+
+DEFAULT_AGENT_COUNTS = [100, 1000]
+DEFAULT_DIMENSIONS = [256, 1536]
+DEFAULT_MAX_REGRESSION = 0.25
+DEFAULT_REPEAT = 5
+# a measurement runs the case at least this long, to average out timer noise
+MIN_MEASUREMENT_TIME = 0.05  # seconds
+
+
+def random_embeddings(count: int, dimensions: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((count, dimensions))
+
+
+def agent_dict(number: int, embedding: np.ndarray) -> dict:
+    return {
+        "dynamic_prompt": f"You are Benchmark Agent {number}.",
+        "purpose": f"Benchmark Agent {number}",
+        "purpose_embedding": embedding.tolist(),
+        "depth": 2,
+        "max_depth": 3,
+        "usage_count": 1,
+        "id": str(uuid.uuid4()),
+        "parent_id": None,
+        "working_agent": True,
+        "is_prime": False,
+        "evolve_count": 0,
+        "number_of_code_executions": 0,
+        "last_input": "",
+    }
+
+
+def agent_lifecycle() -> SimpleNamespace:
+    """The parts of AgentLifecycle a MicroAgent needs to be constructed."""
+    return SimpleNamespace(agents=[], embedding_index=AgentEmbeddingIndex())
+
+
+def offline_wrapper(directory: str) -> OpenAIAPIWrapper:
+    """A wrapper on the synthetic backend with its caches in the benchmark directory."""
+    return OpenAIAPIWrapper(
+        FakeOpenAIClient(SyntheticBackend()),
+        embedding_cache=SQLiteEmbeddingCache(os.path.join(directory, "embeddings.db")),
+        completion_cache=SQLiteCompletionCache(os.path.join(directory, "completions.db"))
+    )
+
+
+def similarity_setup(agents: int, dimensions: int, directory: str):
+    embeddings = random_embeddings(agents + 1, dimensions)
+    registry = []
+    for number in range(agents):
+        agent = Agent(f"Benchmark Agent {number}")
+        agent.purpose_embedding = embeddings[number]
+        registry.append(agent)
+    index = AgentEmbeddingIndex()
+    for agent in registry:
+        index.add(agent)
+    return AgentSimilarity(None, registry, index), embeddings[-1]
+
+
+def bench_find_closest_agent(agents, dimensions, directory, stack):
+    similarity, query = similarity_setup(agents, dimensions, directory)
+    return lambda: similarity.find_closest_agent(query)
+
+
+def bench_calculate_similarity_threshold(agents, dimensions, directory, stack):
+    similarity, _ = similarity_setup(agents, dimensions, directory)
+    return similarity.calculate_similarity_threshold
+
+
+def bench_serializer_to_dict(agents, dimensions, directory, stack):
+    agent = AgentSerializer.from_dict(agent_dict(0, random_embeddings(1, dimensions)[0]), agent_lifecycle(), offline_wrapper(directory))
+    return lambda: AgentSerializer.to_dict(agent)
+
+
+def bench_serializer_from_dict(agents, dimensions, directory, stack):
+    data = agent_dict(0, random_embeddings(1, dimensions)[0])
+    lifecycle, wrapper = agent_lifecycle(), offline_wrapper(directory)
+    return lambda: AgentSerializer.from_dict(data, lifecycle, wrapper)
+
+
+def persisted_registry(agents, dimensions, directory) -> AgentPersistenceManager:
+    manager = AgentPersistenceManager(os.path.join(directory, f"agents-{agents}-{dimensions}.db"))
+    for number, embedding in enumerate(random_embeddings(agents, dimensions)):
+        manager.persistence.save_agent(agent_dict(number, embedding))
+    return manager
+
+
+def bench_persistence_save_agent(agents, dimensions, directory, stack):
+    persistence = persisted_registry(agents, dimensions, directory).persistence
+    data = agent_dict(agents, random_embeddings(1, dimensions)[0])
+    return lambda: persistence.save_agent(data)
+
+
+def bench_persistence_load_all_purposes(agents, dimensions, directory, stack):
+    persistence = persisted_registry(agents, dimensions, directory).persistence
+    return persistence.load_all_purposes
+
+
+def bench_load_all_agents(agents, dimensions, directory, stack):
+    manager, wrapper = persisted_registry(agents, dimensions, directory), offline_wrapper(directory)
+    return lambda: manager.load_all_agents(agent_lifecycle(), wrapper)
+
+
+def memoization(agents, dimensions, directory, stack: contextlib.ExitStack) -> Tuple[SQLiteMemoization, list]:
+    """A memoization store holding one cached embedding per agent, closed when the stack is."""
+    filename = os.path.join(directory, f"cache-{agents}-{dimensions}.db")
+    stack.callback(SQLiteConnectionPool.for_file(filename).close)
+    memo = stack.enter_context(SQLiteMemoization(filename))
+    embedding = random_embeddings(1, dimensions)[0].tolist()
+    for number in range(agents):
+        memo.fetch_or_compute(lambda text: embedding, "embedding", f"text {number}")
+    memo.connection.commit()
+    return memo, embedding
+
+
+def bench_memoization_hit(agents, dimensions, directory, stack):
+    memo, embedding = memoization(agents, dimensions, directory, stack)
+    return lambda: memo.fetch_or_compute(lambda text: embedding, "embedding", "text 0")
+
+
+def bench_memoization_miss(agents, dimensions, directory, stack):
+    memo, embedding = memoization(agents, dimensions, directory, stack)
+    counter = itertools.count(agents)
+    return lambda: memo.fetch_or_compute(lambda text: embedding, "embedding", f"text {next(counter)}")
+
+
+# a case builder takes the agent count, dimension, temporary directory and an
+# ExitStack closing what it opened once the case is measured, and returns the
+# function to time
+CASES: Dict[str, Callable] = {
+    "similarity.find_closest_agent": bench_find_closest_agent,
+    "similarity.calculate_similarity_threshold": bench_calculate_similarity_threshold,
+    "serializer.to_dict": bench_serializer_to_dict,
+    "serializer.from_dict": bench_serializer_from_dict,
+    "persistence.save_agent": bench_persistence_save_agent,
+    "persistence.load_all_purposes": bench_persistence_load_all_purposes,
+    "persistence.load_all_agents": bench_load_all_agents,
+    "memoization.fetch_or_compute_hit": bench_memoization_hit,
+    "memoization.fetch_or_compute_miss": bench_memoization_miss,
+}
+
+
+def measure(func: Callable, repeat: int = DEFAULT_REPEAT, min_time: float = MIN_MEASUREMENT_TIME) -> dict:
+    """
+    Times func like timeit: the number of calls per measurement doubles
+    until a measurement takes min_time, then repeat measurements are taken.
+
+    :return: Best and median seconds per call and the calls per measurement.
+    """
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - started >= min_time:
+            break
+        number *= 2
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - started) / number)
+    return {"best": min(timings), "median": statistics.median(timings), "number": number}
+
+
+def case_key(name: str, agents: int, dimensions: int) -> str:
+    return f"{name}[agents={agents},dimensions={dimensions}]"
+
+
+def run(names: List[str], agent_counts: List[int], dimensions: List[int], repeat: int = DEFAULT_REPEAT) -> dict:
+    """Runs the named cases for every agent count and dimension and returns the timings by case key."""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, agents, dimension in itertools.product(names, agent_counts, dimensions):
+            with contextlib.ExitStack() as stack:
+                results[case_key(name, agents, dimension)] = measure(CASES[name](agents, dimension, directory, stack), repeat)
+    return results
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> List[str]:
+    """
+    Returns a line for every case whose best time got slower than the
+    baseline by more than max_regression (0.25 allows 25%). The best time
+    is compared as it is the least affected by noise from other processes.
+    Cases missing from the baseline are not compared.
+    """
+    regressions = []
+    for key, timing in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        change = timing["best"] / reference["best"] - 1
+        if change > max_regression:
+            regressions.append(f"{key}: {reference['best'] * 1e6:.1f}us -> {timing['best'] * 1e6:.1f}us (+{change:.0%})")
+    return regressions
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the similarity, serialization and persistence hot paths.")
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES), help="Cases to run.")
+    parser.add_argument("--agents", type=int, nargs="+", default=DEFAULT_AGENT_COUNTS, help="Agent counts to run every case with.")
+    parser.add_argument("--dimensions", type=int, nargs="+", default=DEFAULT_DIMENSIONS, help="Embedding dimensions to run every case with.")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Measurements per case.")
+    parser.add_argument("--output", help="JSON file for the results, printed to stdout when omitted.")
+    parser.add_argument("--save-baseline", help="Stores the results as the baseline for later comparisons.")
+    parser.add_argument("--baseline", help="Baseline to compare against; exits with status 1 on regressions.")
+    parser.add_argument("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION, help="Allowed slowdown against the baseline, 0.25 for 25%%.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_arguments(argv)
+    results = run(args.cases, args.agents, args.dimensions, args.repeat)
+    document = {"python": platform.python_version(), "results": results}
+
+    output = json.dumps(document, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as result:
+            result.write(output + "\n")
+    else:
+        print(output)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as baseline:
+            baseline.write(output + "\n")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as baseline:
+            regressions = compare(results, json.load(baseline)["results"], args.max_regression)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
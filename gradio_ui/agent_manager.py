@@ -1,10 +1,14 @@
 import logging
-from typing import Any, List
+import queue
+import threading
+from typing import Any, Iterator, List
 
 from agents.microagent_manager import MicroAgentManager
 from agents.microagent import MicroAgent
 from agents.parallel_agent_executor import ParallelAgentExecutor
+from agents.response_streaming import stream_tokens_to
 from integrations.openaiwrapper import OpenAIAPIWrapper
+from integrations.usage_tracking import UsageTotals, track_request
 from utils.utility import get_env_variable
 import time
 logger = logging.getLogger(__name__)
@@ -17,6 +21,7 @@ class GradioAgentManager:
     def __init__(self, openai_wrapper: OpenAIAPIWrapper):
         self.manager = MicroAgentManager(openai_wrapper, db_filename=get_env_variable("MICROAGENTS_DB_FILENAME", "agents.db", False))
         self.manager.create_agents()
+        self.last_request_usage = UsageTotals()
 
     def stop_all_agents(self) -> None:
         """Stops all agents."""
@@ -89,6 +94,8 @@ class GradioAgentManager:
             "Depth": agent.depth,
             "Evolve Count": agent.evolve_count,
             "Executions": agent.number_of_code_executions,
+            "Tokens": agent.usage.total_tokens,
+            "Cost ($)": round(agent.usage.cost, 4),
             "Last Input": agent.last_input,
             "Is Working": "✅" if agent.working_agent else "❌",
         }
@@ -103,6 +110,7 @@ class GradioAgentManager:
             "Last Input": agent.last_input,
             "Last Output": agent.last_output,
             "Last Conversation": agent.last_conversation,
+            "API Usage": agent.usage.summary(),
         }
 
     def get_agent_details(self, purpose: str) -> dict:
@@ -115,14 +123,46 @@ class GradioAgentManager:
     def process_user_input(self, user_input: str) -> str:
         """
         Process user input through a specified agent and return its response.
+        The API usage of all agents involved is kept in last_request_usage.
         """
+        usage = UsageTotals()
         try:
-            parallel_executor = ParallelAgentExecutor(self.manager)
-            delegated_response = parallel_executor.create_and_run_agents("Bootstrap Agent", 1, user_input)
+            with track_request(usage):
+                parallel_executor = ParallelAgentExecutor(self.manager)
+                delegated_response = parallel_executor.create_and_run_agents("Bootstrap Agent", 1, user_input)
             return delegated_response
         except Exception as e:
             logger.exception(f"Error processing user input: {e}")
             return "Error in processing input."
+        finally:
+            self.last_request_usage = usage
+            logger.info(f"API usage of the request: {usage.summary()}")
+
+    def stream_user_input(self, user_input: str) -> Iterator[str]:
+        """
+        Process user input like process_user_input, yielding the final answer
+        as it is generated and the complete response at the end.
+        """
+        tokens = queue.Queue()
+        result = {}
+
+        def run():
+            def listener(token, is_final_answer):
+                if is_final_answer:
+                    tokens.put(token)
+
+            try:
+                with stream_tokens_to(listener):
+                    result["response"] = self.process_user_input(user_input)
+            finally:
+                tokens.put(None)
+
+        threading.Thread(target=run, daemon=True).start()
+        partial_answer = ""
+        while (token := tokens.get()) is not None:
+            partial_answer += token
+            yield partial_answer
+        yield result.get("response", "Error in processing input.")
 
     def update_agent_status(self, purpose: str, new_status: str):
         """
@@ -11,7 +11,7 @@ class AgentTable:
 
     def display(self):
         agents_info = self.agent_manager.get_agents_info()
-        headers = ["Agent", "Status", "Is Working", "Depth", "Evolve Count", "Executions", "Last Input"]
+        headers = ["Agent", "Status", "Is Working", "Depth", "Evolve Count", "Executions", "Tokens", "Cost ($)", "Last Input"]
         data = [ [agent[header] for header in headers] for agent in agents_info ]
         dataframe = pd.DataFrame(data, columns=headers)
         return gr.Dataframe(dataframe, interactive=False)
@@ -55,7 +55,7 @@ class ChatInterface:
         self.agent_manager = agent_manager
 
     def chat_function(self, message, history):
-        return self.agent_manager.process_user_input(message)
+        yield from self.agent_manager.stream_user_input(message)
 
     def cancel_function(self):
         pass
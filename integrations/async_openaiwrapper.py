@@ -0,0 +1,355 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import openai
+
+from .cancellation import RequestCancelled, check_cancelled, current_token
+from .completion_cache import SQLiteCompletionCache
+from .embedding_cache import SQLiteEmbeddingCache, normalize_text
+from .endpoint_pool import AsyncPooledClient, pool_from_environment
+from .openaiwrapper import (
+    ENGINE, MODEL, OpenAIAPIWrapper,
+    cached_embedding_response, chunk_content, completion_content, completion_flight_key, create_endpoint_clients,
+    create_openai_client, embedding_response_to_dict, get_client_settings, get_endpoint_settings, record_embedding_usage,
+    split_embedding_response, timeout_kwargs
+)
+from .embedding_batcher import DEFAULT_MAX_BATCH_SIZE
+from .fake_llm import FAKE_BACKENDS, create_fake_client, get_backend_name, record_to_cassette
+from .model_routing import DEFAULT_ROUTE, ModelRouter, Route
+from .rate_limiter import RateLimiter, estimate_prompt_tokens, estimate_request_tokens, estimate_tokens
+from .retry_policy import RetryPolicy
+from .single_flight import AsyncSingleFlight
+from .usage_tracking import CallMeter, CallUsage, completion_usage, record_usage
+
+
+def get_configured_async_openai_wrapper(timeout: float = 60, max_retries: int = 5):
+    """
+    Returns the configured async OpenAI wrapper.
+
+        :param timeout: Overall deadline in seconds for an API call including its retries.
+        :param max_retries: Number of attempts for API requests.
+    """
+    backend = get_backend_name()
+    endpoint_clients = {}
+    if backend in FAKE_BACKENDS:
+        client = create_fake_client(backend, use_async=True)
+    else:
+        use_azure, params = get_client_settings()
+        client = create_openai_client(use_azure, params, use_async=True)
+        endpoint_clients = create_endpoint_clients(use_azure, params, use_async=True)
+        if backend == "record":
+            client = record_to_cassette(client, use_async=True)
+            endpoint_clients = {name: record_to_cassette(endpoint, use_async=True) for name, endpoint in endpoint_clients.items()}
+        pool = pool_from_environment(client, endpoint_clients, get_endpoint_settings())
+        if pool is not None:
+            client = AsyncPooledClient(pool)
+    return AsyncOpenAIAPIWrapper(
+        openai_client = client,
+        timeout = timeout,
+        max_retries = max_retries,
+        router = ModelRouter.from_environment(MODEL, endpoint_clients)
+    )
+
+
+class AsyncOpenAIAPIWrapper:
+    """
+    An asyncio wrapper class for OpenAI's API with the same retry policy
+    and rate limiting as OpenAIAPIWrapper. Waiting for the API or for a
+    retry never blocks the event loop, so one loop can drive many calls.
+    """
+
+    def __init__(
+        self,
+        openai_client : openai.AsyncOpenAI | openai.AsyncAzureOpenAI,
+        timeout : float = 60,
+        max_retries : int = 5,
+        embedding_cache : SQLiteEmbeddingCache = None,
+        rate_limiter : RateLimiter = None,
+        retry_policy : RetryPolicy = None,
+        completion_cache : SQLiteCompletionCache = None,
+        router : ModelRouter = None
+    ):
+        """
+        Initializes the AsyncOpenAIAPIWrapper instance.
+
+        :param openai_client: The async openai client
+        :param timeout: Overall deadline in seconds for an API call including its retries.
+        :param max_retries: Number of attempts for API requests.
+        :param embedding_cache: Cache for embeddings, shared across processes using the same file.
+        :param rate_limiter: Client-side rate limiter, shared by all wrappers of the process by default.
+        :param retry_policy: Backoff and deadline policy; replaces timeout and max_retries when given.
+        :param completion_cache: Cache for chat completions of call sites that opt in.
+        :param router: Routes the chat completions of call sites to models, endpoints and timeouts.
+        """
+        self._openai_client = openai_client
+        self.retry_policy = retry_policy or RetryPolicy(max_attempts=max_retries, deadline=timeout)
+        self.completion_cache = completion_cache or SQLiteCompletionCache("openai_completion_cache.db")
+        self.embedding_cache = embedding_cache or SQLiteEmbeddingCache("openai_embedding_cache.db")
+        self.rate_limiter = rate_limiter or RateLimiter.get_default()
+        self.single_flight = AsyncSingleFlight()
+        self.router = router or ModelRouter.from_environment(MODEL)
+
+    async def get_embedding(self, text):
+        """
+        Retrieves the embedding for the given text, served from the embedding
+        cache when possible. Concurrent requests for the same text share one
+        API call.
+
+        :param text: The text for which embedding is required.
+        :return: The embedding for the given text.
+        """
+        text = normalize_text(text)
+        cached = self.embedding_cache.get(ENGINE, text)
+        if cached is not None:
+            data = cached_embedding_response(cached)
+            record_embedding_usage(data, 0.0, cached=True)
+            return data
+
+        return await self.single_flight.do(("embedding", ENGINE, text), lambda: self._fetch_embedding(text))
+
+    async def _fetch_embedding(self, text):
+        started = time.monotonic()
+        data = split_embedding_response(await self._create_embeddings([text]))[0]
+        self.embedding_cache.put(ENGINE, text, data["data"][0]["embedding"])
+        record_embedding_usage(data, time.monotonic() - started)
+        return data
+
+    async def get_embeddings(self, texts, batch_size: int = DEFAULT_MAX_BATCH_SIZE):
+        """
+        Retrieves the embeddings for several texts, requesting the ones
+        missing from the embedding cache in batched API calls.
+
+        :param texts: The texts for which embeddings are required.
+        :param batch_size: Maximum number of texts per API call.
+        :return: One get_embedding result per text, in order.
+        """
+        texts = [normalize_text(text) for text in texts]
+        results = {}
+        missing = []
+        for text in dict.fromkeys(texts):
+            cached = self.embedding_cache.get(ENGINE, text)
+            if cached is not None:
+                results[text] = cached_embedding_response(cached)
+            else:
+                missing.append(text)
+
+        batches = [missing[start:start + batch_size] for start in range(0, len(missing), batch_size)]
+        responses = await asyncio.gather(*[self._timed_embeddings(batch) for batch in batches])
+        for batch, (response, latency) in zip(batches, responses):
+            record_embedding_usage(response, latency)
+            for text, data in zip(batch, split_embedding_response(response)):
+                self.embedding_cache.put(ENGINE, text, data["data"][0]["embedding"])
+                results[text] = data
+        return [results[text] for text in texts]
+
+    async def _timed_embeddings(self, texts):
+        """Requests the embeddings for the given texts, returning the response with the call's latency."""
+        started = time.monotonic()
+        response = await self._create_embeddings(texts)
+        return response, time.monotonic() - started
+
+    async def _create_embeddings(self, texts):
+        """
+        Requests the embeddings for the given texts from the API in one call.
+
+        :param texts: The texts for which embeddings are required.
+        :return: The embedding response as a dictionary.
+        """
+        embedding_input = texts[0] if len(texts) == 1 else texts
+        meter = CallMeter()
+        response = await self._with_retries(
+            lambda timeout: self._openai_client.embeddings.create(input=embedding_input, model=ENGINE, **timeout_kwargs(timeout)),
+            ENGINE,
+            sum(estimate_tokens(text) for text in texts),
+            meter
+        )
+        return {**embedding_response_to_dict(response), "retries": meter.retries}
+
+    async def chat_completion(self, cache=False, cache_ttl: float = None, route: str = DEFAULT_ROUTE, **kwargs):
+        """
+        Generates a chat completion using OpenAI's API. Concurrent identical
+        deterministic requests share one API call.
+
+        :param cache: True to serve deterministic (temperature 0) requests from the completion cache,
+            "force" to cache the request regardless of its sampling parameters.
+        :param cache_ttl: Maximum age in seconds of a cached completion accepted by this call.
+        :param route: Call site whose route selects the model, endpoint and timeout.
+        :param kwargs: Keyword arguments for the chat completion API call.
+        :return: The result of the chat completion API call.
+        """
+        route = self.router.resolve(route)
+        if 'model' not in kwargs:
+            kwargs['model'] = route.deployment
+
+        # cached completions would let a cancelled agent carry on
+        check_cancelled()
+        cache_key = self.completion_cache.key_for(kwargs, cache)
+        if cache_key is not None:
+            cached = self.completion_cache.get(cache_key, cache_ttl)
+            if cached is not None:
+                self._record_chat_usage(route, CallUsage(route.usage_model(kwargs['model']), "chat", cached=True))
+                return cached
+
+        flight_key = completion_flight_key(kwargs, cache_key)
+        if flight_key is None:
+            return await self._request_completion(kwargs, cache_key, route)
+        while True:
+            try:
+                return await self.single_flight.do(("completion", flight_key), lambda: self._request_completion(kwargs, cache_key, route))
+            except RequestCancelled:
+                # the flight was run by a cancelled agent; run it again unless this caller was cancelled too
+                check_cancelled()
+
+    async def _request_completion(self, kwargs, cache_key, route: Route):
+        meter = CallMeter()
+        client = self.router.client(route, self._openai_client)
+        res = await self._with_retries(
+            lambda timeout: client.chat.completions.create(**{**timeout_kwargs(route.attempt_timeout(timeout)), **kwargs}),
+            kwargs['model'],
+            estimate_request_tokens(kwargs),
+            meter
+        )
+        content = completion_content(res)
+        self._record_chat_usage(route, completion_usage(route.usage_model(kwargs['model']), res, meter, estimate_prompt_tokens(kwargs), content))
+        if cache_key is not None:
+            self.completion_cache.put(cache_key, kwargs['model'], content)
+        return content
+
+    def _record_chat_usage(self, route: Route, usage: CallUsage):
+        record_usage(usage)
+        self.router.record(route, usage)
+
+    async def chat_completion_stream(self, route: str = DEFAULT_ROUTE, **kwargs):
+        """
+        Generates a chat completion using OpenAI's API and yields its content
+        as it arrives. Closing the generator early closes the HTTP stream.
+
+        :param route: Call site whose route selects the model, endpoint and timeout.
+        :param kwargs: Keyword arguments for the chat completion API call.
+        :return: Async generator of content deltas.
+        """
+        route = self.router.resolve(route)
+        if 'model' not in kwargs:
+            kwargs['model'] = route.deployment
+
+        meter = CallMeter()
+        client = self.router.client(route, self._openai_client)
+        stream = await self._with_retries(
+            lambda timeout: client.chat.completions.create(**{**timeout_kwargs(route.attempt_timeout(timeout)), **kwargs, "stream": True}),
+            kwargs['model'],
+            estimate_request_tokens(kwargs),
+            meter
+        )
+        streamed = []
+        try:
+            async for chunk in stream:
+                check_cancelled()
+                content = chunk_content(chunk)
+                if content:
+                    streamed.append(content)
+                    yield content
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                await close()
+            # streamed responses carry no usage, so tokens are estimated
+            self._record_chat_usage(route, completion_usage(route.usage_model(kwargs['model']), None, meter, estimate_prompt_tokens(kwargs), "".join(streamed)))
+
+    async def _with_retries(self, request, model, tokens, meter: CallMeter = None):
+        async def attempt(timeout):
+            check_cancelled()
+            if meter is not None:
+                meter.attempt()
+            await self.rate_limiter.acquire_async(model, tokens)
+            return await request(timeout)
+
+        return await self.retry_policy.run_async(attempt, self.rate_limiter.error_handler(model))
+
+
+class BackgroundEventLoop:
+    """
+    A process-wide event loop running in a daemon thread, used to call
+    coroutines from synchronous code.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="openai-event-loop", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def get(cls):
+        """Returns the shared background event loop, starting it on first use."""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def run(self, coroutine, cancellable: bool = True):
+        """
+        Runs a coroutine on the loop and blocks the calling thread until it
+        finishes. Cancelling the caller's token cancels a cancellable
+        coroutine, which aborts its in-flight HTTP request.
+        """
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        token = current_token()
+        if token is None or not cancellable:
+            return future.result()
+        unregister = token.on_cancel(future.cancel)
+        try:
+            return future.result()
+        except concurrent.futures.CancelledError:
+            raise RequestCancelled("The agent making this request was cancelled")
+        finally:
+            unregister()
+
+
+class SyncOpenAIAPIWrapperAdapter(OpenAIAPIWrapper):
+    """
+    Thin synchronous adapter over AsyncOpenAIAPIWrapper. All calls share one
+    background event loop, so blocked callers wait on a future instead of
+    each holding a connection in its own thread.
+    """
+
+    def __init__(self, async_wrapper: AsyncOpenAIAPIWrapper, event_loop: BackgroundEventLoop = None):
+        super().__init__(
+            openai_client = None,
+            embedding_cache = async_wrapper.embedding_cache,
+            rate_limiter = async_wrapper.rate_limiter,
+            retry_policy = async_wrapper.retry_policy,
+            completion_cache = async_wrapper.completion_cache,
+            router = async_wrapper.router
+        )
+        self.async_wrapper = async_wrapper
+        self.event_loop = event_loop or BackgroundEventLoop.get()
+
+    def _create_embeddings(self, texts):
+        return self.event_loop.run(self.async_wrapper._create_embeddings(texts))
+
+    def chat_completion(self, **kwargs):
+        return self.event_loop.run(self.async_wrapper.chat_completion(**kwargs))
+
+    def chat_completion_stream(self, **kwargs):
+        stream = self.async_wrapper.chat_completion_stream(**kwargs)
+        try:
+            while (content := self.event_loop.run(next_chunk(stream))) is not None:
+                yield content
+        finally:
+            self.event_loop.run(close_stream(stream), cancellable=False)
+
+
+async def next_chunk(stream):
+    """Returns the next item of an async generator, or None once it is exhausted."""
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def close_stream(stream):
+    await stream.aclose()
@@ -0,0 +1,107 @@
+import contextlib
+import contextvars
+import logging
+import threading
+
+from typing import Callable, Optional
+
+logger = logging.getLogger()
+
+_current_token = contextvars.ContextVar("cancellation_token", default=None)
+
+
+class RequestCancelled(Exception):
+    """Raised by API calls made on behalf of a cancelled agent."""
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation signal. Cancelling a token cancels its child
+    tokens too, so cancelling an agent reaches every agent it delegated to.
+    """
+
+    def __init__(self, parent: "CancellationToken" = None):
+        self.parent = parent
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._children = set()
+        self._callbacks = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def child(self) -> "CancellationToken":
+        """Creates a token that is cancelled together with this one."""
+        child = CancellationToken(self)
+        with self._lock:
+            self._children.add(child)
+            cancelled = self._cancelled
+        if cancelled:
+            child.cancel()
+        return child
+
+    def detach(self) -> None:
+        """Stops propagating the parent's cancellation, once the work the token covered is done."""
+        if self.parent is not None:
+            with self.parent._lock:
+                self.parent._children.discard(self)
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            children, callbacks = list(self._children), list(self._callbacks)
+            self._callbacks.clear()
+        for callback in callbacks:
+            callback()
+        for child in children:
+            child.cancel()
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Calls callback when the token is cancelled, right away if it already is.
+
+        :return: Function unregistering the callback.
+        """
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return lambda: self._remove_callback(callback)
+        callback()
+        return lambda: None
+
+    def _remove_callback(self, callback) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+def current_token() -> Optional[CancellationToken]:
+    """Returns the cancellation token of the current context, if any."""
+    return _current_token.get()
+
+
+@contextlib.contextmanager
+def cancellation_scope():
+    """
+    Runs the enclosed work under a new token, a child of the current one.
+    Threads started with a copy of the context share the token.
+    """
+    parent = _current_token.get()
+    token = parent.child() if parent is not None else CancellationToken()
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+        token.detach()
+
+
+def check_cancelled() -> None:
+    """Raises RequestCancelled if the work of the current context was cancelled."""
+    token = _current_token.get()
+    if token is not None and token.cancelled:
+        logger.debug("Skipping API call of a cancelled agent")
+        raise RequestCancelled("The agent making this request was cancelled")
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from typing import Optional
+from .memoize import CacheMaintenance, CachePolicy, LRUCache, SQLiteConnectionPool
+
+logger = logging.getLogger()
+
+COMPLETION_TABLE = "completions"
+DEFAULT_COMPLETION_CACHE_POLICY = CachePolicy(max_rows=50_000, max_bytes=256 * 1024 * 1024, ttl=30 * 24 * 3600)
+FORCE = "force"
+# request arguments that change how a completion is delivered, not what it is
+NON_SEMANTIC_ARGUMENTS = {"timeout", "user", "extra_headers"}
+
+
+def is_deterministic(kwargs: dict) -> bool:
+    """
+    Returns True if a chat completion request is expected to give the same
+    answer every time: sampling at temperature 0 and a single choice.
+    The API defaults to temperature 1, so requests without one are sampled.
+    """
+    return kwargs.get("temperature", 1) == 0 and kwargs.get("n", 1) == 1 and not kwargs.get("stream")
+
+
+class SQLiteCompletionCache:
+    """
+    Opt-in cache of chat completion contents, keyed by a canonical hash of
+    the model, the messages and the sampling parameters. Hot entries are
+    served from an in-process LRU tier; the database is bounded by the
+    eviction policy and shared across processes using the same file.
+    """
+
+    def __init__(self, filename: str = "openai_completion_cache.db", policy: CachePolicy = None, lru_size: int = 1024):
+        self.filename = filename
+        self.policy = policy or DEFAULT_COMPLETION_CACHE_POLICY
+        self.lru = LRUCache(lru_size)
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def compute_key(kwargs: dict) -> str:
+        """Returns the cache key of a chat completion request."""
+        request = {name: value for name, value in kwargs.items() if name not in NON_SEMANTIC_ARGUMENTS}
+        canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def key_for(self, kwargs: dict, cache=False) -> Optional[str]:
+        """
+        Returns the cache key of a request, or None if the request bypasses
+        the cache.
+
+        :param kwargs: The chat completion arguments, including the model.
+        :param cache: False to bypass, True to cache deterministic requests, FORCE to cache any request.
+        """
+        if not cache or (cache != FORCE and not is_deterministic(kwargs)):
+            return None
+        return self.compute_key(kwargs)
+
+    def get(self, key: str, ttl: float = None) -> Optional[str]:
+        """
+        Looks up a cached completion.
+
+        :param key: The key returned by key_for.
+        :param ttl: Maximum age in seconds accepted by this call site, None for the policy's.
+        :return: The completion content, or None on a miss.
+        """
+        entry = self.lru.get(key)
+        if entry is None:
+            with self._pool().connection() as connection:
+                entry = connection.execute(
+                    "SELECT content, created_at FROM completions WHERE key = ?", (key,)
+                ).fetchone()
+            if entry is not None:
+                self.lru.put(key, entry)
+
+        if entry is not None and ttl is not None and (entry[1] or 0) < time.time() - ttl:
+            entry = None
+
+        with self._stats_lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        maintenance = self._maintenance()
+        if entry is None:
+            maintenance.record_miss()
+            return None
+        maintenance.record_hit(key)
+        return entry[0]
+
+    def put(self, key: str, model: str, content: str) -> None:
+        """Stores the content of a completion."""
+        now = time.time()
+        with self._pool().connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO completions (key, model, content, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, model, content, now, now)
+            )
+            connection.commit()
+        self.lru.put(key, (content, now))
+        self._maintenance().maybe_evict()
+
+    def cache_stats(self) -> dict:
+        """Returns entries, bytes, hit ratio and evictions of the cache database."""
+        return self._maintenance().stats()
+
+    def compact(self) -> dict:
+        """Evicts entries outside the policy and vacuums the cache database."""
+        self.lru.clear()
+        return self._maintenance().compact()
+
+    def stats(self) -> dict:
+        """Returns the hits, misses and hit rate of this process."""
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _pool(self) -> SQLiteConnectionPool:
+        return SQLiteConnectionPool.for_file(self.filename, initialize_completion_schema)
+
+    def _maintenance(self) -> CacheMaintenance:
+        return CacheMaintenance.for_table(self._pool(), COMPLETION_TABLE, self.policy, key_column="key", payload_column="content")
+
+
+def initialize_completion_schema(connection):
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS completions ("
+        "key TEXT PRIMARY KEY, model TEXT, content TEXT, created_at REAL, last_access REAL)"
+    )
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS completions_last_access_ndx ON completions(last_access)"
+    )
+    connection.commit()
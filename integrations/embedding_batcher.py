@@ -0,0 +1,101 @@
+import logging
+import queue
+import threading
+import time
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List
+
+logger = logging.getLogger()
+
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT = 0.005  # seconds
+DEFAULT_MAX_CONCURRENT_BATCHES = 4
+
+
+class EmbeddingBatcher:
+    """
+    Collects embedding requests from all threads and sends them as batched
+    API calls. A batch is sent when it holds max_batch_size texts or
+    max_wait seconds after its first text arrived, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        send_batch: Callable[[List[str]], list],
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait: float = DEFAULT_MAX_WAIT,
+        max_concurrent_batches: int = DEFAULT_MAX_CONCURRENT_BATCHES
+    ):
+        """
+        :param send_batch: Embeds a list of texts, returning one result per text in order.
+        :param max_batch_size: Maximum number of texts per API call.
+        :param max_wait: Seconds a text may wait for others to join its batch.
+        :param max_concurrent_batches: Batches that may be in flight at the same time.
+        """
+        self.send_batch = send_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_concurrent_batches = max_concurrent_batches
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def submit(self, text: str) -> Future:
+        """Queues a text and returns a future of its embedding result."""
+        future = Future()
+        self._ensure_started()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str):
+        """Blocks until the batch containing the text has been embedded."""
+        return self.submit(text).result()
+
+    def stats(self) -> dict:
+        """Returns the number of batches sent and their average size."""
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "average_batch_size": self.items / self.batches if self.batches else 0.0,
+                "queued": self._queue.qsize(),
+            }
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_concurrent_batches, thread_name_prefix="embedding-batch")
+                threading.Thread(target=self._collect, name="embedding-batcher", daemon=True).start()
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+            self._executor.submit(self._send, batch)
+
+    def _send(self, batch):
+        try:
+            results = self.send_batch([text for text, _ in batch])
+        except BaseException as e:
+            logger.error(f"Embedding batch of {len(batch)} texts failed: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        if len(results) != len(batch):
+            error = ValueError(f"Expected {len(batch)} embeddings, got {len(results)}")
+            for _, future in batch:
+                future.set_exception(error)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
@@ -0,0 +1,128 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+import unicodedata
+
+import numpy as np
+from typing import Optional
+from .memoize import CacheMaintenance, CachePolicy, SQLiteConnectionPool, add_missing_columns
+
+logger = logging.getLogger()
+
+EMBEDDING_CACHE_DTYPE = np.float32
+EMBEDDING_TABLE = "embeddings"
+DEFAULT_EMBEDDING_CACHE_POLICY = CachePolicy(max_bytes=1024 * 1024 * 1024)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes text before embedding, so equivalent inputs share a cache entry.
+
+    :param text: The text to normalize.
+    :return: NFC-normalized text with collapsed whitespace.
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+class SQLiteEmbeddingCache:
+    """
+    Content-addressed embedding cache. Entries are keyed by a hash of the
+    embedding model and the normalized text, and vectors are stored as
+    float32 BLOBs. The database runs in WAL mode so several worker processes
+    can share warm entries.
+    """
+
+    def __init__(self, filename: str = "openai_embedding_cache.db", policy: CachePolicy = None):
+        self.filename = filename
+        self.policy = policy or DEFAULT_EMBEDDING_CACHE_POLICY
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def compute_key(model: str, text: str) -> str:
+        """Returns the cache key for a model and an already normalized text."""
+        return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        """
+        Looks up the embedding of a text.
+
+        :param model: The embedding model or deployment name.
+        :param text: The normalized text.
+        :return: The cached embedding, or None on a miss.
+        """
+        key = self.compute_key(model, text)
+        with self._pool().connection() as connection:
+            row = connection.execute(
+                "SELECT vector FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+
+        with self._stats_lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        maintenance = self._maintenance()
+        if row is None:
+            maintenance.record_miss()
+            return None
+        maintenance.record_hit(key)
+        return np.frombuffer(row[0], dtype=EMBEDDING_CACHE_DTYPE)
+
+    def put(self, model: str, text: str, embedding) -> None:
+        """
+        Stores the embedding of a text.
+
+        :param model: The embedding model or deployment name.
+        :param text: The normalized text.
+        :param embedding: The embedding vector.
+        """
+        vector = np.asarray(embedding, dtype=EMBEDDING_CACHE_DTYPE)
+        now = time.time()
+        with self._pool().connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, dimensions, vector, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.compute_key(model, text), model, len(vector), vector.tobytes(), now, now)
+            )
+            connection.commit()
+        self._maintenance().maybe_evict()
+
+    def cache_stats(self) -> dict:
+        """Returns entries, bytes, hit ratio and evictions of the cache database."""
+        return self._maintenance().stats()
+
+    def compact(self) -> dict:
+        """Evicts entries outside the policy and vacuums the cache database."""
+        return self._maintenance().compact()
+
+    def stats(self) -> dict:
+        """Returns the hits, misses and hit rate of this process."""
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _pool(self) -> SQLiteConnectionPool:
+        return SQLiteConnectionPool.for_file(self.filename, initialize_embedding_schema)
+
+    def _maintenance(self) -> CacheMaintenance:
+        return CacheMaintenance.for_table(self._pool(), EMBEDDING_TABLE, self.policy, key_column="key", payload_column="vector")
+
+
+def initialize_embedding_schema(connection):
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS embeddings ("
+        "key TEXT PRIMARY KEY, model TEXT, dimensions INTEGER, vector BLOB, created_at REAL, last_access REAL)"
+    )
+    add_missing_columns(connection, EMBEDDING_TABLE, {"last_access": "REAL"})
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS embeddings_last_access_ndx ON embeddings(last_access)"
+    )
+    connection.commit()
@@ -0,0 +1,279 @@
+import logging
+import threading
+import time
+
+from collections import deque
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from utils.utility import get_env_variable
+from .rate_limiter import RATE_LIMIT_SLEEP_DURATION, is_rate_limit_error, retry_after_seconds
+from .retry_policy import LATENCY_SAMPLES, is_retryable_error
+
+logger = logging.getLogger()
+
+DEFAULT_ENDPOINT = "default"
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_COOLDOWN = 30  # seconds an ejected endpoint receives no requests
+# OPENAI_ENDPOINTS entries that configure the pool rather than the client
+POOL_SETTINGS = ("weight", "deployments")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Ejects an endpoint after consecutive failures. After the cool-down a
+    single probe request is let through; its success closes the circuit
+    again, its failure restarts the cool-down.
+    """
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD, cooldown: float = DEFAULT_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.trips = 0
+
+    def available_at(self, now: float) -> float:
+        """Returns when the next request may be sent; now or earlier if it may be sent right away."""
+        if self.state == CLOSED:
+            return now
+        if self.state == OPEN:
+            return self.opened_at + self.cooldown
+        return float("inf") if self.probing else now
+
+    def before_request(self, now: float) -> None:
+        if self.state == OPEN and now >= self.opened_at + self.cooldown:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            self.probing = True
+
+    def success(self) -> bool:
+        """Records a success; returns True if it closed the circuit."""
+        closed = self.state != CLOSED
+        self.state, self.consecutive_failures, self.probing = CLOSED, 0, False
+        return closed
+
+    def failure(self, now: float) -> bool:
+        """Records a failure; returns True if it opened the circuit."""
+        self.consecutive_failures += 1
+        self.probing = False
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+            self.state, self.opened_at = OPEN, now
+            self.trips += 1
+            return True
+        return False
+
+
+class PoolMember:
+    """An endpoint of a pool with its load, health and metrics."""
+
+    def __init__(self, name: str, client, weight: float = 1.0, deployments: Dict[str, str] = None, breaker: CircuitBreaker = None):
+        """
+        :param name: Endpoint name used in logs and metrics.
+        :param client: The openai client of the endpoint.
+        :param weight: Share of the requests relative to the other members.
+        :param deployments: Deployment names of the endpoint by requested model or deployment.
+        """
+        self.name = name
+        self.client = client
+        self.weight = weight
+        self.deployments = deployments or {}
+        self.breaker = breaker or CircuitBreaker()
+        self.outstanding = 0
+        self.paused_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def available_at(self, now: float) -> float:
+        return max(self.paused_until, self.breaker.available_at(now))
+
+    def request_kwargs(self, kwargs: dict) -> dict:
+        model = kwargs.get("model")
+        if model in self.deployments:
+            return {**kwargs, "model": self.deployments[model]}
+        return kwargs
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            return latencies[min(int(p * len(latencies)), len(latencies) - 1)] if latencies else 0.0
+
+        return {
+            "state": self.breaker.state,
+            "weight": self.weight,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "circuit_trips": self.breaker.trips,
+            "mean_latency": sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50_latency": percentile(0.5),
+            "p95_latency": percentile(0.95),
+        }
+
+
+class EndpointPool:
+    """
+    Spreads requests over several endpoints or deployments. Each request
+    goes to the available member with the fewest outstanding requests
+    relative to its weight; idle members are used in proportion to their
+    weights. Request outcomes serve as passive health checks: rate-limited
+    members are paused for their Retry-After and failing members are
+    ejected by their circuit breaker. When no member is available, the one
+    that recovers first is used rather than failing the request.
+    """
+
+    def __init__(self, members: List[PoolMember]):
+        if not members:
+            raise ValueError("An endpoint pool needs at least one endpoint")
+        self.members = members
+        self._lock = threading.Lock()
+
+    def acquire(self, exclude=()) -> PoolMember:
+        """Picks the member for the next request and counts it as outstanding."""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [member for member in self.members if member not in exclude] or self.members
+            available = [member for member in candidates if member.available_at(now) <= now]
+            if available:
+                member = min(available, key=lambda m: (m.outstanding / m.weight, m.requests / m.weight))
+            else:
+                member = min(candidates, key=lambda m: m.available_at(now))
+            member.breaker.before_request(now)
+            member.outstanding += 1
+            member.requests += 1
+            return member
+
+    def release(self, member: PoolMember, started: float, error: Exception = None) -> None:
+        """Records the outcome of a request sent to member."""
+        with self._lock:
+            now = time.monotonic()
+            member.outstanding -= 1
+            member.latencies.append(now - started)
+            if error is None:
+                if member.breaker.success():
+                    logger.info(f"Endpoint {member.name} recovered")
+                return
+
+            member.errors += 1
+            if is_rate_limit_error(error):
+                # the endpoint is healthy but out of quota until its Retry-After
+                member.rate_limited += 1
+                delay = retry_after_seconds(error)
+                member.paused_until = max(member.paused_until, now + (RATE_LIMIT_SLEEP_DURATION if delay is None else delay))
+                member.breaker.success()
+            elif member.breaker.failure(now):
+                logger.warning(f"Endpoint {member.name} ejected for {member.breaker.cooldown:.0f}s after {member.breaker.consecutive_failures} failures: {error}")
+
+    def stats(self) -> Dict[str, dict]:
+        """Returns load, health and latency metrics by endpoint."""
+        with self._lock:
+            return {member.name: member.stats() for member in self.members}
+
+
+class PooledClient:
+    """
+    Drop-in for an openai client that sends every request to a member of
+    an endpoint pool. A request failing with a transient error is retried
+    on the other members before the error is raised, so the caller's retry
+    policy only backs off when every endpoint failed.
+    """
+
+    def __init__(self, pool: EndpointPool):
+        self.pool = pool
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: self._create("chat", kwargs)))
+        self.embeddings = SimpleNamespace(create=lambda **kwargs: self._create("embeddings", kwargs))
+
+    def _create(self, kind: str, kwargs: dict):
+        tried = []
+        while True:
+            member = self.pool.acquire(exclude=tried)
+            started = time.monotonic()
+            try:
+                response = endpoint_api(member, kind).create(**member.request_kwargs(kwargs))
+            except Exception as error:
+                if self._failed(member, started, error, tried):
+                    continue
+                raise
+            self.pool.release(member, started)
+            return response
+
+    def _failed(self, member: PoolMember, started: float, error: Exception, tried: list) -> bool:
+        """Records a failed request; returns True if it is to be sent to another member."""
+        # invalid requests fail on every endpoint and say nothing about the endpoint's health
+        endpoint_error = is_retryable_error(error)
+        self.pool.release(member, started, error if endpoint_error else None)
+        tried.append(member)
+        if endpoint_error and len(tried) < len(self.pool.members):
+            logger.warning(f"Endpoint {member.name} failed, retrying on another endpoint: {error}")
+            return True
+        return False
+
+
+class AsyncPooledClient(PooledClient):
+    """PooledClient for the async openai clients."""
+
+    async def _create(self, kind: str, kwargs: dict):
+        tried = []
+        while True:
+            member = self.pool.acquire(exclude=tried)
+            started = time.monotonic()
+            try:
+                response = await endpoint_api(member, kind).create(**member.request_kwargs(kwargs))
+            except Exception as error:
+                if self._failed(member, started, error, tried):
+                    continue
+                raise
+            self.pool.release(member, started)
+            return response
+
+
+def endpoint_api(member: PoolMember, kind: str):
+    return member.client.chat.completions if kind == "chat" else member.client.embeddings
+
+
+def get_pool_members() -> List[str]:
+    """
+    Returns the endpoints of OPENAI_ENDPOINT_POOL, a comma-separated list of
+    OPENAI_ENDPOINTS names; "default" is the endpoint of the base settings.
+    """
+    names = get_env_variable("OPENAI_ENDPOINT_POOL", "", False)
+    return [name.strip() for name in names.split(",") if name.strip()]
+
+
+def pool_from_environment(default_client, endpoint_clients: Dict[str, object], endpoint_settings: Dict[str, dict]) -> Optional[EndpointPool]:
+    """
+    Builds the endpoint pool of OPENAI_ENDPOINT_POOL, or returns None when
+    no pool is configured. Endpoints take a "weight" (default 1) and a
+    "deployments" mapping of model names to their deployment names in
+    OPENAI_ENDPOINTS. OPENAI_CIRCUIT_FAILURES and OPENAI_CIRCUIT_COOLDOWN
+    configure the circuit breakers.
+    """
+    names = get_pool_members()
+    if not names:
+        return None
+    failure_threshold = int(get_env_variable("OPENAI_CIRCUIT_FAILURES", DEFAULT_FAILURE_THRESHOLD, False))
+    cooldown = float(get_env_variable("OPENAI_CIRCUIT_COOLDOWN", DEFAULT_COOLDOWN, False))
+
+    members = []
+    for name in names:
+        if name == DEFAULT_ENDPOINT:
+            client, settings = default_client, {}
+        elif name in endpoint_clients:
+            client, settings = endpoint_clients[name], endpoint_settings.get(name, {})
+        else:
+            raise ValueError(f"OPENAI_ENDPOINT_POOL contains {name}, which is not defined in OPENAI_ENDPOINTS")
+        members.append(PoolMember(
+            name, client, float(settings.get("weight", 1.0)), settings.get("deployments"),
+            CircuitBreaker(failure_threshold, cooldown)
+        ))
+    return EndpointPool(members)
@@ -0,0 +1,448 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+
+from types import SimpleNamespace
+from typing import List, Optional, Tuple
+
+import numpy as np
+from openai.types import CreateEmbeddingResponse, Embedding
+from openai.types.chat import ChatCompletion, ChatCompletionChunk, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+from openai.types.chat.chat_completion_chunk import Choice as ChunkChoice, ChoiceDelta
+from openai.types.completion_usage import CompletionUsage
+from openai.types.create_embedding_response import Usage
+
+from prompt_management.prompts import (
+    PROMPT_ENGINEERING_SYSTEM_PROMPT, REACT_STEP_POST_PRIME, REACT_SYSTEM_PROMPT, STANDARD_SYSTEM_PROMPT
+)
+from utils.utility import get_env_variable
+from .completion_cache import NON_SEMANTIC_ARGUMENTS
+from .rate_limiter import estimate_tokens
+
+logger = logging.getLogger()
+
+FAKE_BACKENDS = ("synthetic", "replay")
+DEFAULT_EMBEDDING_DIMENSIONS = 1536
+DEFAULT_AGENT_POOL_SIZE = 50
+STREAM_CHUNK_CHARACTERS = 16
+# share of the latency spent before the first streamed chunk
+TIME_TO_FIRST_TOKEN_SHARE = 0.2
+
+
+class LatencyDistribution:
+    """
+    Latency of a fake API call in seconds. Parsed from specs such as "0.5"
+    or "constant:0.5", "uniform:0.2:1.0" and "lognormal:<median>:<sigma>".
+    """
+
+    def __init__(self, kind: str = "constant", first: float = 0.0, second: float = 0.0, seed: int = None):
+        if kind not in ("constant", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        self.kind = kind
+        self.first = first
+        self.second = second
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: Optional[str], seed: int = None) -> "LatencyDistribution":
+        if not spec:
+            return cls(seed=seed)
+        kind, *values = spec.split(":")
+        try:
+            return cls("constant", float(kind), seed=seed)
+        except ValueError:
+            pass
+        values = [float(value) for value in values] + [0.0, 0.0]
+        return cls(kind, values[0], values[1], seed=seed)
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.kind == "uniform":
+                return self._random.uniform(self.first, self.second)
+            if self.kind == "lognormal":
+                return self.first * self._random.lognormvariate(0, self.second)
+            return self.first
+
+
+class SyntheticBackend:
+    """
+    Generates scripted answers for the framework's own prompts and
+    deterministic embeddings, without network access.
+
+    The Bootstrap Agent delegates every question once with Use Agent[...]
+    and then solves it; other agents run one python block and then solve
+    their task. Delegated agent names come from a fixed pool, so repeated
+    questions reuse agents like they would with a real model.
+    """
+
+    def __init__(
+        self,
+        chat_latency: LatencyDistribution = None,
+        embedding_latency: LatencyDistribution = None,
+        embedding_dimensions: int = DEFAULT_EMBEDDING_DIMENSIONS,
+        agent_pool_size: int = DEFAULT_AGENT_POOL_SIZE
+    ):
+        self.chat_latency = chat_latency or LatencyDistribution()
+        self.embedding_latency = embedding_latency or LatencyDistribution()
+        self.embedding_dimensions = embedding_dimensions
+        self.agent_pool_size = agent_pool_size
+
+    @classmethod
+    def from_environment(cls) -> "SyntheticBackend":
+        return cls(
+            LatencyDistribution.parse(get_env_variable("FAKE_LLM_CHAT_LATENCY", None, False)),
+            LatencyDistribution.parse(get_env_variable("FAKE_LLM_EMBEDDING_LATENCY", None, False)),
+            int(get_env_variable("FAKE_LLM_EMBEDDING_DIMENSIONS", str(DEFAULT_EMBEDDING_DIMENSIONS), False)),
+            int(get_env_variable("FAKE_LLM_AGENT_POOL_SIZE", str(DEFAULT_AGENT_POOL_SIZE), False))
+        )
+
+    def complete(self, kwargs: dict) -> Tuple[str, float]:
+        """Returns the scripted answer to a chat completion request and its latency."""
+        return self.script(kwargs.get("messages", [])), self.chat_latency.sample()
+
+    def embed(self, texts: List[str]) -> Tuple[List[List[float]], float]:
+        """Returns unit-length embeddings seeded by the texts and the latency of the call."""
+        return [self.embedding(text) for text in texts], self.embedding_latency.sample()
+
+    def embedding(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.embedding_dimensions)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def script(self, messages: List[dict]) -> str:
+        system = messages[0]["content"] if messages else ""
+        user = messages[-1]["content"] if len(messages) > 1 else ""
+
+        if system == PROMPT_ENGINEERING_SYSTEM_PROMPT:
+            goal = re.search(r"for the goal '(.*?)'", user)
+            return f"You are an agent specialized in {goal.group(1) if goal else 'solving tasks'}. Print every result you compute."
+        if system.startswith("Please rate"):
+            return "5"
+        if system.startswith("To refine and enhance"):
+            return "You are an agent that solves its task with short Python programs and prints the result."
+        if system == STANDARD_SYSTEM_PROMPT:
+            return "The synthetic answer is 42."
+        if system == REACT_SYSTEM_PROMPT:
+            question = re.search(r"The original question / task was: (.*)", user)
+            return f"Synthetic answer to: {question.group(1) if question else 'the task'}"
+
+        question = re.search(r"Question: (.*)", user)
+        question = question.group(1) if question else user
+        if "Output of Agent" in user or "Observation:" in user:
+            return f"Thought: The observations answer the question.\nQuery Solved: The synthetic answer to '{question}' is 42."
+        if REACT_STEP_POST_PRIME in user:
+            agent_number = int(hashlib.sha256(question.encode("utf-8")).hexdigest(), 16) % self.agent_pool_size
+            return f"Thought: I need a specialized agent.\nAction: Use Agent[Synthetic Lookup Agent {agent_number}:{question}]"
+        return "Thought: I will compute the answer.\nAction: ```python\nprint(6 * 7)\n```"
+
+
+class ReplayBackend:
+    """
+    Serves recorded responses from a cassette file of JSON lines.
+
+    Requests are matched by a hash of their semantic arguments. The
+    framework's prompts embed the current date, so a request without an
+    exact match is served the next unused recording of the same kind,
+    in recording order.
+    """
+
+    def __init__(self, cassette_path: str):
+        self.cassette_path = cassette_path
+        self._exact = {}
+        self._ordered = {"chat": [], "embedding": []}
+        self._positions = {"chat": 0, "embedding": 0}
+        self._lock = threading.Lock()
+        with open(cassette_path, "r", encoding="utf-8") as cassette:
+            for line in cassette:
+                if line.strip():
+                    record = json.loads(line)
+                    self._exact.setdefault(record["key"], record)
+                    self._ordered[record["kind"]].append(record)
+
+    def complete(self, kwargs: dict) -> Tuple[str, float]:
+        record = self._lookup("chat", kwargs)
+        return record["response"]["content"], record.get("latency", 0.0)
+
+    def embed(self, texts: List[str]) -> Tuple[List[List[float]], float]:
+        record = self._lookup("embedding", {"input": texts})
+        return record["response"]["embeddings"], record.get("latency", 0.0)
+
+    def _lookup(self, kind: str, request: dict) -> dict:
+        record = self._exact.get(request_key(kind, request))
+        if record is not None:
+            return record
+        with self._lock:
+            records = self._ordered[kind]
+            if not records:
+                raise CassetteMissError(f"No recorded {kind} responses in {self.cassette_path}")
+            record = records[self._positions[kind] % len(records)]
+            self._positions[kind] += 1
+            return record
+
+
+class CassetteMissError(LookupError):
+    """Raised when a cassette has no response for a request. Not retried."""
+
+
+class CassetteRecorder:
+    """Appends request/response pairs of a real client to a cassette file."""
+
+    def __init__(self, cassette_path: str):
+        self.cassette_path = cassette_path
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, request: dict, response: dict, latency: float) -> None:
+        line = json.dumps({
+            "kind": kind,
+            "key": request_key(kind, request),
+            "request": request,
+            "response": response,
+            "latency": latency,
+        }, default=str)
+        with self._lock, open(self.cassette_path, "a", encoding="utf-8") as cassette:
+            cassette.write(line + "\n")
+
+
+def request_key(kind: str, request: dict) -> str:
+    """Returns the cassette key of a request."""
+    semantic = {name: value for name, value in request.items() if name not in NON_SEMANTIC_ARGUMENTS and name != "stream"}
+    if kind == "embedding" and isinstance(semantic.get("input"), str):
+        semantic["input"] = [semantic["input"]]
+    canonical = json.dumps({"kind": kind, **semantic}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def chat_completion_response(model: str, content: str, kwargs: dict) -> ChatCompletion:
+    prompt_tokens = sum(estimate_tokens(str(message.get("content") or "")) for message in kwargs.get("messages", []))
+    completion_tokens = estimate_tokens(content)
+    return ChatCompletion(
+        id=f"chatcmpl-fake-{uuid.uuid4().hex}",
+        choices=[Choice(finish_reason="stop", index=0, message=ChatCompletionMessage(role="assistant", content=content))],
+        created=int(time.time()),
+        model=model,
+        object="chat.completion",
+        usage=CompletionUsage(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, total_tokens=prompt_tokens + completion_tokens)
+    )
+
+
+def chat_completion_chunks(model: str, content: str) -> List[ChatCompletionChunk]:
+    completion_id = f"chatcmpl-fake-{uuid.uuid4().hex}"
+    return [
+        ChatCompletionChunk(
+            id=completion_id,
+            choices=[ChunkChoice(delta=ChoiceDelta(content=content[start:start + STREAM_CHUNK_CHARACTERS]), index=0)],
+            created=int(time.time()),
+            model=model,
+            object="chat.completion.chunk"
+        )
+        for start in range(0, len(content), STREAM_CHUNK_CHARACTERS)
+    ]
+
+
+def embedding_response(model: str, texts: List[str], embeddings: List[List[float]]) -> CreateEmbeddingResponse:
+    tokens = sum(estimate_tokens(text) for text in texts)
+    return CreateEmbeddingResponse(
+        data=[Embedding(embedding=embedding, index=index, object="embedding") for index, embedding in enumerate(embeddings)],
+        model=model,
+        object="list",
+        usage=Usage(prompt_tokens=tokens, total_tokens=tokens)
+    )
+
+
+class FakeStream:
+    """Stream of chat completion chunks, paced like a real response."""
+
+    def __init__(self, chunks, delay_per_chunk: float):
+        self.chunks = chunks
+        self.delay_per_chunk = delay_per_chunk
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            if self.closed:
+                return
+            time.sleep(self.delay_per_chunk)
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+class AsyncFakeStream(FakeStream):
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            if self.closed:
+                return
+            await asyncio.sleep(self.delay_per_chunk)
+            yield chunk
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeOpenAIClient:
+    """
+    Stand-in for openai.OpenAI answering from a synthetic or replay
+    backend, so the wrapper's retry, rate-limit and cache layers run
+    unchanged.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_chat_completion))
+        self.embeddings = SimpleNamespace(create=self._create_embedding)
+
+    def _create_chat_completion(self, **kwargs):
+        content, latency = self.backend.complete(kwargs)
+        if kwargs.get("stream"):
+            return self._stream(kwargs["model"], content, latency)
+        time.sleep(latency)
+        return chat_completion_response(kwargs["model"], content, kwargs)
+
+    def _stream(self, model, content, latency):
+        chunks = chat_completion_chunks(model, content)
+        time.sleep(latency * TIME_TO_FIRST_TOKEN_SHARE)
+        return FakeStream(chunks, latency * (1 - TIME_TO_FIRST_TOKEN_SHARE) / max(len(chunks), 1))
+
+    def _create_embedding(self, input, model, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        embeddings, latency = self.backend.embed(texts)
+        time.sleep(latency)
+        return embedding_response(model, texts, embeddings)
+
+
+class AsyncFakeOpenAIClient(FakeOpenAIClient):
+    """Stand-in for openai.AsyncOpenAI; waiting never blocks the event loop."""
+
+    async def _create_chat_completion(self, **kwargs):
+        content, latency = self.backend.complete(kwargs)
+        if kwargs.get("stream"):
+            chunks = chat_completion_chunks(kwargs["model"], content)
+            await asyncio.sleep(latency * TIME_TO_FIRST_TOKEN_SHARE)
+            return AsyncFakeStream(chunks, latency * (1 - TIME_TO_FIRST_TOKEN_SHARE) / max(len(chunks), 1))
+        await asyncio.sleep(latency)
+        return chat_completion_response(kwargs["model"], content, kwargs)
+
+    async def _create_embedding(self, input, model, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        embeddings, latency = self.backend.embed(texts)
+        await asyncio.sleep(latency)
+        return embedding_response(model, texts, embeddings)
+
+
+class RecordingOpenAIClient:
+    """Wraps a real openai.OpenAI client and records every response to a cassette."""
+
+    def __init__(self, client, recorder: CassetteRecorder):
+        self.client = client
+        self.recorder = recorder
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_chat_completion))
+        self.embeddings = SimpleNamespace(create=self._create_embedding)
+
+    def _create_chat_completion(self, **kwargs):
+        started = time.monotonic()
+        response = self.client.chat.completions.create(**kwargs)
+        if kwargs.get("stream"):
+            return self._record_stream(kwargs, response, started)
+        self.recorder.record("chat", kwargs, {"content": response.choices[0].message.content}, time.monotonic() - started)
+        return response
+
+    def _record_stream(self, kwargs, stream, started):
+        content = ""
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    content += chunk.choices[0].delta.content
+                yield chunk
+        finally:
+            stream.close()
+            self.recorder.record("chat", kwargs, {"content": content}, time.monotonic() - started)
+
+    def _create_embedding(self, **kwargs):
+        started = time.monotonic()
+        response = self.client.embeddings.create(**kwargs)
+        embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        self.recorder.record("embedding", kwargs, {"embeddings": embeddings}, time.monotonic() - started)
+        return response
+
+
+class AsyncRecordingOpenAIClient(RecordingOpenAIClient):
+    """Wraps a real openai.AsyncOpenAI client and records every response to a cassette."""
+
+    async def _create_chat_completion(self, **kwargs):
+        started = time.monotonic()
+        response = await self.client.chat.completions.create(**kwargs)
+        if kwargs.get("stream"):
+            return self._record_stream(kwargs, response, started)
+        self.recorder.record("chat", kwargs, {"content": response.choices[0].message.content}, time.monotonic() - started)
+        return response
+
+    async def _record_stream(self, kwargs, stream, started):
+        content = ""
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    content += chunk.choices[0].delta.content
+                yield chunk
+        finally:
+            await stream.close()
+            self.recorder.record("chat", kwargs, {"content": content}, time.monotonic() - started)
+
+    async def _create_embedding(self, **kwargs):
+        started = time.monotonic()
+        response = await self.client.embeddings.create(**kwargs)
+        embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        self.recorder.record("embedding", kwargs, {"embeddings": embeddings}, time.monotonic() - started)
+        return response
+
+
+def get_backend_name() -> str:
+    """Returns the LLM backend selected by OPENAI_BACKEND: openai, synthetic, replay or record."""
+    name = get_env_variable("OPENAI_BACKEND", "openai", False).strip().lower()
+    if name not in ("openai", "record") + FAKE_BACKENDS:
+        raise ValueError(f"Unknown OPENAI_BACKEND: {name}")
+    return name
+
+
+def get_cassette_path() -> str:
+    return get_env_variable("FAKE_LLM_CASSETTE", "llm_cassette.jsonl", False)
+
+
+def record_to_cassette(client, use_async: bool = False):
+    """Wraps a real client so its responses are appended to the cassette."""
+    recorder = CassetteRecorder(get_cassette_path())
+    logger.info(f"Recording LLM responses to {recorder.cassette_path}")
+    return AsyncRecordingOpenAIClient(client, recorder) if use_async else RecordingOpenAIClient(client, recorder)
+
+
+def get_backend(name: str):
+    """Returns the synthetic or replay backend configured from the environment."""
+    if name == "synthetic":
+        return SyntheticBackend.from_environment()
+    if name == "replay":
+        return ReplayBackend(get_cassette_path())
+    raise ValueError(f"Unknown fake LLM backend: {name}")
+
+
+def create_fake_client(name: str, use_async: bool = False):
+    """
+    Returns a fake client for the backend selected by OPENAI_BACKEND.
+
+    :param name: "synthetic" or "replay".
+    :param use_async: Whether to return a client for AsyncOpenAIAPIWrapper.
+    """
+    backend = get_backend(name)
+    logger.info(f"Using the {name} LLM backend, no requests are sent to OpenAI")
+    return AsyncFakeOpenAIClient(backend) if use_async else FakeOpenAIClient(backend)
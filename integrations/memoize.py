@@ -1,44 +1,448 @@
+import atexit
+import contextlib
 import sqlite3
 import hashlib
 import json
 import functools
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from utils.utility import get_env_variable
 
 ## Originally from https://www.kevinkatz.io/posts/memoize-to-sqlite
 
-def memoize_to_sqlite(func_name: str, filename: str = "cache.db"):
+logger = logging.getLogger()
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_LRU_SIZE = 1024
+BUSY_TIMEOUT = 30  # seconds
+CACHE_TABLE = "cache"
+
+def memoize_to_sqlite(func_name: str, filename: str = "cache.db", lru_size: int = DEFAULT_LRU_SIZE, policy: "CachePolicy" = None):
     """
     Memoization decorator that caches the output of a method in a SQLite
-    database.
+    database. Hot keys are served from a bounded in-process LRU tier and
+    never touch the database. The database is kept within the given
+    eviction policy in the background.
+
+    A relative filename is resolved against MICROAGENTS_CACHE_DIR, if set,
+    when the function is called.
+
+    The wrapped function exposes ``cache_stats()``, ``evict()`` and ``compact()``.
     """
     def decorator(func):
+        lru = LRUCache(lru_size)
+
+        def maintenance():
+            return CacheMaintenance.for_table(SQLiteConnectionPool.for_file(cache_path(filename)), CACHE_TABLE, policy)
+
         @functools.wraps(func)
         def wrapped(*args, **kwargs):
-            with SQLiteMemoization(filename) as memoizer:
-                return memoizer.fetch_or_compute(func, func_name, *args, **kwargs)
+            arg_hash = compute_hash(func_name, *args, **kwargs)
+            serialized = lru.get(arg_hash)
+            if serialized is not None:
+                maintenance().record_hit(arg_hash)
+                return json.loads(serialized)
+
+            path = cache_path(filename)
+            with SQLiteMemoization(path, policy) as memoizer:
+                result = memoizer._fetch_from_cache(arg_hash)
+
+            if result is None:
+                # computed without holding a pooled connection, the call may be slow
+                result = func(*args, **kwargs)
+                with SQLiteMemoization(path, policy) as memoizer:
+                    memoizer._cache_result(arg_hash, result)
+
+            lru.put(arg_hash, json.dumps(result))
+            return result
+
+        def compact():
+            lru.clear()
+            return maintenance().compact()
+
+        wrapped.lru_cache = lru
+        wrapped.cache_stats = lambda: maintenance().stats()
+        wrapped.evict = lambda: maintenance().evict()
+        wrapped.compact = compact
         return wrapped
     return decorator
 
+def cache_path(filename: str) -> str:
+    """Resolves a relative cache database name against MICROAGENTS_CACHE_DIR, if set."""
+    directory = get_env_variable("MICROAGENTS_CACHE_DIR", None, False)
+    return os.path.join(directory, filename) if directory else filename
+
+def compute_hash(func_name, *args, **kwargs):
+    data = f"{func_name}:{repr(args)}:{repr(kwargs)}".encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+class LRUCache:
+    """
+    A thread-safe, size-bounded least-recently-used cache.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_LRU_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            return self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class SQLiteConnectionPool:
+    """
+    A thread-safe pool of long-lived SQLite connections to one database file.
+    Connections are opened lazily in WAL mode. Each schema initializer is
+    run once, when a connection is first acquired after it was added, so
+    stores with different tables can share a database file.
+    """
+
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, filename, initialize_schema=None, size: int = DEFAULT_POOL_SIZE):
+        self.filename = filename
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._schemas = []
+        self._pending_schemas = [initialize_schema or initialize_cache_schema]
+
+    @classmethod
+    def for_file(cls, filename, initialize_schema=None):
+        """
+        Returns the process-wide pool for the given database file. If the
+        pool already exists, the caller's schema is added to it.
+
+        :param initialize_schema: Function creating the caller's tables, defaults to the memoization cache table.
+        """
+        with cls._pools_lock:
+            pool = cls._pools.get(filename)
+            if pool is None:
+                pool = cls._pools[filename] = cls(filename, initialize_schema)
+            else:
+                pool.add_schema(initialize_schema or initialize_cache_schema)
+            return pool
+
+    @classmethod
+    def close_all(cls):
+        """Closes the idle connections of all pools."""
+        with cls._pools_lock:
+            pools = list(cls._pools.values())
+            cls._pools.clear()
+        for pool in pools:
+            pool.close()
+
+    def add_schema(self, initialize_schema):
+        """Queues a schema initializer to run on the next acquired connection, unless it was added before."""
+        with self._lock:
+            if initialize_schema not in self._schemas and initialize_schema not in self._pending_schemas:
+                self._pending_schemas.append(initialize_schema)
+
+    def acquire(self) -> sqlite3.Connection:
+        connection = self._acquire()
+        if self._pending_schemas:
+            try:
+                self._initialize_schemas(connection)
+            except Exception:
+                self.release(connection)
+                raise
+        return connection
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if not can_open:
+            return self._idle.get()
+
+        try:
+            return self._open()
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+
+    def _initialize_schemas(self, connection: sqlite3.Connection):
+        with self._lock:
+            while self._pending_schemas:
+                self._pending_schemas[0](connection)
+                self._schemas.append(self._pending_schemas.pop(0))
+
+    def release(self, connection: sqlite3.Connection):
+        self._idle.put(connection)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Context manager lending a pooled connection."""
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def close(self):
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            connection.close()
+            with self._lock:
+                self._opened -= 1
+
+    def _open(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.filename, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+atexit.register(SQLiteConnectionPool.close_all)
+
+def initialize_cache_schema(connection):
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS cache (hash TEXT PRIMARY KEY, result TEXT, created_at REAL, last_access REAL)"
+    )
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS cache_ndx ON cache(hash)"
+    )
+    add_missing_columns(connection, CACHE_TABLE, {"created_at": "REAL", "last_access": "REAL"})
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS cache_last_access_ndx ON cache(last_access)"
+    )
+    connection.commit()
+
+def add_missing_columns(connection, table, columns):
+    """Adds columns introduced after a cache database was created."""
+    existing = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+    for name, column_type in columns.items():
+        if name not in existing:
+            connection.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+class CachePolicy:
+    """
+    Bounds for a cache table. Entries older than ``ttl`` seconds are dropped,
+    and while the table holds more than ``max_rows`` entries or ``max_bytes``
+    of payload the least recently accessed entries are evicted. Eviction runs
+    in the background at most every ``eviction_interval`` seconds.
+    """
+
+    def __init__(self, max_rows: int = None, max_bytes: int = None, ttl: float = None, eviction_interval: float = 60):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.eviction_interval = eviction_interval
+
+DEFAULT_CACHE_POLICY = CachePolicy(max_rows=100_000, max_bytes=256 * 1024 * 1024)
+
+class CacheMaintenance:
+    """
+    Enforces a CachePolicy on one cache table and keeps its statistics.
+
+    Last-access timestamps of hits are buffered in memory and written in
+    batches together with the eviction, so reads stay read-only.
+    """
+
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, pool, table, key_column, payload_column, policy: CachePolicy = None):
+        self.pool = pool
+        self.table = table
+        self.key_column = key_column
+        self.payload_column = payload_column
+        self.policy = policy or DEFAULT_CACHE_POLICY
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._touched = {}
+        self._lock = threading.Lock()
+        self._running = False
+        self._last_run = time.monotonic()
+
+    @classmethod
+    def for_table(cls, pool, table, policy: CachePolicy = None, key_column="hash", payload_column="result"):
+        """Returns the process-wide maintenance of a table; a given policy replaces the current one."""
+        with cls._registry_lock:
+            key = (pool.filename, table)
+            maintenance = cls._registry.get(key)
+            if maintenance is None or maintenance.pool is not pool:
+                maintenance = cls._registry[key] = cls(pool, table, key_column, payload_column, policy)
+            elif policy is not None:
+                maintenance.policy = policy
+            return maintenance
+
+    def record_hit(self, key):
+        with self._lock:
+            self.hits += 1
+            self._touched[key] = time.time()
+        self.maybe_evict()
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def maybe_evict(self):
+        """Starts a background eviction if the eviction interval has elapsed."""
+        with self._lock:
+            if self._running or time.monotonic() - self._last_run < self.policy.eviction_interval:
+                return
+            self._running = True
+
+        threading.Thread(target=self._run_evict, daemon=True).start()
+
+    def evict(self) -> int:
+        """
+        Flushes buffered access times and evicts entries outside the policy.
+
+        :return: Number of evicted entries.
+        """
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            self._last_run = time.monotonic()
+
+        table, key_column = self.table, self.key_column
+        evicted = 0
+        with self.pool.connection() as connection:
+            if touched:
+                connection.executemany(
+                    f"UPDATE {table} SET last_access = ? WHERE {key_column} = ?",
+                    [(accessed, key) for key, accessed in touched.items()]
+                )
+
+            if self.policy.ttl is not None:
+                evicted += connection.execute(
+                    f"DELETE FROM {table} WHERE COALESCE(created_at, 0) < ?", (time.time() - self.policy.ttl,)
+                ).rowcount
+
+            if self.policy.max_rows is not None:
+                count = connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                if count > self.policy.max_rows:
+                    evicted += connection.execute(
+                        f"DELETE FROM {table} WHERE {key_column} IN (SELECT {key_column} FROM {table} "
+                        f"ORDER BY COALESCE(last_access, created_at, 0) ASC LIMIT ?)", (count - self.policy.max_rows,)
+                    ).rowcount
+
+            if self.policy.max_bytes is not None:
+                evicted += self._evict_bytes(connection)
+
+            connection.commit()
+
+        with self._lock:
+            self.evictions += evicted
+        if evicted:
+            logger.info(f"Evicted {evicted} entries from {self.pool.filename}:{table}.")
+        return evicted
+
+    def compact(self) -> dict:
+        """
+        Evicts, checkpoints the write-ahead log and vacuums the database file.
+
+        :return: The cache statistics after compaction.
+        """
+        self.evict()
+        with self.pool.connection() as connection:
+            connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            connection.execute("VACUUM")
+        return self.stats()
+
+    def stats(self) -> dict:
+        """Returns entries, payload bytes, hit ratio and evictions of the cache."""
+        with self.pool.connection() as connection:
+            entries, size = connection.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(LENGTH({self.payload_column})), 0) FROM {self.table}"
+            ).fetchone()
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def _evict_bytes(self, connection) -> int:
+        table, key_column = self.table, self.key_column
+        total = connection.execute(f"SELECT COALESCE(SUM(LENGTH({self.payload_column})), 0) FROM {table}").fetchone()[0]
+        if total <= self.policy.max_bytes:
+            return 0
+
+        victims = []
+        cursor = connection.execute(
+            f"SELECT {key_column}, LENGTH({self.payload_column}) FROM {table} ORDER BY COALESCE(last_access, created_at, 0) ASC"
+        )
+        for key, size in cursor:
+            if total <= self.policy.max_bytes:
+                break
+            victims.append((key,))
+            total -= size or 0
+        connection.executemany(f"DELETE FROM {table} WHERE {key_column} = ?", victims)
+        return len(victims)
+
+    def _run_evict(self):
+        try:
+            self.evict()
+        except Exception as e:
+            logger.exception(f"Error evicting cache entries: {e}")
+        finally:
+            with self._lock:
+                self._running = False
+
 class SQLiteMemoization:
-    def __init__(self, filename):
+    def __init__(self, filename, policy: CachePolicy = None):
         self.filename = filename
         self.connection = None
+        self._pool = SQLiteConnectionPool.for_file(filename)
+        self._maintenance = CacheMaintenance.for_table(self._pool, CACHE_TABLE, policy)
 
     def __enter__(self):
-        self.connection = sqlite3.connect(self.filename)
-        self._initialize_database()
+        self.connection = self._pool.acquire()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.connection.close()
+        self._pool.release(self.connection)
         self.connection = None
 
     def _initialize_database(self):
-        self.connection.execute(
-            "CREATE TABLE IF NOT EXISTS cache (hash TEXT PRIMARY KEY, result TEXT)"
-        )
-        self.connection.execute(
-            "CREATE INDEX IF NOT EXISTS cache_ndx ON cache(hash)"
-        )
+        initialize_cache_schema(self.connection)
 
     def fetch_or_compute(self, func, func_name, *args, **kwargs):
         arg_hash = self._compute_hash(func_name, *args, **kwargs)
@@ -50,14 +454,17 @@ class SQLiteMemoization:
         return self._compute_and_cache_result(func, arg_hash, *args, **kwargs)
 
     def _compute_hash(self, func_name, *args, **kwargs):
-        data = f"{func_name}:{repr(args)}:{repr(kwargs)}".encode("utf-8")
-        return hashlib.sha256(data).hexdigest()
+        return compute_hash(func_name, *args, **kwargs)
 
     def _fetch_from_cache(self, arg_hash):
         cursor = self.connection.cursor()
         cursor.execute("SELECT result FROM cache WHERE hash = ?", (arg_hash,))
         row = cursor.fetchone()
-        return json.loads(row[0]) if row else None
+        if row is None:
+            self._maintenance.record_miss()
+            return None
+        self._maintenance.record_hit(arg_hash)
+        return json.loads(row[0])
 
     def _compute_and_cache_result(self, func, arg_hash, *args, **kwargs):
         result = func(*args, **kwargs)
@@ -65,9 +472,41 @@ class SQLiteMemoization:
         return result
 
     def _cache_result(self, arg_hash, result):
+        now = time.time()
         cursor = self.connection.cursor()
         cursor.execute(
-            "INSERT INTO cache (hash, result) VALUES (?, ?)",
-            (arg_hash, json.dumps(result))
+            "INSERT OR REPLACE INTO cache (hash, result, created_at, last_access) VALUES (?, ?, ?, ?)",
+            (arg_hash, json.dumps(result), now, now)
         )
-        self.connection.commit()
\ No newline at end of file
+        self.connection.commit()
+        self._maintenance.maybe_evict()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or compact a memoization cache database.")
+    parser.add_argument("command", choices=["stats", "evict", "compact"])
+    parser.add_argument("filename", help="cache database, e.g. cache.db or agent_name_evals.db")
+    parser.add_argument("--table", default=CACHE_TABLE, help="cache table, 'embeddings' or 'completions' for the API caches")
+    parser.add_argument("--max-rows", type=int, default=DEFAULT_CACHE_POLICY.max_rows)
+    parser.add_argument("--max-bytes", type=int, default=DEFAULT_CACHE_POLICY.max_bytes)
+    parser.add_argument("--ttl", type=float, default=None, help="maximum entry age in seconds")
+    arguments = parser.parse_args()
+
+    key_column, payload_column = {
+        "embeddings": ("key", "vector"),
+        "completions": ("key", "content"),
+    }.get(arguments.table, ("hash", "result"))
+    cli_policy = CachePolicy(arguments.max_rows, arguments.max_bytes, arguments.ttl)
+    cli_pool = SQLiteConnectionPool(arguments.filename, initialize_schema=lambda connection: add_missing_columns(
+        connection, arguments.table, {"created_at": "REAL", "last_access": "REAL"}
+    ))
+    cli_maintenance = CacheMaintenance(cli_pool, arguments.table, key_column, payload_column, cli_policy)
+
+    if arguments.command == "evict":
+        print(f"Evicted {cli_maintenance.evict()} entries.")
+    elif arguments.command == "compact":
+        print(json.dumps(cli_maintenance.compact(), indent=2))
+    else:
+        print(json.dumps(cli_maintenance.stats(), indent=2))
+    cli_pool.close()
@@ -0,0 +1,139 @@
+import json
+import logging
+
+from typing import Dict, Optional
+
+from utils.utility import get_env_variable
+from .usage_tracking import CallUsage, UsageTotals
+
+logger = logging.getLogger()
+
+DEFAULT_ROUTE = "default"
+REACT_ROUTE = "react"
+EVALUATION_ROUTE = "evaluation"
+NAME_EVALUATION_ROUTE = "name_evaluation"
+EXTRACTION_ROUTE = "extraction"
+EVOLUTION_ROUTE = "evolution"
+PROMPT_ENGINEERING_ROUTE = "prompt_engineering"
+
+# short classification calls, sent to OPENAI_FAST_MODEL when it is set
+FAST_ROUTES = (EVALUATION_ROUTE, NAME_EVALUATION_ROUTE, EXTRACTION_ROUTE)
+FAST_ROUTE_TIMEOUT = 20  # seconds per attempt
+
+
+class Route:
+    """Where the calls of one call site are sent."""
+
+    def __init__(self, name: str, model: str, deployment: str = None, endpoint: str = None, timeout: float = None):
+        """
+        :param name: Name of the call site, e.g. "evaluation".
+        :param model: Model name, used for pricing and reporting.
+        :param deployment: Model or Azure deployment name sent to the API; defaults to model.
+        :param endpoint: Name of an endpoint of OPENAI_ENDPOINTS, None for the default client.
+        :param timeout: Timeout in seconds of a single attempt, None for the retry policy's.
+        """
+        self.name = name
+        self.model = model
+        self.deployment = deployment or model
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def usage_model(self, requested_model: str) -> str:
+        """Returns the model a call is accounted to; callers may still request another model explicitly."""
+        return self.model if requested_model == self.deployment else requested_model
+
+    def attempt_timeout(self, timeout: Optional[float]) -> Optional[float]:
+        """Returns the shorter of the route timeout and the retry policy's attempt timeout."""
+        if self.timeout is None:
+            return timeout
+        return self.timeout if timeout is None else min(self.timeout, timeout)
+
+
+def get_endpoint_settings() -> Dict[str, dict]:
+    """
+    Returns the named endpoints of OPENAI_ENDPOINTS, a JSON object mapping
+    names to client keyword arguments, e.g. {"fast": {"azure_endpoint": "..."}}.
+    An "azure" entry selects the client type; omitted arguments are
+    inherited from the default endpoint of the same type.
+    """
+    settings = get_env_variable("OPENAI_ENDPOINTS", None, False)
+    return json.loads(settings) if settings else {}
+
+
+class ModelRouter:
+    """
+    Routing table from call sites to model, deployment, endpoint and
+    timeout, with the usage and latency of every route. Call sites
+    without a route of their own use the settings of the default route
+    but are still reported separately.
+    """
+
+    def __init__(self, default_model: str, routes: Dict[str, Route] = None, clients: Dict[str, object] = None):
+        """
+        :param default_model: Model of the default route.
+        :param routes: Routes by call site name.
+        :param clients: Clients by endpoint name; routes to unknown endpoints use the default client.
+        """
+        self.routes = {DEFAULT_ROUTE: Route(DEFAULT_ROUTE, default_model), **(routes or {})}
+        self.clients = clients or {}
+        self.usage: Dict[str, UsageTotals] = {}
+
+    @classmethod
+    def from_environment(cls, default_model: str, clients: Dict[str, object] = None) -> "ModelRouter":
+        """
+        Builds the routing table. OPENAI_FAST_MODEL (and optionally
+        OPENAI_FAST_DEPLOYMENT) routes the short classification calls to a
+        faster model. OPENAI_ROUTES holds a JSON object mapping call sites
+        to "model", "deployment", "endpoint" and "timeout" and takes
+        precedence; omitted fields are taken from the default route.
+        """
+        routes = {}
+        fast_model = get_env_variable("OPENAI_FAST_MODEL", None, False)
+        if fast_model:
+            fast_deployment = get_env_variable("OPENAI_FAST_DEPLOYMENT", None, False)
+            for name in FAST_ROUTES:
+                routes[name] = Route(name, fast_model, fast_deployment, timeout=FAST_ROUTE_TIMEOUT)
+
+        overrides = get_env_variable("OPENAI_ROUTES", None, False)
+        endpoints = get_endpoint_settings()
+        for name, settings in (json.loads(overrides) if overrides else {}).items():
+            model = settings.get("model", default_model)
+            endpoint = settings.get("endpoint")
+            if endpoint is not None and endpoint not in endpoints:
+                raise ValueError(f"Route {name} uses endpoint {endpoint}, which is not defined in OPENAI_ENDPOINTS")
+            routes[name] = Route(name, model, settings.get("deployment"), endpoint, settings.get("timeout"))
+        return cls(default_model, routes, clients)
+
+    def resolve(self, name: Optional[str]) -> Route:
+        """Returns the route of a call site; call sites without one get the settings of the default route."""
+        name = name or DEFAULT_ROUTE
+        route = self.routes.get(name)
+        if route is None:
+            default = self.routes[DEFAULT_ROUTE]
+            route = self.routes.setdefault(name, Route(name, default.model, default.deployment, default.endpoint, default.timeout))
+        return route
+
+    def client(self, route: Route, default_client):
+        """Returns the client of the route's endpoint."""
+        return self.clients.get(route.endpoint, default_client)
+
+    def record(self, route: Route, usage: CallUsage) -> None:
+        """Adds a call to the usage of its route."""
+        totals = self.usage.get(route.name)
+        if totals is None:
+            totals = self.usage.setdefault(route.name, UsageTotals())
+        totals.add(usage)
+
+    def stats(self) -> Dict[str, dict]:
+        """Returns calls, tokens, cost and latency by route."""
+        stats = {}
+        for name, totals in list(self.usage.items()):
+            data = totals.to_dict()
+            uncached = data["calls"] - data["cached_calls"]
+            data["mean_latency"] = data["latency"] / uncached if uncached else 0.0
+            stats[name] = data
+        return stats
+
+    def summary(self) -> str:
+        """Returns one line with the usage of every route."""
+        return "; ".join(f"{name}: {totals.summary()}" for name, totals in sorted(self.usage.items()))
@@ -1,11 +1,19 @@
 import openai
-import time
 import logging
+import time
 
 from utils.utility import get_env_variable
-from .memoize import memoize_to_sqlite
-
-RETRY_SLEEP_DURATION = 1  # seconds
+from .cancellation import RequestCancelled, check_cancelled
+from .completion_cache import SQLiteCompletionCache, is_deterministic
+from .embedding_batcher import EmbeddingBatcher
+from .embedding_cache import SQLiteEmbeddingCache, normalize_text
+from .endpoint_pool import POOL_SETTINGS, PooledClient, pool_from_environment
+from .fake_llm import FAKE_BACKENDS, create_fake_client, get_backend_name, record_to_cassette
+from .model_routing import DEFAULT_ROUTE, ModelRouter, Route, get_endpoint_settings
+from .rate_limiter import RateLimiter, estimate_prompt_tokens, estimate_request_tokens, estimate_tokens
+from .retry_policy import RetryPolicy
+from .single_flight import SingleFlight
+from .usage_tracking import CallMeter, CallUsage, completion_usage, record_usage
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -13,12 +21,86 @@ load_dotenv()
 ENGINE=get_env_variable("OPENAI_EMBEDDING", "text-embedding-ada-002", False)
 MODEL=get_env_variable("OPENAI_MODEL", "gpt-4-1106-preview", False)
 
-def get_configured_openai_wrapper(timeout: float = 10, max_retries: int = 5):
+def get_configured_openai_wrapper(timeout: float = 60, max_retries: int = 5):
+    """
+    Returns the configured OpenAI wrapper. Setting OPENAI_USE_ASYNC_CLIENT
+    returns a synchronous adapter over the async client instead.
+
+        :param timeout: Overall deadline in seconds for an API call including its retries.
+        :param max_retries: Number of attempts for API requests.
+
+    OPENAI_BACKEND selects where requests go: "openai" (default), "synthetic"
+    for scripted offline answers, "replay" to serve a recorded cassette and
+    "record" to record the responses of the real API to the cassette.
+    Call sites are routed to models and endpoints as described in
+    ModelRouter.from_environment; offline backends serve every endpoint.
+    OPENAI_ENDPOINT_POOL spreads the default route's requests over several
+    endpoints, see pool_from_environment.
+    """
+    if is_truthy(get_env_variable("OPENAI_USE_ASYNC_CLIENT", "false", False)):
+        from .async_openaiwrapper import SyncOpenAIAPIWrapperAdapter, get_configured_async_openai_wrapper
+        return SyncOpenAIAPIWrapperAdapter(get_configured_async_openai_wrapper(timeout, max_retries))
+
+    backend = get_backend_name()
+    endpoint_clients = {}
+    if backend in FAKE_BACKENDS:
+        client = create_fake_client(backend)
+    else:
+        use_azure, params = get_client_settings()
+        client = create_openai_client(use_azure, params)
+        endpoint_clients = create_endpoint_clients(use_azure, params)
+        if backend == "record":
+            client = record_to_cassette(client)
+            endpoint_clients = {name: record_to_cassette(endpoint) for name, endpoint in endpoint_clients.items()}
+        pool = pool_from_environment(client, endpoint_clients, get_endpoint_settings())
+        if pool is not None:
+            client = PooledClient(pool)
+    return OpenAIAPIWrapper(
+        openai_client = client,
+        timeout = timeout,
+        max_retries = max_retries,
+        router = ModelRouter.from_environment(MODEL, endpoint_clients)
+    )
+
+
+def create_openai_client(use_azure: bool, params: dict, use_async: bool = False):
+    """
+    Creates an OpenAI or Azure OpenAI client.
+
+        :param use_async: True for the asyncio client.
+    """
+    if use_async:
+        return openai.AsyncAzureOpenAI(**params) if use_azure else openai.AsyncOpenAI(**params)
+    return openai.AzureOpenAI(**params) if use_azure else openai.OpenAI(**params)
+
+
+def create_endpoint_clients(use_azure: bool, params: dict, use_async: bool = False):
+    """
+    Creates a client for every endpoint of OPENAI_ENDPOINTS. Endpoints of the
+    same type as the default endpoint inherit its settings, e.g. the API key.
+
+        :return: Clients by endpoint name.
+    """
+    clients = {}
+    for name, settings in get_endpoint_settings().items():
+        settings = {key: value for key, value in settings.items() if key not in POOL_SETTINGS}
+        endpoint_uses_azure = settings.pop("azure", use_azure)
+        inherited = params if endpoint_uses_azure == use_azure else {}
+        clients[name] = create_openai_client(endpoint_uses_azure, {**inherited, **settings}, use_async)
+    return clients
+
+
+def is_truthy(value: str) -> bool:
+    """Returns True for the usual spellings of a true environment flag."""
+    value = value.strip().lower()
+    return value == "true" or value == "1" or value == "yes" or value == "y"
+
+
+def get_client_settings():
     """
-    Returns the configured OpenAI wrapper.
+    Reads the OpenAI / Azure OpenAI client settings from the environment.
 
-        :param timeout: The timeout duration in seconds for API requests.
-        :param max_retries: Number of retries for API requests.
+        :return: Tuple of whether Azure OpenAI is used and the client keyword arguments.
     """
     openai_base_url = get_env_variable("OPENAI_BASE_URL", None, False)
     # backward compatibility with OPENAI_API_BASE
@@ -29,13 +111,13 @@ def get_configured_openai_wrapper(timeout: float = 10, max_retries: int = 5):
     azure_openai_api_key = get_env_variable("AZURE_OPENAI_API_KEY", None, False)
     azure_openai_endpoint = get_env_variable("AZURE_OPENAI_ENDPOINT", None, False)
     azure_openai_api_version = get_env_variable("AZURE_OPENAI_API_VERSION", "2024-03-01-preview", False)
-    azure_openai_use_aad = get_env_variable("AZURE_OPENAI_USE_AAD", "false", False).strip().lower()
+    azure_openai_use_aad = get_env_variable("AZURE_OPENAI_USE_AAD", "false", False)
     azure_openai_ad_token = get_env_variable("AZURE_OPENAI_AD_TOKEN", None, False)
     azure_client_id = get_env_variable("AZURE_CLIENT_ID", None, False)
     
 
     # convert to boolean
-    azure_openai_use_aad = ( azure_openai_use_aad == "true" or azure_openai_use_aad == "1"  or azure_openai_use_aad == "yes" or azure_openai_use_aad == "y" )
+    azure_openai_use_aad = is_truthy(azure_openai_use_aad)
 
     # in case no api tokens are set, check if azure ad authentication is requested
     if openai_api_key is None and azure_openai_api_key is None:
@@ -63,11 +145,7 @@ def get_configured_openai_wrapper(timeout: float = 10, max_retries: int = 5):
             params["base_url"] = openai_base_url
         if openai_org_id is not None:
             params["organization"] = openai_org_id
-        return OpenAIAPIWrapper(
-            openai_client = openai.OpenAI(**params),
-            timeout = timeout,
-            max_retries = max_retries
-        )
+        return False, params
     else:
         if azure_openai_endpoint is None:
             raise ValueError("Please set the required environment variable: AZURE_OPENAI_ENDPOINT")
@@ -89,11 +167,108 @@ def get_configured_openai_wrapper(timeout: float = 10, max_retries: int = 5):
         if openai_org_id is not None:
             params["organization"] = openai_org_id
 
-        return OpenAIAPIWrapper(
-            openai_client = openai.AzureOpenAI(**params),
-            timeout = timeout,
-            max_retries = max_retries
-        )
+        return True, params
+
+
+def embedding_response_to_dict(response):
+    """
+    Converts an embeddings API response into the dictionary returned by get_embedding.
+    """
+    data = {
+        "data": [],
+        "model": response.model,
+        "usage" : {
+            "prompt_tokens": response.usage.prompt_tokens,
+            "total_tokens": response.usage.total_tokens
+        }
+    }
+    for emb in response.data:
+        data["data"].append({
+            "embedding": emb.embedding,
+            "index": emb.index
+        })
+    return data
+
+
+def split_embedding_response(data):
+    """
+    Splits the dictionary of a batched embeddings call into one get_embedding
+    dictionary per input text, in input order. Token usage is split evenly.
+    """
+    items = sorted(data["data"], key=lambda item: item["index"])
+    count = len(items)
+    responses = []
+    for position, item in enumerate(items):
+        usage = {
+            name: tokens // count + (1 if position < tokens % count else 0)
+            for name, tokens in data["usage"].items()
+        }
+        responses.append({
+            "data": [{"embedding": item["embedding"], "index": 0}],
+            "model": data["model"],
+            "usage": usage,
+            "retries": data.get("retries", 0)
+        })
+    return responses
+
+
+def cached_embedding_response(embedding):
+    """
+    Builds the get_embedding dictionary for an embedding served from the cache.
+    """
+    return {
+        "data": [{"embedding": embedding.tolist(), "index": 0}],
+        "model": ENGINE,
+        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        "cached": True
+    }
+
+
+def record_embedding_usage(data, latency, cached=False):
+    """
+    Records the usage of a get_embedding result for the current agent and request.
+    """
+    record_usage(CallUsage(
+        data.get("model", ENGINE), "embedding", data["usage"]["prompt_tokens"],
+        latency=latency, retries=data.get("retries", 0), cached=cached
+    ))
+
+
+def timeout_kwargs(timeout):
+    """
+    Returns the per-request timeout keyword argument of the openai client, if any.
+    """
+    return {} if timeout is None else {"timeout": timeout}
+
+
+def completion_flight_key(kwargs, cache_key):
+    """
+    Returns the key under which identical in-flight chat completions are
+    coalesced, or None for sampled requests whose answers should differ.
+    """
+    if cache_key is not None:
+        return cache_key
+    return SQLiteCompletionCache.compute_key(kwargs) if is_deterministic(kwargs) else None
+
+
+def chunk_content(chunk):
+    """
+    Extracts the content delta of a streamed chat completion chunk, if any.
+    """
+    if not chunk.choices:
+        return None
+    return chunk.choices[0].delta.content
+
+
+def completion_content(res):
+    """
+    Extracts the message content of the first choice of a chat completion.
+    """
+    if isinstance(res, dict):
+       if isinstance(res['choices'][0], dict):
+          return res['choices'][0]['message']['content'].strip()
+       return res['choices'][0].message['content'].strip()
+    return res.choices[0].message.content.strip()
 
 
 class OpenAIAPIWrapper:
@@ -101,98 +276,214 @@ class OpenAIAPIWrapper:
     A wrapper class for OpenAI's API.
     """
     _openai_client = None
-    timeout : float = 10
-    max_retries : int = 5
 
     def __init__(
         self,
         openai_client : openai.OpenAI | openai.AzureOpenAI, 
-        timeout : float = 10,
-        max_retries : int = 5
+        timeout : float = 60,
+        max_retries : int = 5,
+        embedding_cache : SQLiteEmbeddingCache = None,
+        rate_limiter : RateLimiter = None,
+        retry_policy : RetryPolicy = None,
+        completion_cache : SQLiteCompletionCache = None,
+        embedding_batcher : EmbeddingBatcher = None,
+        router : ModelRouter = None
     ):
         """
         Initializes the OpenAIAPIWrapper instance.
 
         :param openai_client: The openai client
-        :param timeout: The timeout duration in seconds for API requests.
-        :param max_retries: Number of retries for API requests.
+        :param timeout: Overall deadline in seconds for an API call including its retries.
+        :param max_retries: Number of attempts for API requests.
+        :param embedding_cache: Cache for embeddings, shared across processes using the same file.
+        :param rate_limiter: Client-side rate limiter, shared by all wrappers of the process by default.
+        :param retry_policy: Backoff and deadline policy; replaces timeout and max_retries when given.
+        :param completion_cache: Cache for chat completions of call sites that opt in.
+        :param embedding_batcher: Batches embedding requests of concurrent threads into one API call.
+        :param router: Routes the chat completions of call sites to models, endpoints and timeouts.
         """
         self._openai_client = openai_client
-        self.timeout = timeout
-        self.max_retries = max_retries
+        self.retry_policy = retry_policy or RetryPolicy(max_attempts=max_retries, deadline=timeout)
+        self.embedding_cache = embedding_cache or SQLiteEmbeddingCache("openai_embedding_cache.db")
+        self.rate_limiter = rate_limiter or RateLimiter.get_default()
+        self.completion_cache = completion_cache or SQLiteCompletionCache("openai_completion_cache.db")
+        self.single_flight = SingleFlight()
+        self.embedding_batcher = embedding_batcher or EmbeddingBatcher(self._embed_batch)
+        self.router = router or ModelRouter.from_environment(MODEL)
 
-    @memoize_to_sqlite(func_name="get_embedding", filename="openai_embedding_cache.db")
     def get_embedding(self, text):
         """
-        Retrieves the embedding for the given text.
+        Retrieves the embedding for the given text. Embeddings are served from
+        the embedding cache when the same model has embedded the same
+        normalized text before. Concurrent requests for the same text share
+        one API call, and requests for different texts are batched.
 
         :param text: The text for which embedding is required.
         :return: The embedding for the given text.
         """
-        start_time = time.time()
-        retries = 0
+        text = normalize_text(text)
+        cached = self.embedding_cache.get(ENGINE, text)
+        if cached is not None:
+            data = cached_embedding_response(cached)
+            record_embedding_usage(data, 0.0, cached=True)
+            return data
 
-        while time.time() - start_time < self.timeout:
-            try:
-                response = self._openai_client.embeddings.create(input=text, model=ENGINE)
-                data = {
-                    "data": [],
-                    "model": response.model,
-                    "usage" : {
-                        "prompt_tokens": response.usage.prompt_tokens,
-                        "total_tokens": response.usage.total_tokens
-                    }
-                }
-                for emb in response.data:
-                    data["data"].append({
-                        "embedding": emb.embedding,
-                        "index": emb.index
-                    })
-                return data
-            except openai.OpenAIError as e:
-                logging.error(f"OpenAI API error: {e}")
-                retries += 1
-                if retries >= self.max_retries:
-                    raise
-                time.sleep(RETRY_SLEEP_DURATION)
-
-                if f"{e}".startswith("Rate limit"):
-                   print("Rate limit reached...  sleeping for 20 seconds")
-                   start_time+=20
-                   time.sleep(20)
-        raise TimeoutError("API call timed out")
-
-    def chat_completion(self, **kwargs):
+        return self.single_flight.do(("embedding", ENGINE, text), lambda: self._fetch_embedding(text))
+
+    def _fetch_embedding(self, text):
+        started = time.monotonic()
+        data = self.embedding_batcher.embed(text)
+        self.embedding_cache.put(ENGINE, text, data["data"][0]["embedding"])
+        record_embedding_usage(data, time.monotonic() - started)
+        return data
+
+    def get_embeddings(self, texts):
         """
-        Generates a chat completion using OpenAI's API.
+        Retrieves the embeddings for several texts, e.g. for backfills.
+        Cached texts are served from the embedding cache and the others are
+        requested in batches.
 
+        :param texts: The texts for which embeddings are required.
+        :return: One get_embedding result per text, in order.
+        """
+        texts = [normalize_text(text) for text in texts]
+        results = {}
+        missing = []
+        for text in dict.fromkeys(texts):
+            cached = self.embedding_cache.get(ENGINE, text)
+            if cached is not None:
+                results[text] = cached_embedding_response(cached)
+            else:
+                missing.append(text)
+
+        batch_size = self.embedding_batcher.max_batch_size
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            started = time.monotonic()
+            response = self._create_embeddings(batch)
+            record_embedding_usage(response, time.monotonic() - started)
+            for text, data in zip(batch, split_embedding_response(response)):
+                self.embedding_cache.put(ENGINE, text, data["data"][0]["embedding"])
+                results[text] = data
+        return [results[text] for text in texts]
+
+    def _embed_batch(self, texts):
+        return split_embedding_response(self._create_embeddings(texts))
+
+    def _create_embeddings(self, texts):
+        """
+        Requests the embeddings for the given texts from the API in one call.
+
+        :param texts: The texts for which embeddings are required.
+        :return: The embedding response as a dictionary.
+        """
+        tokens = sum(estimate_tokens(text) for text in texts)
+        embedding_input = texts[0] if len(texts) == 1 else texts
+        meter = CallMeter()
+
+        def request(timeout):
+            meter.attempt()
+            self.rate_limiter.acquire(ENGINE, tokens)
+            return self._openai_client.embeddings.create(input=embedding_input, model=ENGINE, **timeout_kwargs(timeout))
+
+        response = self.retry_policy.run(request, self.rate_limiter.error_handler(ENGINE))
+        return {**embedding_response_to_dict(response), "retries": meter.retries}
+
+    def chat_completion(self, cache=False, cache_ttl: float = None, route: str = DEFAULT_ROUTE, **kwargs):
+        """
+        Generates a chat completion using OpenAI's API. Concurrent identical
+        deterministic requests share one API call.
+
+        :param cache: True to serve deterministic (temperature 0) requests from the completion cache,
+            "force" to cache the request regardless of its sampling parameters.
+        :param cache_ttl: Maximum age in seconds of a cached completion accepted by this call.
+        :param route: Call site whose route selects the model, endpoint and timeout.
         :param kwargs: Keyword arguments for the chat completion API call.
         :return: The result of the chat completion API call.
         """
-
+        route = self.router.resolve(route)
         if 'model' not in kwargs:
-           kwargs['model']=MODEL
+           kwargs['model']=route.deployment
 
-        start_time = time.time()
-        retries = 0
+        # cached completions would let a cancelled agent carry on
+        check_cancelled()
+        cache_key = self.completion_cache.key_for(kwargs, cache)
+        if cache_key is not None:
+            cached = self.completion_cache.get(cache_key, cache_ttl)
+            if cached is not None:
+                self._record_chat_usage(route, CallUsage(route.usage_model(kwargs['model']), "chat", cached=True))
+                return cached
 
-        while time.time() - start_time < self.timeout:
+        flight_key = completion_flight_key(kwargs, cache_key)
+        if flight_key is None:
+            return self._request_completion(kwargs, cache_key, route)
+        while True:
             try:
-                res=self._openai_client.chat.completions.create(**kwargs)
-                if isinstance(res, dict):
-                   if isinstance(res['choices'][0], dict):
-                      return res['choices'][0]['message']['content'].strip()
-                   return res['choices'][0].message['content'].strip()
-                return res.choices[0].message.content.strip()
-            except openai.OpenAIError as e:
-                logging.error(f"OpenAI API error: {e}")
-                retries += 1
-                if retries >= self.max_retries:
-                    raise
-                time.sleep(RETRY_SLEEP_DURATION)
-
-                if f"{e}".startswith("Rate limit"):
-                   print("Rate limit reached...  sleeping for 20 seconds")
-                   start_time+=20
-                   time.sleep(20)
-        raise TimeoutError("API call timed out")
+                return self.single_flight.do(("completion", flight_key), lambda: self._request_completion(kwargs, cache_key, route))
+            except RequestCancelled:
+                # the flight was run by a cancelled agent; run it again unless this caller was cancelled too
+                check_cancelled()
+
+    def _request_completion(self, kwargs, cache_key, route: Route):
+        tokens = estimate_request_tokens(kwargs)
+        meter = CallMeter()
+        client = self.router.client(route, self._openai_client)
+
+        def request(timeout):
+            check_cancelled()
+            meter.attempt()
+            self.rate_limiter.acquire(kwargs['model'], tokens)
+            return client.chat.completions.create(**{**timeout_kwargs(route.attempt_timeout(timeout)), **kwargs})
+
+        res = self.retry_policy.run(request, self.rate_limiter.error_handler(kwargs['model']))
+        content = completion_content(res)
+        self._record_chat_usage(route, completion_usage(route.usage_model(kwargs['model']), res, meter, estimate_prompt_tokens(kwargs), content))
+        if cache_key is not None:
+            self.completion_cache.put(cache_key, kwargs['model'], content)
+        return content
+
+    def _record_chat_usage(self, route: Route, usage: CallUsage):
+        record_usage(usage)
+        self.router.record(route, usage)
+
+    def chat_completion_stream(self, route: str = DEFAULT_ROUTE, **kwargs):
+        """
+        Generates a chat completion using OpenAI's API and yields its content
+        as it arrives. Closing the generator early closes the HTTP stream, so
+        the API stops generating tokens nobody reads; so does cancelling the
+        calling agent.
+
+        :param route: Call site whose route selects the model, endpoint and timeout.
+        :param kwargs: Keyword arguments for the chat completion API call.
+        :return: Generator of content deltas.
+        """
+        route = self.router.resolve(route)
+        if 'model' not in kwargs:
+           kwargs['model']=route.deployment
+
+        tokens = estimate_request_tokens(kwargs)
+        meter = CallMeter()
+        client = self.router.client(route, self._openai_client)
+
+        def request(timeout):
+            check_cancelled()
+            meter.attempt()
+            self.rate_limiter.acquire(kwargs['model'], tokens)
+            return client.chat.completions.create(**{**timeout_kwargs(route.attempt_timeout(timeout)), **kwargs, "stream": True})
+
+        stream = self.retry_policy.run(request, self.rate_limiter.error_handler(kwargs['model']))
+        streamed = []
+        try:
+            for chunk in stream:
+                # closing the stream below aborts the HTTP response of a cancelled agent
+                check_cancelled()
+                content = chunk_content(chunk)
+                if content:
+                    streamed.append(content)
+                    yield content
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+            # streamed responses carry no usage, so tokens are estimated
+            self._record_chat_usage(route, completion_usage(route.usage_model(kwargs['model']), None, meter, estimate_prompt_tokens(kwargs), "".join(streamed)))
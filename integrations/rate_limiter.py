@@ -0,0 +1,275 @@
+import email.utils
+import json
+import logging
+import threading
+import time
+
+from typing import Dict, Optional
+from utils.utility import get_env_variable
+
+logger = logging.getLogger()
+
+CHARS_PER_TOKEN = 4
+TOKENS_PER_MESSAGE = 4
+DEFAULT_COMPLETION_TOKENS = 512
+RATE_LIMIT_SLEEP_DURATION = 20  # seconds, used when the API sends no Retry-After
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimates the number of tokens of a text."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def estimate_prompt_tokens(kwargs: dict) -> int:
+    """Roughly estimates the prompt tokens of a chat completion request."""
+    return sum(
+        estimate_tokens(str(message.get("content") or "")) + TOKENS_PER_MESSAGE
+        for message in kwargs.get("messages", [])
+    )
+
+
+def estimate_request_tokens(kwargs: dict) -> int:
+    """
+    Estimates the tokens a chat completion request counts against the
+    tokens-per-minute budget: the prompt plus the requested completion size.
+    """
+    return estimate_prompt_tokens(kwargs) + (kwargs.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+
+def retry_after_seconds(error) -> Optional[float]:
+    """
+    Reads the Retry-After delay from an API error, if the response carried one.
+
+    :param error: An exception raised by the openai client.
+    :return: The delay in seconds, or None.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after is None:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        retry_date = email.utils.parsedate_to_datetime(retry_after)
+        return max(retry_date.timestamp() - time.time(), 0) if retry_date else None
+
+
+def is_rate_limit_error(error) -> bool:
+    """Returns True if the error is a rate-limit rejection by the API."""
+    return getattr(error, "status_code", None) == 429 or f"{error}".startswith("Rate limit")
+
+
+class ModelRateLimiter:
+    """
+    Client-side budget for one model, made of a requests-per-minute and a
+    tokens-per-minute token bucket.
+
+    Each call reserves its share up front and is told how long to wait
+    before sending, so callers are served in arrival order instead of all
+    retrying at once. A Retry-After from the API pauses the whole model.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._lock = threading.Lock()
+        self._request_allowance = requests_per_minute or 0.0
+        self._token_allowance = tokens_per_minute or 0.0
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self.queue_depth = 0
+        self.requests = 0
+        self.waits = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.rate_limited = 0
+
+    def reserve(self, tokens: int) -> float:
+        """
+        Reserves budget for one request.
+
+        :param tokens: Estimated tokens of the request.
+        :return: Seconds the caller has to wait before sending it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(self._blocked_until - now, 0.0)
+
+            if self.requests_per_minute:
+                self._request_allowance -= 1
+                wait = max(wait, -self._request_allowance * 60.0 / self.requests_per_minute)
+            if self.tokens_per_minute:
+                self._token_allowance -= min(tokens, self.tokens_per_minute)
+                wait = max(wait, -self._token_allowance * 60.0 / self.tokens_per_minute)
+
+            self.requests += 1
+            if wait > 0:
+                self.waits += 1
+                self.total_wait_time += wait
+                self.max_wait_time = max(self.max_wait_time, wait)
+            return wait
+
+    def acquire(self, tokens: int) -> float:
+        """
+        Blocks until the request fits the budget.
+
+        :return: Seconds waited.
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            self._queued(1)
+            try:
+                time.sleep(wait)
+            finally:
+                self._queued(-1)
+        return wait
+
+    async def acquire_async(self, tokens: int) -> float:
+        """Waits without blocking the event loop until the request fits the budget."""
+        import asyncio
+
+        wait = self.reserve(tokens)
+        if wait > 0:
+            self._queued(1)
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self._queued(-1)
+        return wait
+
+    def penalize(self, seconds: float) -> None:
+        """Pauses all requests for this model, e.g. after a Retry-After response."""
+        with self._lock:
+            self.rate_limited += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def stats(self) -> dict:
+        """Returns queue depth and wait-time metrics."""
+        with self._lock:
+            return {
+                "queue_depth": self.queue_depth,
+                "requests": self.requests,
+                "waits": self.waits,
+                "total_wait_time": self.total_wait_time,
+                "average_wait_time": self.total_wait_time / self.waits if self.waits else 0.0,
+                "max_wait_time": self.max_wait_time,
+                "rate_limited": self.rate_limited,
+            }
+
+    def _queued(self, delta: int) -> None:
+        with self._lock:
+            self.queue_depth += delta
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_minute:
+            self._request_allowance = min(
+                self.requests_per_minute, self._request_allowance + elapsed * self.requests_per_minute / 60.0
+            )
+        if self.tokens_per_minute:
+            self._token_allowance = min(
+                self.tokens_per_minute, self._token_allowance + elapsed * self.tokens_per_minute / 60.0
+            )
+
+
+class RateLimiter:
+    """
+    Process-wide collection of per-model rate limiters shared by all LLM and
+    embedding calls.
+
+    Limits are read from OPENAI_RPM_LIMIT and OPENAI_TPM_LIMIT (defaults for
+    every model) and OPENAI_RATE_LIMITS, a JSON object of per-model overrides
+    such as {"gpt-4": {"rpm": 60, "tpm": 40000}}. Unset limits are unlimited.
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None, model_limits: Optional[Dict[str, dict]] = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.model_limits = model_limits or {}
+        self._limiters: Dict[str, ModelRateLimiter] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_default(cls) -> "RateLimiter":
+        """Returns the process-wide rate limiter configured from the environment."""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls.from_environment()
+            return cls._default
+
+    @classmethod
+    def from_environment(cls) -> "RateLimiter":
+        rpm = get_env_variable("OPENAI_RPM_LIMIT", None, False)
+        tpm = get_env_variable("OPENAI_TPM_LIMIT", None, False)
+        model_limits = get_env_variable("OPENAI_RATE_LIMITS", None, False)
+        return cls(
+            float(rpm) if rpm else None,
+            float(tpm) if tpm else None,
+            json.loads(model_limits) if model_limits else None
+        )
+
+    def for_model(self, model: str) -> ModelRateLimiter:
+        """Returns the limiter of a model, creating it on first use."""
+        with self._lock:
+            limiter = self._limiters.get(model)
+            if limiter is None:
+                limits = self.model_limits.get(model, {})
+                limiter = self._limiters[model] = ModelRateLimiter(
+                    limits.get("rpm", self.requests_per_minute),
+                    limits.get("tpm", self.tokens_per_minute)
+                )
+            return limiter
+
+    def acquire(self, model: str, tokens: int) -> float:
+        """Blocks until a request to the model fits its budget."""
+        return self.for_model(model).acquire(tokens)
+
+    async def acquire_async(self, model: str, tokens: int) -> float:
+        """Waits until a request to the model fits its budget."""
+        return await self.for_model(model).acquire_async(tokens)
+
+    def penalize(self, model: str, error) -> float:
+        """
+        Pauses a model after a rate-limit error, honouring Retry-After.
+
+        :return: The pause in seconds.
+        """
+        delay = retry_after_seconds(error)
+        if delay is None:
+            delay = RATE_LIMIT_SLEEP_DURATION
+        logger.warning(f"Rate limit reached for {model}, pausing requests for {delay:.1f} seconds.")
+        self.for_model(model).penalize(delay)
+        return delay
+
+    def error_handler(self, model: str):
+        """
+        Returns an on_error callback for RetryPolicy that pauses the model on
+        rate-limit errors and delays the retry until the pause ends.
+        """
+        def on_error(error):
+            if is_rate_limit_error(error):
+                return self.penalize(model, error)
+            return None
+        return on_error
+
+    def stats(self) -> Dict[str, dict]:
+        """Returns the metrics of every model."""
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {model: limiter.stats() for model, limiter in limiters.items()}
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import openai
+
+logger = logging.getLogger()
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+LATENCY_SAMPLES = 1000
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Returns True for transient API errors: connection problems, timeouts,
+    rate limits and server errors. Authentication, permission and invalid
+    request errors are fatal and fail on the first attempt.
+    """
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500
+    return isinstance(error, openai.OpenAIError)
+
+
+class RetryPolicy:
+    """
+    Retry policy for API calls: exponential backoff with full jitter, a
+    maximum number of attempts, an optional per-attempt timeout and an
+    overall deadline after which no further attempt is started.
+
+    A policy can be shared by several wrappers and threads; it keeps the
+    latency of recent attempts for stats().
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 20.0,
+        deadline: float = 60.0,
+        attempt_timeout: Optional[float] = None,
+        is_retryable: Callable[[Exception], bool] = is_retryable_error
+    ):
+        """
+        :param max_attempts: Attempts before the last error is raised.
+        :param base_delay: Backoff cap of the first retry in seconds; it doubles per retry.
+        :param max_delay: Upper bound of the backoff cap in seconds.
+        :param deadline: Seconds after the first attempt within which a retry may start.
+        :param attempt_timeout: Timeout of a single request in seconds, None for the client default.
+        :param is_retryable: Classifies errors into retryable and fatal ones.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.is_retryable = is_retryable
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.attempts = 0
+        self.retries = 0
+        self.failures = 0
+
+    def backoff(self, attempt: int) -> float:
+        """Returns the full-jitter delay before the retry following the given attempt."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def run(self, request: Callable[[Optional[float]], T], on_error: Callable[[Exception], Optional[float]] = None) -> T:
+        """
+        Calls request until it succeeds or the policy gives up.
+
+        :param request: Performs one attempt; receives the attempt timeout.
+        :param on_error: Called with every retryable error; may return a minimum delay, e.g. a Retry-After.
+        :return: The result of the first successful attempt.
+        """
+        deadline = time.monotonic() + self.deadline
+        attempt = 1
+        while True:
+            started = time.monotonic()
+            try:
+                result = request(self._attempt_timeout(deadline))
+            except Exception as e:
+                delay = self._after_failure(e, attempt, started, deadline, on_error)
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self._record(attempt, time.monotonic() - started)
+            return result
+
+    async def run_async(self, request: Callable[[Optional[float]], Awaitable[T]], on_error: Callable[[Exception], Optional[float]] = None) -> T:
+        """Same as run for a coroutine function; waiting never blocks the event loop."""
+        deadline = time.monotonic() + self.deadline
+        attempt = 1
+        while True:
+            started = time.monotonic()
+            try:
+                result = await request(self._attempt_timeout(deadline))
+            except Exception as e:
+                delay = self._after_failure(e, attempt, started, deadline, on_error)
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self._record(attempt, time.monotonic() - started)
+            return result
+
+    def stats(self) -> dict:
+        """Returns attempt counts and the latency distribution of recent attempts."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            attempts, retries, failures = self.attempts, self.retries, self.failures
+
+        def percentile(p):
+            return latencies[min(int(p * len(latencies)), len(latencies) - 1)] if latencies else 0.0
+
+        return {
+            "attempts": attempts,
+            "retries": retries,
+            "failures": failures,
+            "mean_latency": sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50_latency": percentile(0.5),
+            "p95_latency": percentile(0.95),
+        }
+
+    def _attempt_timeout(self, deadline: float) -> Optional[float]:
+        if self.attempt_timeout is None:
+            return None
+        return max(min(self.attempt_timeout, deadline - time.monotonic()), 0.001)
+
+    def _after_failure(self, error, attempt, started, deadline, on_error) -> float:
+        """Records a failed attempt and returns the delay before the next one, or raises."""
+        self._record(attempt, time.monotonic() - started, error)
+        if not self.is_retryable(error) or attempt >= self.max_attempts:
+            with self._lock:
+                self.failures += 1
+            raise error
+
+        delay = self.backoff(attempt)
+        if on_error is not None:
+            delay = max(delay, on_error(error) or 0.0)
+        if time.monotonic() + delay >= deadline:
+            with self._lock:
+                self.failures += 1
+            raise TimeoutError("API call timed out") from error
+
+        with self._lock:
+            self.retries += 1
+        return delay
+
+    def _record(self, attempt: int, latency: float, error: Exception = None) -> None:
+        with self._lock:
+            self.attempts += 1
+            self._latencies.append(latency)
+        if error is None:
+            logger.debug(f"API attempt {attempt} succeeded in {latency:.3f}s")
+        else:
+            logger.error(f"OpenAI API error on attempt {attempt} after {latency:.3f}s: {error}")
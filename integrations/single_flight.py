@@ -0,0 +1,103 @@
+import asyncio
+import threading
+
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the
+    function, callers arriving while it is in flight wait for its result
+    (or exception) instead of running it again. Nothing is cached once the
+    call has finished.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, func: Callable[[], T]) -> T:
+        """
+        Runs func, or waits for the in-flight call with the same key.
+
+        :param key: Identifies identical requests.
+        :param func: Performs the request.
+        :return: The result shared by all callers of the flight.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self) -> dict:
+        """Returns how many calls were executed and how many joined an in-flight call."""
+        with self._lock:
+            return {"executions": self.executions, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines running on one event loop. A waiting caller
+    being cancelled does not cancel the shared call while other callers
+    still wait for it; once the last one is cancelled, so is the call.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._waiters: Dict[asyncio.Future, int] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, coroutine_function: Callable[[], Awaitable[T]]) -> T:
+        """
+        Awaits coroutine_function(), or the in-flight call with the same key.
+
+        :return: The result shared by all callers of the flight.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(coroutine_function())
+            task.add_done_callback(lambda done: self._calls.pop(key) if self._calls.get(key) is done else None)
+            self.executions += 1
+        else:
+            self.coalesced += 1
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[task] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+
+    def stats(self) -> dict:
+        """Returns how many calls were executed and how many joined an in-flight call."""
+        return {"executions": self.executions, "coalesced": self.coalesced, "in_flight": len(self._calls)}
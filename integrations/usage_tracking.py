@@ -0,0 +1,193 @@
+import contextlib
+import contextvars
+import json
+import logging
+import threading
+import time
+
+from typing import Dict, Tuple
+
+from utils.utility import get_env_variable
+from .rate_limiter import estimate_tokens
+
+logger = logging.getLogger()
+
+# USD per 1K prompt and completion tokens; OPENAI_PRICES overrides or extends it
+DEFAULT_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4-1106-preview": (0.01, 0.03),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-32k": (0.06, 0.12),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "text-embedding-ada-002": (0.0001, 0.0),
+    "text-embedding-3-small": (0.00002, 0.0),
+    "text-embedding-3-large": (0.00013, 0.0),
+}
+
+_request_usage = contextvars.ContextVar("request_usage", default=())
+_agent_usage = contextvars.ContextVar("agent_usage", default=None)
+_prices = None
+
+
+def get_prices() -> Dict[str, Tuple[float, float]]:
+    """
+    Returns the price table. OPENAI_PRICES holds a JSON object mapping
+    model or deployment names to [prompt, completion] USD per 1K tokens.
+    """
+    global _prices
+    if _prices is None:
+        prices = dict(DEFAULT_PRICES)
+        overrides = get_env_variable("OPENAI_PRICES", None, False)
+        if overrides:
+            prices.update({model: tuple(price) for model, price in json.loads(overrides).items()})
+        _prices = prices
+    return _prices
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Returns the cost in USD of a call, or 0 for models without a known price."""
+    prompt_price, completion_price = get_prices().get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+
+class CallUsage:
+    """Token usage, latency and retries of one API call."""
+
+    def __init__(self, model: str, kind: str, prompt_tokens: int = 0, completion_tokens: int = 0, latency: float = 0.0, retries: int = 0, cached: bool = False):
+        """
+        :param model: Model or deployment the call was sent to.
+        :param kind: "chat" or "embedding".
+        :param latency: Seconds from the first attempt to the response, including retries.
+        :param cached: Whether the call was served from a cache without using the API.
+        """
+        self.model = model
+        self.kind = kind
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.latency = latency
+        self.retries = retries
+        self.cached = cached
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def cost(self) -> float:
+        return estimate_cost(self.model, self.prompt_tokens, self.completion_tokens)
+
+
+class UsageTotals:
+    """Thread-safe running totals of the API calls attributed to an agent or a request."""
+
+    FIELDS = ("calls", "cached_calls", "prompt_tokens", "completion_tokens", "retries", "latency", "cost")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.cached_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.retries = 0
+        self.latency = 0.0
+        self.cost = 0.0
+        self.models: Dict[str, int] = {}
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, usage: CallUsage) -> None:
+        with self._lock:
+            self.calls += 1
+            self.cached_calls += usage.cached
+            self.prompt_tokens += usage.prompt_tokens
+            self.completion_tokens += usage.completion_tokens
+            self.retries += usage.retries
+            self.latency += usage.latency
+            self.cost += usage.cost
+            self.models[usage.model] = self.models.get(usage.model, 0) + usage.total_tokens
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            data = {field: getattr(self, field) for field in self.FIELDS}
+            data["models"] = dict(self.models)
+        data["total_tokens"] = data["prompt_tokens"] + data["completion_tokens"]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "UsageTotals":
+        totals = cls()
+        for field in cls.FIELDS:
+            setattr(totals, field, data.get(field, getattr(totals, field)))
+        totals.models = dict(data.get("models", {}))
+        return totals
+
+    def summary(self) -> str:
+        return f"{self.calls} calls, {self.total_tokens} tokens (${self.cost:.4f}), {self.retries} retries, {self.latency:.1f}s"
+
+
+class CallMeter:
+    """Counts the attempts of one API call and measures its latency."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.attempts = 0
+
+    def attempt(self) -> None:
+        self.attempts += 1
+
+    @property
+    def retries(self) -> int:
+        return max(self.attempts - 1, 0)
+
+    @property
+    def latency(self) -> float:
+        return time.monotonic() - self.started
+
+
+@contextlib.contextmanager
+def track_request(totals: UsageTotals):
+    """
+    Adds the usage of every API call made in the current context to
+    totals, including calls of nested agents. Requests can be nested.
+    """
+    token = _request_usage.set(_request_usage.get() + (totals,))
+    try:
+        yield totals
+    finally:
+        _request_usage.reset(token)
+
+
+@contextlib.contextmanager
+def track_agent(totals: UsageTotals):
+    """
+    Attributes the usage of API calls made in the current context to
+    totals. Only the innermost agent is charged, so a delegating agent's
+    totals do not include the agents it called.
+    """
+    token = _agent_usage.set(totals)
+    try:
+        yield totals
+    finally:
+        _agent_usage.reset(token)
+
+
+def record_usage(usage: CallUsage) -> None:
+    """Adds a call to the totals of the current agent and of every enclosing request."""
+    for totals in _request_usage.get():
+        totals.add(usage)
+    agent_totals = _agent_usage.get()
+    if agent_totals is not None:
+        agent_totals.add(usage)
+    logger.debug(f"{usage.kind} call to {usage.model}: {usage.total_tokens} tokens, {usage.latency:.2f}s, {usage.retries} retries{' (cached)' if usage.cached else ''}")
+
+
+def completion_usage(model: str, response, meter: CallMeter, estimated_prompt_tokens: int, content: str) -> CallUsage:
+    """Builds the usage of a chat completion, estimating tokens when the response reports none."""
+    usage = getattr(response, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    if not isinstance(prompt_tokens, int) or not isinstance(completion_tokens, int):
+        prompt_tokens, completion_tokens = estimated_prompt_tokens, estimate_tokens(content or "")
+    return CallUsage(model, "chat", prompt_tokens, completion_tokens, meter.latency, meter.retries)
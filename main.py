@@ -1,12 +1,15 @@
+import logging
 import threading
 import time
 from dotenv import load_dotenv
 from colorama import Fore, Style
 
+from agents.agent_scheduler import AgentScheduler
 from agents.microagent_manager import MicroAgentManager
 from utils.utility import get_env_variable, time_function
 from ui.format import clear_console, display_agent_info, display_agent_info, print_final_output, format_text
 from integrations.openaiwrapper import get_configured_openai_wrapper
+from integrations.usage_tracking import UsageTotals, track_request
 
 QUESTION_SET = [
     "What is 15+9?",
@@ -77,8 +80,11 @@ def process_user_input(manager, user_input):
     """
     Processes a single user input and generates a response.
     """
-    agent = manager.get_or_create_agent("Bootstrap Agent", depth=1, sample_input=user_input)
-    return agent.respond(user_input)
+    with track_request(UsageTotals()) as usage:
+        agent = manager.get_or_create_agent("Bootstrap Agent", depth=1, sample_input=user_input)
+        response = agent.respond(user_input)
+    logging.info(f"API usage for '{user_input}': {usage.summary()}")
+    return response
 
 def process_questions(manager, outputs):
     """
@@ -112,6 +118,8 @@ def main():
         stop_event.set()
         print_final_output(outputs, manager)
         display_thread.join()
+        logging.info(f"API usage by route: {openai_wrapper.router.summary()}")
+        logging.info(f"Agent scheduler: {AgentScheduler.get_default().summary()}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
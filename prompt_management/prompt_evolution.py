@@ -1,4 +1,5 @@
 import logging
+from integrations.model_routing import EVOLUTION_ROUTE
 from integrations.openaiwrapper import OpenAIAPIWrapper
 from prompt_management.prompts import EVOLVE_PROMPT_QUERY
 
@@ -58,5 +59,5 @@ class PromptEvolution:
     def _get_new_prompt(self, evolve_prompt_query: str, runtime_context: str) -> str:
         """Fetches a new prompt from the OpenAI API."""
         return self.openai_wrapper.chat_completion(
-            messages=[{"role": "system", "content": evolve_prompt_query + runtime_context}]
+            messages=[{"role": "system", "content": evolve_prompt_query + runtime_context}], route=EVOLUTION_ROUTE
         )
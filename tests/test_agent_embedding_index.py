@@ -0,0 +1,69 @@
+import unittest
+from unittest.mock import Mock
+import numpy as np
+from agents.agent_embedding_index import AgentEmbeddingIndex
+
+def make_agent(agent_id, embedding=None, purpose=None):
+    agent = Mock()
+    agent.id = agent_id
+    agent.purpose = purpose or agent_id
+    agent.purpose_embedding = None if embedding is None else np.array(embedding)
+    return agent
+
+class TestAgentEmbeddingIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = AgentEmbeddingIndex()
+
+    def test_search_returns_most_similar_agent(self):
+        self.index.add(make_agent("a", [1.0, 0.0, 0.0]))
+        self.index.add(make_agent("b", [0.0, 1.0, 0.0]))
+        self.index.add(make_agent("c", [0.0, 0.0, 2.0]))
+
+        agent, similarity = self.index.search(np.array([0.0, 0.0, 5.0]))
+
+        self.assertEqual(agent.id, "c")
+        self.assertAlmostEqual(similarity, 1.0, places=5)
+
+    def test_search_on_empty_index(self):
+        agent, similarity = self.index.search(np.array([1.0, 0.0]))
+        self.assertIsNone(agent)
+        self.assertEqual(similarity, -np.inf)
+
+    def test_remove_keeps_remaining_rows_consistent(self):
+        agents = [make_agent(str(i), np.eye(4)[i]) for i in range(4)]
+        for agent in agents:
+            self.index.add(agent)
+
+        self.index.remove(agents[1])
+
+        self.assertEqual(len(self.index), 3)
+        self.assertNotIn(agents[1], self.index)
+        for i in (0, 2, 3):
+            agent, similarity = self.index.search(np.eye(4)[i])
+            self.assertEqual(agent.id, str(i))
+            self.assertAlmostEqual(similarity, 1.0, places=5)
+
+    def test_grows_beyond_initial_capacity(self):
+        rng = np.random.default_rng(0)
+        agents = [make_agent(str(i), rng.normal(size=8)) for i in range(200)]
+        for agent in agents:
+            self.index.add(agent)
+
+        agent, similarity = self.index.search(agents[150].purpose_embedding)
+
+        self.assertEqual(agent.id, "150")
+        self.assertAlmostEqual(similarity, 1.0, places=5)
+
+    def test_pending_agents_are_embedded_on_resolve(self):
+        agent = make_agent("pending", purpose="translate")
+        self.index.add(agent)
+        embed = Mock(return_value=[np.array([0.5, 0.5])])
+
+        self.index.resolve_pending(embed)
+
+        embed.assert_called_once_with(["translate"])
+        self.assertEqual(self.index.search(np.array([1.0, 1.0]))[0], agent)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,12 @@
+import threading
+import time
 import unittest
+from concurrent.futures import ALL_COMPLETED
+from unittest.mock import Mock, patch
 
 from agents.agent_response import AgentResponse
+from agents.agent_scheduler import AgentScheduler
+from agents.conversation_transcript import ConversationTranscript
 
 class TestAgentResponse(unittest.TestCase):
     def setUp(self):
@@ -32,5 +38,76 @@ class TestAgentResponse(unittest.TestCase):
         with self.assertRaises(IndexError):
             self.agent_response._parse_agent_info(response)
 
+    def test_parse_agent_invocations(self):
+        response = "1. Use Agent[Weather:Paris] 2. Use Agent[Weather:Paris] 3. Use Agent[Stocks:MSFT]\nObservation: Use Agent[Made Up]"
+        self.assertEqual(self.agent_response._parse_agent_invocations(response), [("Weather", "Paris"), ("Stocks", "MSFT")])
+        self.assertEqual(self.agent_response._parse_agent_invocations("Use Agent[Unclosed:input"), [("Unclosed", "input")])
+
+class TestAgentDelegation(unittest.TestCase):
+    def setUp(self):
+        self.agent = Mock(purpose="Planner", number_of_code_executions=0)
+        self.agent_response = AgentResponse(None, Mock(), None, self.agent, None, 1)
+        self.transcript = ConversationTranscript(budget=10_000)
+
+    @patch("agents.agent_response.ParallelAgentExecutor")
+    def test_invocations_of_one_step_run_concurrently(self, executor_class):
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def create_and_run_agents(purpose, depth, input_text, parent_agent):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.1)
+            with lock:
+                running[0] -= 1
+            return f"{purpose} answered {input_text}"
+        executor_class.return_value.create_and_run_agents.side_effect = create_and_run_agents
+
+        self.agent_response._process_response("Use Agent[Weather:Paris] and Use Agent[Stocks:MSFT]", self.transcript, 0, 0, "input")
+
+        conversation = self.transcript.full_text()
+        self.assertEqual(peak[0], 2)
+        self.assertLess(conversation.index("Weather answered Paris"), conversation.index("Stocks answered MSFT"))
+
+    @patch("agents.agent_response.ParallelAgentExecutor")
+    def test_concurrent_delegations_are_numbered_and_shown_together(self, executor_class):
+        executor_class.return_value.create_and_run_agents.side_effect = lambda purpose, depth, input_text, parent_agent: f"{purpose} answered"
+
+        _, action_number = self.agent_response._process_response("Use Agent[Weather:Paris] and Use Agent[Stocks:MSFT]", self.transcript, 0, 0, "input")
+
+        conversation = self.transcript.full_text()
+        self.assertIn("Output of Agent 1: Weather answered", conversation)
+        self.assertIn("Output of Agent 2: Stocks answered", conversation)
+        self.assertEqual(action_number, 3)
+        self.agent.update_active_agents.assert_called_once_with("Planner", "Weather, Stocks")
+
+    @patch("agents.agent_response.ParallelAgentExecutor")
+    def test_concurrent_delegates_leave_depth_slots_to_their_racers(self, executor_class):
+        scheduler = AgentScheduler(max_workers=4, depth_limits={2: 2})
+
+        def create_and_run_agents(purpose, depth, input_text, parent_agent):
+            racers = [scheduler.submit(time.sleep, 0.01, depth=depth) for _ in range(3)]
+            scheduler.wait(racers, return_when=ALL_COMPLETED)
+            return f"{purpose} answered"
+        executor_class.return_value.create_and_run_agents.side_effect = create_and_run_agents
+
+        with patch.object(AgentScheduler, "_default", scheduler):
+            step = threading.Thread(target=self.agent_response._process_response, args=("Use Agent[A:1] Use Agent[B:2]", self.transcript, 0, 0, "input"), daemon=True)
+            step.start()
+            step.join(timeout=5)
+
+        self.assertFalse(step.is_alive())
+        self.assertEqual(scheduler.stats()["completed"], 8)
+        self.assertIn("B answered", self.transcript.full_text())
+
+    @patch("agents.agent_response.ParallelAgentExecutor")
+    def test_agents_cannot_delegate_to_themselves(self, executor_class):
+        executor_class.return_value.create_and_run_agents.return_value = "done"
+
+        self.agent_response._process_response("Use Agent[Planner:again]\nUse Agent[Weather:Paris]\nThought: wait", self.transcript, 0, 0, "input")
+
+        self.assertIn("It is not possible to call yourself!", self.transcript.full_text())
+        executor_class.return_value.create_and_run_agents.assert_called_once_with("Weather", 2, "Paris", self.agent)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,112 @@
+import contextvars
+import os
+import threading
+import time
+import unittest
+from concurrent.futures import ALL_COMPLETED
+from unittest.mock import patch
+from agents.agent_scheduler import AgentScheduler
+
+class ConcurrencyProbe:
+    """Records how many calls ran at the same time."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def __call__(self, duration=0.05):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(duration)
+        with self.lock:
+            self.running -= 1
+
+class TestAgentScheduler(unittest.TestCase):
+
+    def test_pool_size_bounds_concurrency(self):
+        scheduler, probe = AgentScheduler(max_workers=2), ConcurrencyProbe()
+
+        futures = [scheduler.submit(probe) for _ in range(6)]
+        for future in futures:
+            future.result()
+
+        self.assertEqual(probe.peak, 2)
+        self.assertEqual(scheduler.stats()["workers"], 2)
+        self.assertEqual(scheduler.stats()["completed"], 6)
+
+    def test_depth_limits_bound_concurrency_per_depth(self):
+        scheduler, deep, shallow = AgentScheduler(max_workers=4, depth_limits={3: 1}), ConcurrencyProbe(), ConcurrencyProbe()
+
+        futures = [scheduler.submit(deep, depth=3) for _ in range(3)] + [scheduler.submit(shallow, depth=2) for _ in range(3)]
+        for future in futures:
+            future.result()
+
+        self.assertEqual(deep.peak, 1)
+        self.assertEqual(shallow.peak, 3)
+
+    def test_parents_waiting_on_children_do_not_deadlock(self):
+        scheduler = AgentScheduler(max_workers=1)
+
+        def delegate(depth):
+            if depth == 3:
+                return depth
+            children = [scheduler.submit(delegate, depth + 1, depth=depth + 1) for _ in range(2)]
+            done, _ = scheduler.wait(children, timeout=5, return_when=ALL_COMPLETED)
+            return max(future.result() for future in done)
+
+        self.assertEqual(scheduler.submit(delegate, 1, depth=1).result(timeout=5), 3)
+        self.assertEqual(scheduler.stats()["workers"], 1)
+        self.assertGreater(scheduler.stats()["caller_runs"], 0)
+
+    def test_tasks_run_in_the_submitting_context(self):
+        variable = contextvars.ContextVar("variable", default=None)
+        variable.set("request")
+
+        self.assertEqual(AgentScheduler(1).submit(variable.get).result(), "request")
+
+    def test_cancelled_tasks_never_run_and_errors_reach_the_caller(self):
+        scheduler, release, calls = AgentScheduler(max_workers=1), threading.Event(), []
+        blocker = scheduler.submit(release.wait)
+        queued = scheduler.submit(calls.append, "ran")
+        queued.cancel()
+        failing = scheduler.submit(lambda: 1 / 0)
+        release.set()
+
+        with self.assertRaises(ZeroDivisionError):
+            failing.result(timeout=5)
+        blocker.result()
+        self.assertEqual(calls, [])
+        self.assertEqual(scheduler.stats()["cancelled"], 1)
+
+    def test_wait_times_out(self):
+        scheduler, release = AgentScheduler(max_workers=1), threading.Event()
+
+        done, pending = scheduler.wait([scheduler.submit(release.wait)], timeout=0.05)
+        release.set()
+
+        self.assertEqual((len(done), len(pending)), (0, 1))
+
+    def test_drain_waits_for_outstanding_tasks(self):
+        scheduler, finished = AgentScheduler(max_workers=1), []
+        scheduler.submit(lambda: time.sleep(0.05) or finished.append(1))
+        scheduler.submit(lambda: time.sleep(0.05) or finished.append(2))
+
+        self.assertTrue(scheduler.drain(timeout=5))
+        self.assertEqual(finished, [1, 2])
+
+    def test_drain_times_out(self):
+        scheduler, release = AgentScheduler(max_workers=1), threading.Event()
+        scheduler.submit(release.wait)
+
+        self.assertFalse(scheduler.drain(timeout=0.05))
+        release.set()
+
+    @patch.dict(os.environ, {"MICROAGENTS_MAX_WORKERS": "3", "MICROAGENTS_DEPTH_LIMITS": '{"2": 1}'})
+    def test_configured_from_environment(self):
+        scheduler = AgentScheduler.from_environment()
+        self.assertEqual((scheduler.max_workers, scheduler.depth_limits), (3, {2: 1}))
+
+if __name__ == '__main__':
+    unittest.main()
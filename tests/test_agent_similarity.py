@@ -20,7 +20,7 @@ class TestAgentSimilarity(unittest.TestCase):
         self.agent_similarity = AgentSimilarity(self.mock_openai_wrapper, self.agents)
 
     def test_find_closest_agent(self):
-        self.mock_openai_wrapper.get_embedding.side_effect = [
+        self.mock_openai_wrapper.get_embeddings.return_value = [
             {'data': [{'embedding': [0.1, 0.2, 0.3]}]},
             {'data': [{'embedding': [0.4, 0.5, 0.6]}]},
             {'data': [{'embedding': [0.7, 0.8, 0.9]}]}
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from agents.agent_embedding_index import AgentEmbeddingIndex
+from agents.ann_index import IVFFlatSearch, create_search_backend
+
+class IndexedAgent:
+    def __init__(self, agent_id, embedding=None):
+        self.id = agent_id
+        self.purpose = agent_id
+        self.purpose_embedding = embedding
+
+class TestIVFFlatSearch(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        centers = rng.normal(size=(20, 32))
+        self.embeddings = np.repeat(centers, 30, axis=0) + 0.05 * rng.normal(size=(600, 32))
+        self.agents = [IndexedAgent(str(i), e) for i, e in enumerate(self.embeddings)]
+
+    def _build(self, nprobe=4):
+        index = AgentEmbeddingIndex(search_backend=IVFFlatSearch(nprobe=nprobe, min_train_size=200))
+        for agent in self.agents:
+            index.add(agent)
+        return index
+
+    def test_trains_after_minimum_size(self):
+        index = self._build()
+        self.assertTrue(index.search_backend.is_trained)
+
+    def test_finds_exact_matches(self):
+        index = self._build()
+        for i in range(0, 600, 37):
+            agent, similarity = index.search(self.embeddings[i])
+            self.assertEqual(agent.id, str(i))
+            self.assertAlmostEqual(similarity, 1.0, places=6)
+
+    def test_removed_agents_are_not_returned(self):
+        index = self._build()
+        index.remove(self.agents[42])
+
+        agent, _ = index.search(self.embeddings[42])
+
+        self.assertNotEqual(agent.id, "42")
+        self.assertEqual(len(index), 599)
+
+    def test_unknown_backend_raises(self):
+        with self.assertRaises(ValueError):
+            create_search_backend("hnsw")
+
+class TestEmbeddingIndexPersistence(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mktemp(suffix=".npz")
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def test_restores_rows_without_recomputation(self):
+        rng = np.random.default_rng(3)
+        agents = [IndexedAgent(str(i), rng.normal(size=8)) for i in range(10)]
+        index = AgentEmbeddingIndex(persist_path=self.path)
+        for agent in agents:
+            index.add(agent)
+        index.save()
+
+        restored = AgentEmbeddingIndex(persist_path=self.path)
+        self.assertTrue(restored.load())
+        for agent in agents[:8]:
+            restored.add(IndexedAgent(agent.id))
+        self.assertEqual(restored.discard_unattached(), 2)
+
+        agent, similarity = restored.search(agents[5].purpose_embedding)
+        self.assertEqual(agent.id, "5")
+        self.assertAlmostEqual(similarity, 1.0, places=5)
+        self.assertEqual(restored.threshold_estimator.pair_count, 8 * 7 // 2)
+
+if __name__ == '__main__':
+    unittest.main()
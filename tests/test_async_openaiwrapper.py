@@ -0,0 +1,70 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, Mock
+import openai
+from integrations.async_openaiwrapper import AsyncOpenAIAPIWrapper, SyncOpenAIAPIWrapperAdapter
+from integrations.embedding_cache import SQLiteEmbeddingCache
+from integrations.retry_policy import RetryPolicy
+from integrations.usage_tracking import UsageTotals, track_request
+
+def completion(content):
+    return Mock(choices=[Mock(message=Mock(content=content))])
+
+def embedding_response(text):
+    return Mock(model="ada", usage=Mock(prompt_tokens=1, total_tokens=1), data=[Mock(embedding=[float(len(text))], index=0)])
+
+class TestAsyncOpenAIAPIWrapper(unittest.TestCase):
+
+    def setUp(self):
+        self.db_file = tempfile.mktemp()
+        self.client = Mock()
+        self.client.chat.completions.create = AsyncMock(return_value=completion(" answer "))
+        self.wrapper = AsyncOpenAIAPIWrapper(
+            self.client, embedding_cache=SQLiteEmbeddingCache(self.db_file), retry_policy=RetryPolicy(base_delay=0)
+        )
+
+    def tearDown(self):
+        if os.path.exists(self.db_file):
+            os.remove(self.db_file)
+
+    def test_chat_completion_uses_default_model(self):
+        result = asyncio.run(self.wrapper.chat_completion(messages=[]))
+
+        self.assertEqual(result, "answer")
+        self.assertIn("model", self.client.chat.completions.create.call_args.kwargs)
+
+    def test_chat_completion_retries_api_errors(self):
+        self.client.chat.completions.create.side_effect = [openai.OpenAIError("boom"), completion("ok")]
+
+        self.assertEqual(asyncio.run(self.wrapper.chat_completion(messages=[])), "ok")
+        self.assertEqual(self.client.chat.completions.create.call_count, 2)
+
+    def test_chat_completion_gives_up_after_max_retries(self):
+        self.wrapper.retry_policy.max_attempts = 2
+        self.client.chat.completions.create.side_effect = openai.OpenAIError("boom")
+
+        with self.assertRaises(openai.OpenAIError):
+            asyncio.run(self.wrapper.chat_completion(messages=[]))
+
+    def test_get_embeddings_records_the_latency_of_each_batch(self):
+        async def create(input, model):
+            await asyncio.sleep(0.2 if input == "slow" else 0)
+            return embedding_response(input)
+        self.client.embeddings.create = AsyncMock(side_effect=create)
+        totals = UsageTotals()
+
+        with track_request(totals):
+            asyncio.run(self.wrapper.get_embeddings(["slow", "fast"], batch_size=1))
+
+        self.assertEqual(totals.calls, 2)
+        self.assertLess(totals.latency, 0.3)
+
+    def test_sync_adapter_runs_calls_on_background_loop(self):
+        adapter = SyncOpenAIAPIWrapperAdapter(self.wrapper)
+
+        self.assertEqual(adapter.chat_completion(messages=[]), "answer")
+
+if __name__ == '__main__':
+    unittest.main()
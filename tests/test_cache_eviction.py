@@ -0,0 +1,68 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+from integrations.memoize import (
+    CacheMaintenance, CachePolicy, SQLiteConnectionPool, SQLiteMemoization, memoize_to_sqlite
+)
+
+class TestCacheEviction(unittest.TestCase):
+
+    def setUp(self):
+        self.db_file = tempfile.mktemp()
+        self.policy = CachePolicy(max_rows=3, eviction_interval=3600)
+
+    def tearDown(self):
+        SQLiteConnectionPool.close_all()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_file + suffix):
+                os.remove(self.db_file + suffix)
+
+    def _keys(self):
+        with SQLiteMemoization(self.db_file) as memoizer:
+            return {row[0] for row in memoizer.connection.execute("SELECT hash FROM cache")}
+
+    def test_evicts_least_recently_accessed_rows(self):
+        with SQLiteMemoization(self.db_file, self.policy) as memoizer:
+            for key in ("a", "b", "c", "d"):
+                memoizer._cache_result(key, key)
+                time.sleep(0.01)
+            memoizer._fetch_from_cache("a")
+
+        evicted = CacheMaintenance.for_table(SQLiteConnectionPool.for_file(self.db_file), "cache").evict()
+
+        self.assertEqual(evicted, 1)
+        self.assertEqual(self._keys(), {"a", "c", "d"})
+
+    def test_evicts_expired_rows(self):
+        with SQLiteMemoization(self.db_file, CachePolicy(ttl=60, eviction_interval=3600)) as memoizer:
+            memoizer._cache_result("old", "value")
+            memoizer.connection.execute("UPDATE cache SET created_at = ?", (time.time() - 120,))
+            memoizer.connection.commit()
+            memoizer._cache_result("new", "value")
+
+        CacheMaintenance.for_table(SQLiteConnectionPool.for_file(self.db_file), "cache").evict()
+
+        self.assertEqual(self._keys(), {"new"})
+
+    def test_decorator_exposes_stats_and_compaction(self):
+        compute = MagicMock(side_effect=lambda arg: arg * 2)
+
+        @memoize_to_sqlite("double", self.db_file, policy=self.policy)
+        def double(arg):
+            return compute(arg)
+
+        for arg in (1, 2, 3, 4, 5, 1):
+            double(arg)
+        stats = double.compact()
+
+        self.assertEqual(stats["entries"], 3)
+        self.assertEqual(stats["evictions"], 2)
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 5)
+        self.assertAlmostEqual(stats["hit_ratio"], 1 / 6)
+        self.assertGreater(stats["bytes"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import asyncio
+import contextvars
+import threading
+import time
+import unittest
+from unittest.mock import Mock
+from integrations.async_openaiwrapper import AsyncOpenAIAPIWrapper, SyncOpenAIAPIWrapperAdapter
+from integrations.cancellation import CancellationToken, RequestCancelled, cancellation_scope, check_cancelled, current_token
+from integrations.openaiwrapper import OpenAIAPIWrapper
+from agents.microagent import MicroAgent
+
+class TestCancellationToken(unittest.TestCase):
+
+    def test_cancelling_a_token_cancels_its_children(self):
+        parent = CancellationToken()
+        child = parent.child()
+        grandchild = child.child()
+        callback = Mock()
+        grandchild.on_cancel(callback)
+
+        parent.cancel()
+
+        self.assertTrue(grandchild.cancelled)
+        callback.assert_called_once()
+
+    def test_children_of_cancelled_tokens_start_cancelled(self):
+        parent = CancellationToken()
+        parent.cancel()
+        self.assertTrue(parent.child().cancelled)
+
+    def test_unregistered_callbacks_are_not_called(self):
+        token, callback = CancellationToken(), Mock()
+        token.on_cancel(callback)()
+        token.cancel()
+        callback.assert_not_called()
+
+    def test_scopes_nest_and_are_shared_with_copied_contexts(self):
+        with cancellation_scope() as outer:
+            with cancellation_scope() as inner:
+                seen = []
+                thread = threading.Thread(target=contextvars.copy_context().run, args=(lambda: seen.append(current_token()),))
+                thread.start()
+                thread.join()
+                outer.cancel()
+                self.assertIs(seen[0], inner)
+                with self.assertRaises(RequestCancelled):
+                    check_cancelled()
+        self.assertIsNone(current_token())
+        check_cancelled()
+
+class TestWrapperCancellation(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Mock()
+        self.wrapper = OpenAIAPIWrapper(self.client, completion_cache=Mock(), embedding_cache=Mock())
+        self.wrapper.completion_cache.key_for.return_value = None
+
+    def test_cancelled_agents_make_no_calls(self):
+        with cancellation_scope() as token:
+            token.cancel()
+            with self.assertRaises(RequestCancelled):
+                self.wrapper.chat_completion(messages=[])
+        self.client.chat.completions.create.assert_not_called()
+
+    def test_cancelled_agents_get_no_cached_completions(self):
+        self.wrapper.completion_cache.key_for.return_value = "key"
+        self.wrapper.completion_cache.get.return_value = "cached"
+        with cancellation_scope() as token:
+            token.cancel()
+            with self.assertRaises(RequestCancelled):
+                self.wrapper.chat_completion(messages=[], cache=True)
+
+    def test_stream_is_closed_when_cancelled(self):
+        chunk = Mock(choices=[Mock(delta=Mock(content="token"))])
+        stream = Mock()
+        stream.__iter__ = Mock(return_value=iter([chunk] * 5))
+        self.client.chat.completions.create.return_value = stream
+
+        tokens = []
+        with cancellation_scope() as token:
+            with self.assertRaises(RequestCancelled):
+                for content in self.wrapper.chat_completion_stream(messages=[]):
+                    tokens.append(content)
+                    token.cancel()
+
+        self.assertEqual(tokens, ["token"])
+        stream.close.assert_called_once()
+
+    def test_async_adapter_aborts_in_flight_requests(self):
+        async def slow_completion(**kwargs):
+            await asyncio.sleep(10)
+
+        client = Mock()
+        client.chat.completions.create = slow_completion
+        async_wrapper = AsyncOpenAIAPIWrapper(client, completion_cache=Mock(), embedding_cache=Mock())
+        async_wrapper.completion_cache.key_for.return_value = None
+        adapter = SyncOpenAIAPIWrapperAdapter(async_wrapper)
+
+        with cancellation_scope() as token:
+            threading.Timer(0.1, token.cancel).start()
+            started = time.monotonic()
+            with self.assertRaises(RequestCancelled):
+                adapter.chat_completion(messages=[])
+
+        self.assertLess(time.monotonic() - started, 2)
+
+class TestAgentCancellation(unittest.TestCase):
+
+    def test_agent_deleted_during_evaluation_does_not_become_working(self):
+        lifecycle = Mock(agents=[])
+        agent = MicroAgent("prompt", "Racer", 2, lifecycle, Mock(spec=OpenAIAPIWrapper))
+        agent.agent_responder = Mock()
+        agent.agent_responder.generate_response.return_value = ("answer", "conversation", True, 1)
+        agent.agent_evaluator = Mock()
+
+        def evaluate_while_losing(*args):
+            agent.set_agent_deleted()
+            return True
+        agent.agent_evaluator.evaluate.side_effect = evaluate_while_losing
+
+        self.assertEqual(agent.respond("input"), "Agent execution was stopped.")
+        self.assertFalse(agent.is_working_agent())
+        lifecycle.save_agent.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock
+from integrations.completion_cache import FORCE, SQLiteCompletionCache, is_deterministic
+from integrations.memoize import SQLiteConnectionPool
+from integrations.openaiwrapper import OpenAIAPIWrapper
+
+def completion(content):
+    return Mock(choices=[Mock(message=Mock(content=content))])
+
+class TestSQLiteCompletionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.db_file = tempfile.mktemp()
+        self.cache = SQLiteCompletionCache(self.db_file)
+
+    def tearDown(self):
+        SQLiteConnectionPool.close_all()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_file + suffix):
+                os.remove(self.db_file + suffix)
+
+    def test_key_is_canonical(self):
+        first = {"model": "gpt-4", "temperature": 0, "messages": [{"role": "user", "content": "hi"}]}
+        second = {"messages": [{"content": "hi", "role": "user"}], "temperature": 0, "model": "gpt-4", "timeout": 5}
+
+        self.assertEqual(self.cache.compute_key(first), self.cache.compute_key(second))
+        self.assertNotEqual(self.cache.compute_key(first), self.cache.compute_key({**first, "model": "gpt-3.5"}))
+
+    def test_sampled_requests_bypass_unless_forced(self):
+        sampled = {"model": "gpt-4", "messages": []}
+
+        self.assertFalse(is_deterministic(sampled))
+        self.assertTrue(is_deterministic({**sampled, "temperature": 0}))
+        self.assertIsNone(self.cache.key_for(sampled, True))
+        self.assertIsNone(self.cache.key_for({**sampled, "temperature": 0}, False))
+        self.assertIsNotNone(self.cache.key_for(sampled, FORCE))
+
+    def test_hits_from_another_cache_instance(self):
+        self.cache.put("key", "gpt-4", "answer")
+
+        other = SQLiteCompletionCache(self.db_file)
+
+        self.assertEqual(other.get("key"), "answer")
+        self.assertIsNone(other.get("missing"))
+        self.assertEqual(other.stats(), {"hits": 1, "misses": 1, "hit_rate": 0.5})
+
+    def test_call_site_ttl(self):
+        self.cache.put("key", "gpt-4", "answer")
+        self.cache.lru.put("key", ("answer", time.time() - 100))
+
+        self.assertEqual(self.cache.get("key", ttl=1000), "answer")
+        self.assertIsNone(self.cache.get("key", ttl=10))
+
+class TestWrapperCompletionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.db_file = tempfile.mktemp()
+        self.client = Mock()
+        self.client.chat.completions.create.return_value = completion("answer")
+        self.wrapper = OpenAIAPIWrapper(self.client, embedding_cache=Mock(), completion_cache=SQLiteCompletionCache(self.db_file))
+
+    def tearDown(self):
+        SQLiteConnectionPool.close_all()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_file + suffix):
+                os.remove(self.db_file + suffix)
+
+    def test_deterministic_calls_are_served_from_cache(self):
+        for _ in range(3):
+            self.assertEqual(self.wrapper.chat_completion(messages=[], temperature=0, cache=True), "answer")
+
+        self.assertEqual(self.client.chat.completions.create.call_count, 1)
+        self.assertNotIn("cache", self.client.chat.completions.create.call_args.kwargs)
+
+    def test_calls_without_opt_in_reach_the_api(self):
+        self.wrapper.chat_completion(messages=[], temperature=0)
+        self.wrapper.chat_completion(messages=[], cache=True)
+        self.wrapper.chat_completion(messages=[], cache=True)
+
+        self.assertEqual(self.client.chat.completions.create.call_count, 3)
+
+if __name__ == '__main__':
+    unittest.main()
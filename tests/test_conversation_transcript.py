@@ -0,0 +1,85 @@
+import os
+import unittest
+from unittest.mock import Mock, patch
+from agents.agent_response import AgentResponse
+from agents.conversation_transcript import ConversationTranscript, get_transcript_budget
+from integrations.rate_limiter import estimate_tokens
+
+def transcript_with_steps(steps, output_length=4000, **kwargs):
+    transcript = ConversationTranscript(**kwargs)
+    for step in range(1, steps + 1):
+        transcript.add_response(f"Thought {step}: run the code")
+        transcript.add_observation(f"Observation: Executed Python code\nOutput: {str(step) * output_length}")
+    return transcript
+
+class TestConversationTranscript(unittest.TestCase):
+
+    def test_renders_everything_within_budget(self):
+        transcript = transcript_with_steps(3, output_length=10, budget=1000)
+        self.assertEqual(transcript.render(), transcript.full_text())
+        self.assertTrue(transcript.full_text().startswith("\nThought 1: run the code\nObservation: Executed Python code\nOutput: 1111111111\nThought 2"))
+
+    def test_elides_older_observations_first(self):
+        transcript = transcript_with_steps(4, budget=2500)
+
+        rendered = transcript.render()
+
+        self.assertLessEqual(estimate_tokens(rendered), 2500)
+        self.assertIn("Thought 1: run the code", rendered)
+        self.assertIn("tokens elided]", rendered)
+        self.assertIn("3" * 4000, rendered)
+        self.assertIn("4" * 4000, rendered)
+        self.assertNotIn("1" * 1000, rendered)
+
+    def test_omits_oldest_steps_when_elision_is_not_enough(self):
+        transcript = transcript_with_steps(30, output_length=1000, budget=2500)
+
+        rendered = transcript.render()
+
+        self.assertRegex(rendered, r"^\n\[\d+ earlier steps omitted\]")
+        self.assertNotIn("Thought 1:", rendered)
+        self.assertIn("30" * 1000, rendered)
+        self.assertLessEqual(estimate_tokens(rendered), 2510)
+
+    def test_recent_steps_are_kept_over_budget(self):
+        transcript = transcript_with_steps(2, budget=10)
+        self.assertEqual(transcript.render(), transcript.full_text())
+
+    def test_token_counts_are_cached_per_segment(self):
+        transcript = transcript_with_steps(3)
+        with patch("agents.conversation_transcript.estimate_tokens") as estimate:
+            transcript.render(budget=100)
+        estimate.assert_not_called()
+        self.assertEqual(transcript.tokens, sum(segment.tokens for segment in transcript.segments))
+
+    @patch.dict(os.environ, {"MICROAGENTS_TRANSCRIPT_BUDGETS": '{"my-deployment": 900}', "MICROAGENTS_TRANSCRIPT_BUDGET": "700"})
+    def test_budget_per_model(self):
+        self.assertEqual(get_transcript_budget("my-deployment"), 900)
+        self.assertEqual(get_transcript_budget("gpt-4"), 4000)
+        self.assertEqual(get_transcript_budget("unknown-model"), 700)
+
+class TestAgentResponseTranscript(unittest.TestCase):
+
+    @patch("agents.agent_response.get_transcript_budget", return_value=2000)
+    def test_prompts_stay_within_budget_and_full_conversation_is_returned(self, _):
+        wrapper = Mock()
+        wrapper.chat_completion.side_effect = ["```python\nprint(1)\n```"] * 6 + ["final answer"]
+        code_execution = Mock()
+        code_execution.execute_external_code.return_value = "x" * 4000
+        agent = Mock(is_prime=False, purpose="Test Agent", number_of_code_executions=0)
+        manager = Mock()
+        manager.get_available_agents_for_agent.return_value = []
+        response = AgentResponse(wrapper, manager, code_execution, agent, None, 1)
+        response.streaming = False
+
+        output, conversation, solved, iterations = response.generate_response("What is 1?", "prompt", 6)
+
+        self.assertEqual((output, solved, iterations), ("final answer", False, 6))
+        self.assertEqual(conversation.count("x" * 4000), 6)
+        for call in wrapper.chat_completion.call_args_list:
+            user_prompt = call.kwargs["messages"][1]["content"]
+            self.assertIn("What is 1?", user_prompt)
+            self.assertLess(estimate_tokens(user_prompt), 2500)
+
+if __name__ == '__main__':
+    unittest.main()
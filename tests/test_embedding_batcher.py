@@ -0,0 +1,90 @@
+import threading
+import unittest
+from unittest.mock import Mock
+from integrations.embedding_batcher import EmbeddingBatcher
+from integrations.openaiwrapper import ENGINE, OpenAIAPIWrapper, split_embedding_response
+
+def embedding_response(texts):
+    texts = [texts] if isinstance(texts, str) else texts
+    return Mock(
+        model="ada",
+        usage=Mock(prompt_tokens=len(texts), total_tokens=len(texts)),
+        data=[Mock(embedding=[float(len(text))], index=index) for index, text in enumerate(texts)]
+    )
+
+class TestEmbeddingBatcher(unittest.TestCase):
+
+    def test_concurrent_texts_are_sent_in_one_batch(self):
+        send_batch = Mock(side_effect=lambda texts: [text.upper() for text in texts])
+        batcher = EmbeddingBatcher(send_batch, max_wait=0.05)
+
+        futures = [batcher.submit(text) for text in ["a", "b", "c"]]
+
+        self.assertEqual([future.result(timeout=1) for future in futures], ["A", "B", "C"])
+        send_batch.assert_called_once_with(["a", "b", "c"])
+        self.assertEqual(batcher.stats()["average_batch_size"], 3)
+
+    def test_batches_are_capped_at_max_batch_size(self):
+        send_batch = Mock(side_effect=lambda texts: texts)
+        batcher = EmbeddingBatcher(send_batch, max_batch_size=2, max_wait=0.05)
+
+        futures = [batcher.submit(str(i)) for i in range(5)]
+
+        self.assertEqual([future.result(timeout=1) for future in futures], ["0", "1", "2", "3", "4"])
+        self.assertTrue(all(len(call.args[0]) <= 2 for call in send_batch.call_args_list))
+
+    def test_errors_reach_every_caller_of_the_batch(self):
+        batcher = EmbeddingBatcher(Mock(side_effect=ValueError("boom")), max_wait=0.05)
+
+        futures = [batcher.submit(text) for text in ["a", "b"]]
+
+        for future in futures:
+            with self.assertRaises(ValueError):
+                future.result(timeout=1)
+
+class TestWrapperEmbeddingBatching(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Mock()
+        self.client.embeddings.create.side_effect = lambda input, model: embedding_response(input)
+        self.embedding_cache = Mock()
+        self.embedding_cache.get.return_value = None
+        self.wrapper = OpenAIAPIWrapper(self.client, embedding_cache=self.embedding_cache)
+        self.wrapper.embedding_batcher = EmbeddingBatcher(self.wrapper._embed_batch, max_wait=0.05)
+
+    def test_threads_share_a_batched_call(self):
+        results = {}
+
+        def embed(text):
+            results[text] = self.wrapper.get_embedding(text)["data"][0]["embedding"]
+
+        threads = [threading.Thread(target=embed, args=(text,)) for text in ["a", "bb", "ccc"]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, {"a": [1.0], "bb": [2.0], "ccc": [3.0]})
+        self.assertEqual(self.client.embeddings.create.call_count, 1)
+
+    def test_get_embeddings_skips_cached_and_duplicate_texts(self):
+        cached = Mock(tolist=Mock(return_value=[9.0]))
+        self.embedding_cache.get.side_effect = lambda model, text: cached if text == "hit" else None
+
+        results = self.wrapper.get_embeddings(["a", "hit", "bb", "a"])
+
+        self.assertEqual([result["data"][0]["embedding"] for result in results], [[1.0], [9.0], [2.0], [1.0]])
+        self.client.embeddings.create.assert_called_once_with(input=["a", "bb"], model=ENGINE)
+        self.assertEqual(self.embedding_cache.put.call_count, 2)
+
+    def test_split_embedding_response_splits_usage(self):
+        data = {"data": [{"embedding": [2.0], "index": 1}, {"embedding": [1.0], "index": 0}],
+                "model": "ada", "usage": {"prompt_tokens": 5, "total_tokens": 5}}
+
+        responses = split_embedding_response(data)
+
+        self.assertEqual([response["data"][0]["embedding"] for response in responses], [[1.0], [2.0]])
+        self.assertEqual(sum(response["usage"]["prompt_tokens"] for response in responses), 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import Mock
+import numpy as np
+from integrations.embedding_cache import SQLiteEmbeddingCache, normalize_text
+from integrations.openaiwrapper import OpenAIAPIWrapper, ENGINE
+
+class TestSQLiteEmbeddingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.db_file = tempfile.mktemp()
+        self.cache = SQLiteEmbeddingCache(self.db_file)
+
+    def tearDown(self):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_file + suffix):
+                os.remove(self.db_file + suffix)
+
+    def test_stores_vectors_as_float32_blobs(self):
+        self.cache.put("model", "hello", [0.1, 0.2, 0.3])
+
+        with sqlite3.connect(self.db_file) as conn:
+            vector, dimensions = conn.execute("SELECT vector, dimensions FROM embeddings").fetchone()
+
+        self.assertIsInstance(vector, bytes)
+        self.assertEqual(len(vector), 3 * 4)
+        self.assertEqual(dimensions, 3)
+
+    def test_hits_from_another_cache_instance(self):
+        self.cache.put("model", "hello", [0.1, 0.2, 0.3])
+
+        other = SQLiteEmbeddingCache(self.db_file)
+
+        np.testing.assert_allclose(other.get("model", "hello"), [0.1, 0.2, 0.3], rtol=1e-6)
+        self.assertIsNone(other.get("other-model", "hello"))
+        self.assertEqual(other.stats(), {"hits": 1, "misses": 1, "hit_rate": 0.5})
+
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text("  Weather \n in   Paris "), "Weather in Paris")
+
+    def test_wrapper_serves_repeated_embeddings_from_cache(self):
+        client = Mock()
+        client.embeddings.create.return_value = Mock(
+            model=ENGINE,
+            usage=Mock(prompt_tokens=2, total_tokens=2),
+            data=[Mock(embedding=[0.5, 0.25], index=0)]
+        )
+        wrapper = OpenAIAPIWrapper(client, embedding_cache=self.cache)
+
+        first = wrapper.get_embedding("Weather in Paris")
+        second = OpenAIAPIWrapper(client, embedding_cache=SQLiteEmbeddingCache(self.db_file)).get_embedding("Weather  in Paris ")
+
+        client.embeddings.create.assert_called_once_with(input="Weather in Paris", model=ENGINE)
+        self.assertEqual(first["data"][0]["embedding"], [0.5, 0.25])
+        self.assertEqual(second["data"][0]["embedding"], [0.5, 0.25])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+from benchmarks.end_to_end import load_question_set, parse_arguments, percentiles, run_workload
+
+class TestEndToEndBenchmark(unittest.TestCase):
+
+    def test_loads_question_sets_from_main(self):
+        self.assertIn("What is 15+9?", load_question_set("QUESTION_SET"))
+        self.assertGreater(len(load_question_set("QUESTION_SET_2")), 40)
+        with self.assertRaises(ValueError):
+            load_question_set("QUESTION_SET_3")
+
+    def test_percentiles(self):
+        result = percentiles([float(value) for value in range(1, 101)])
+        self.assertEqual((result["p50"], result["p95"], result["p99"], result["max"]), (51.0, 96.0, 100.0, 100.0))
+        self.assertEqual(percentiles([])["p99"], 0.0)
+
+    def test_run_workload_reports_measurements(self):
+        args = parse_arguments(["--chat-latency", "0", "--embedding-latency", "0", "--embedding-dimensions", "8"])
+
+        with tempfile.TemporaryDirectory() as directory:
+            working_directory = os.getcwd()
+            os.chdir(directory)
+            try:
+                result = run_workload(5, ["What is 15+9?", "What is 15+9?"], args)
+            finally:
+                os.chdir(working_directory)
+            self.assertEqual(os.listdir(directory), [])
+
+        self.assertEqual(result["agents"], 5)
+        self.assertEqual(result["questions"], 2)
+        self.assertGreaterEqual(result["registry_size_after_run"], 6)
+        self.assertGreater(result["llm_calls"]["chat"], 0)
+        self.assertGreater(result["llm_calls_per_question"]["chat"]["p50"], 0)
+        self.assertGreater(result["latency_seconds"]["p99"], 0)
+        self.assertGreater(result["max_rss_mb"], 0)
+        self.assertGreaterEqual(result["threads"]["peak"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
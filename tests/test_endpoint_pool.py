@@ -0,0 +1,133 @@
+import asyncio
+import os
+import unittest
+from unittest.mock import AsyncMock, Mock, patch
+import httpx
+import openai
+from integrations.endpoint_pool import OPEN, AsyncPooledClient, CircuitBreaker, EndpointPool, PoolMember, PooledClient, pool_from_environment
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "https://example.com"))
+
+def api_error(error_class, status_code, headers=None):
+    response = httpx.Response(status_code, headers=headers, request=httpx.Request("POST", "https://example.com"))
+    return error_class("error", response=response, body=None)
+
+def member(name, weight=1.0, **kwargs):
+    return PoolMember(name, Mock(), weight, breaker=CircuitBreaker(**kwargs))
+
+class TestEndpointPool(unittest.TestCase):
+
+    def test_idle_members_are_used_by_weight(self):
+        pool = EndpointPool([member("a", 2), member("b", 1)])
+        picks = []
+        for _ in range(6):
+            chosen = pool.acquire()
+            pool.release(chosen, 0)
+            picks.append(chosen.name)
+
+        self.assertEqual((picks.count("a"), picks.count("b")), (4, 2))
+
+    def test_least_outstanding_member_is_chosen(self):
+        pool = EndpointPool([member("a"), member("b")])
+
+        first, second = pool.acquire(), pool.acquire()
+
+        self.assertNotEqual(first.name, second.name)
+        self.assertEqual(pool.stats()[first.name]["outstanding"], 1)
+
+    def test_circuit_opens_after_failures_and_recovers_after_probe(self):
+        failing, healthy = member("a", failure_threshold=2, cooldown=30), member("b", 0.001)
+        pool = EndpointPool([failing, healthy])
+        for _ in range(2):
+            pool.release(pool.acquire(exclude=[healthy]), 0, connection_error())
+
+        self.assertEqual(failing.breaker.state, OPEN)
+        self.assertIs(pool.acquire(), healthy)
+
+        failing.breaker.opened_at -= 30
+        probe = pool.acquire()
+        self.assertIs(probe, failing)
+        self.assertIs(pool.acquire(), healthy)
+        pool.release(probe, 0)
+        self.assertEqual(pool.stats()["a"]["state"], "closed")
+        self.assertEqual(pool.stats()["a"]["circuit_trips"], 1)
+
+    def test_rate_limited_member_is_paused(self):
+        limited, other = member("a"), member("b")
+        pool = EndpointPool([limited, other])
+
+        pool.release(pool.acquire(exclude=[other]), 0, api_error(openai.RateLimitError, 429, {"retry-after": "10"}))
+
+        self.assertEqual([pool.acquire().name for _ in range(3)], ["b"] * 3)
+        self.assertEqual(pool.stats()["a"]["rate_limited"], 1)
+
+    def test_member_recovering_first_is_used_when_none_is_available(self):
+        early, late = member("a"), member("b")
+        early.paused_until, late.paused_until = 1e12, 2e12
+        self.assertIs(EndpointPool([late, early]).acquire(), early)
+
+class TestPooledClient(unittest.TestCase):
+
+    def setUp(self):
+        self.first, self.second = member("first"), member("second")
+        self.client = PooledClient(EndpointPool([self.first, self.second]))
+
+    def test_fails_over_to_another_endpoint(self):
+        self.first.client.chat.completions.create.side_effect = connection_error()
+        self.second.client.chat.completions.create.return_value = "response"
+
+        self.assertEqual(self.client.chat.completions.create(model="gpt-4", messages=[]), "response")
+        self.assertEqual(self.client.pool.stats()["first"]["errors"], 1)
+
+    def test_raises_when_every_endpoint_failed(self):
+        self.first.client.embeddings.create.side_effect = connection_error()
+        self.second.client.embeddings.create.side_effect = connection_error()
+
+        with self.assertRaises(openai.APIConnectionError):
+            self.client.embeddings.create(input="text", model="ada")
+
+    def test_invalid_requests_are_not_retried_elsewhere(self):
+        self.first.client.chat.completions.create.side_effect = api_error(openai.BadRequestError, 400)
+
+        with self.assertRaises(openai.BadRequestError):
+            self.client.chat.completions.create(model="gpt-4", messages=[])
+        self.second.client.chat.completions.create.assert_not_called()
+        self.assertEqual(self.first.breaker.consecutive_failures, 0)
+
+    def test_maps_models_to_endpoint_deployments(self):
+        self.first.deployments = {"gpt-4": "gpt4-east"}
+
+        self.client.chat.completions.create(model="gpt-4", messages=[])
+
+        self.assertEqual(self.first.client.chat.completions.create.call_args.kwargs["model"], "gpt4-east")
+
+    def test_async_client_fails_over(self):
+        self.first.client.chat.completions.create = AsyncMock(side_effect=connection_error())
+        self.second.client.chat.completions.create = AsyncMock(return_value="response")
+        client = AsyncPooledClient(self.client.pool)
+
+        self.assertEqual(asyncio.run(client.chat.completions.create(model="gpt-4", messages=[])), "response")
+
+class TestPoolFromEnvironment(unittest.TestCase):
+
+    @patch.dict(os.environ, {"OPENAI_ENDPOINT_POOL": "default, east", "OPENAI_CIRCUIT_COOLDOWN": "5"})
+    def test_builds_weighted_members(self):
+        default, east = Mock(), Mock()
+
+        pool = pool_from_environment(default, {"east": east}, {"east": {"weight": 3, "deployments": {"gpt-4": "gpt4"}}})
+
+        self.assertEqual([(m.name, m.client, m.weight) for m in pool.members], [("default", default, 1.0), ("east", east, 3.0)])
+        self.assertEqual((pool.members[1].deployments, pool.members[1].breaker.cooldown), ({"gpt-4": "gpt4"}, 5.0))
+
+    @patch.dict(os.environ, {"OPENAI_ENDPOINT_POOL": "west"})
+    def test_unknown_endpoint_is_rejected(self):
+        with self.assertRaises(ValueError):
+            pool_from_environment(Mock(), {}, {})
+
+    @patch.dict(os.environ, {"OPENAI_ENDPOINT_POOL": ""})
+    def test_no_pool_without_configuration(self):
+        self.assertIsNone(pool_from_environment(Mock(), {}, {}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+from integrations.async_openaiwrapper import AsyncOpenAIAPIWrapper
+from integrations.completion_cache import SQLiteCompletionCache
+from integrations.embedding_cache import SQLiteEmbeddingCache
+from integrations.fake_llm import (
+    AsyncFakeOpenAIClient, CassetteMissError, CassetteRecorder, FakeOpenAIClient, LatencyDistribution,
+    RecordingOpenAIClient, ReplayBackend, SyntheticBackend
+)
+from integrations.openaiwrapper import OpenAIAPIWrapper, get_configured_openai_wrapper
+from prompt_management.prompts import REACT_STEP_POST, REACT_STEP_POST_PRIME, REACT_SYSTEM_PROMPT
+
+def react_messages(question, action_prompt, conversation=""):
+    return [
+        {"role": "system", "content": "You are an agent."},
+        {"role": "user", "content": f"Question: {question}\n{conversation}\nThought 1: Decompose.\nAction 1: {action_prompt}"}
+    ]
+
+class TestLatencyDistribution(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(LatencyDistribution.parse(None).sample(), 0.0)
+        self.assertEqual(LatencyDistribution.parse("0.25").sample(), 0.25)
+        self.assertEqual(LatencyDistribution.parse("constant:0.5").sample(), 0.5)
+        uniform = LatencyDistribution.parse("uniform:0.1:0.2", seed=1)
+        self.assertTrue(all(0.1 <= uniform.sample() <= 0.2 for _ in range(100)))
+        self.assertGreater(LatencyDistribution.parse("lognormal:0.3:0.5", seed=1).sample(), 0)
+
+    def test_unknown_distribution(self):
+        with self.assertRaises(ValueError):
+            LatencyDistribution.parse("gamma:1:2")
+
+class TestSyntheticBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = SyntheticBackend(embedding_dimensions=8)
+
+    def test_prime_agent_delegates_then_solves(self):
+        first = self.backend.script(react_messages("What is 6 times 7?", REACT_STEP_POST_PRIME))
+        self.assertRegex(first, r"Use Agent\[Synthetic Lookup Agent \d+:What is 6 times 7\?\]")
+
+        second = self.backend.script(react_messages("What is 6 times 7?", REACT_STEP_POST_PRIME, "Output of Agent 2: 42"))
+        self.assertIn("Query Solved", second)
+
+    def test_agent_executes_python_then_solves(self):
+        self.assertIn("```python", self.backend.script(react_messages("Multiply", REACT_STEP_POST)))
+        solved = self.backend.script(react_messages("Multiply", REACT_STEP_POST, "Observation: Executed Python code\nOutput: 42"))
+        self.assertIn("Query Solved", solved)
+
+    def test_final_answer_and_ratings(self):
+        final = self.backend.script([
+            {"role": "system", "content": REACT_SYSTEM_PROMPT},
+            {"role": "user", "content": "...\nThe original question / task was: What is 6 times 7?\n"}
+        ])
+        self.assertIn("What is 6 times 7?", final)
+        self.assertEqual(self.backend.script([{"role": "system", "content": "Please rate the accuracy ..."}]), "5")
+
+    def test_embeddings_are_deterministic_unit_vectors(self):
+        first, _ = self.backend.embed(["hello", "world"])
+        second, _ = self.backend.embed(["hello"])
+        self.assertEqual(first[0], second[0])
+        self.assertNotEqual(first[0], first[1])
+        self.assertEqual(len(first[0]), 8)
+        self.assertAlmostEqual(float(np.linalg.norm(first[0])), 1.0)
+
+def temporary_caches(directory, name="wrapper"):
+    return {
+        "embedding_cache": SQLiteEmbeddingCache(os.path.join(directory, f"{name}_embeddings.db")),
+        "completion_cache": SQLiteCompletionCache(os.path.join(directory, f"{name}_completions.db")),
+    }
+
+class TestFakeClients(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.wrapper = OpenAIAPIWrapper(FakeOpenAIClient(SyntheticBackend(embedding_dimensions=8)), **temporary_caches(self.directory.name))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_wrapper_runs_on_fake_client(self):
+        response = self.wrapper.chat_completion(messages=react_messages("Multiply", REACT_STEP_POST))
+        self.assertIn("```python", response)
+        streamed = "".join(self.wrapper.chat_completion_stream(messages=react_messages("Multiply", REACT_STEP_POST)))
+        self.assertEqual(streamed, response)
+        self.assertEqual(len(self.wrapper.get_embedding("hello")["data"][0]["embedding"]), 8)
+        self.assertEqual(len(self.wrapper.get_embeddings(["a", "b", "c"])), 3)
+
+    def test_async_wrapper_runs_on_fake_client(self):
+        wrapper = AsyncOpenAIAPIWrapper(AsyncFakeOpenAIClient(SyntheticBackend(embedding_dimensions=8)), **temporary_caches(self.directory.name))
+
+        async def run():
+            response = await wrapper.chat_completion(messages=react_messages("Multiply", REACT_STEP_POST))
+            streamed = "".join([token async for token in wrapper.chat_completion_stream(messages=react_messages("Multiply", REACT_STEP_POST))])
+            return response, streamed
+
+        response, streamed = asyncio.run(run())
+        self.assertEqual(streamed, response)
+
+    @patch.dict(os.environ, {"OPENAI_BACKEND": "synthetic", "OPENAI_USE_ASYNC_CLIENT": "false"})
+    def test_configured_wrapper_selects_backend(self):
+        wrapper = get_configured_openai_wrapper()
+        self.assertIsInstance(wrapper._openai_client, FakeOpenAIClient)
+
+    @patch.dict(os.environ, {"OPENAI_BACKEND": "unknown"})
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            get_configured_openai_wrapper()
+
+class TestRecordReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cassette = os.path.join(self.directory.name, "cassette.jsonl")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_replays_recorded_responses(self):
+        recording = RecordingOpenAIClient(FakeOpenAIClient(SyntheticBackend(embedding_dimensions=8)), CassetteRecorder(self.cassette))
+        recorder = OpenAIAPIWrapper(recording, **temporary_caches(self.directory.name, "recorder"))
+        messages = react_messages("Multiply", REACT_STEP_POST)
+        recorded = recorder.chat_completion(messages=messages)
+        recorded_stream = "".join(recorder.chat_completion_stream(messages=react_messages("Divide", REACT_STEP_POST_PRIME)))
+        recorded_embedding = recorder.get_embedding("hello")
+
+        replay = OpenAIAPIWrapper(FakeOpenAIClient(ReplayBackend(self.cassette)), **temporary_caches(self.directory.name, "replay"))
+        self.assertEqual(replay.chat_completion(messages=messages), recorded)
+        self.assertEqual(replay.get_embedding("hello")["data"][0]["embedding"], recorded_embedding["data"][0]["embedding"])
+        # no exact match, e.g. a prompt with another date: served in recording order
+        self.assertEqual(replay.chat_completion(messages=react_messages("Other", REACT_STEP_POST)), recorded)
+        self.assertEqual(replay.chat_completion(messages=react_messages("Other", REACT_STEP_POST)), recorded_stream)
+
+    def test_empty_cassette_fails_without_retries(self):
+        open(self.cassette, "w").close()
+        replay = OpenAIAPIWrapper(FakeOpenAIClient(ReplayBackend(self.cassette)), **temporary_caches(self.directory.name, "replay"))
+        with self.assertRaises(CassetteMissError):
+            replay.chat_completion(messages=react_messages("Multiply", REACT_STEP_POST))
+        self.assertEqual(replay.retry_policy.stats()["attempts"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
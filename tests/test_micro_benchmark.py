@@ -0,0 +1,42 @@
+import unittest
+from benchmarks.micro import CASES, case_key, compare, measure, run
+from integrations.memoize import SQLiteConnectionPool
+
+class TestMicroBenchmark(unittest.TestCase):
+
+    def test_measure_calibrates_number_of_calls(self):
+        calls = []
+        timing = measure(lambda: calls.append(1), repeat=3, min_time=0.001)
+
+        self.assertGreater(timing["number"], 1)
+        self.assertLessEqual(timing["best"], timing["median"])
+        self.assertGreater(len(calls), 3 * timing["number"])
+
+    def test_compare_reports_cases_slower_than_allowed(self):
+        baseline = {"fast": {"best": 1.0, "median": 1.0}, "slow": {"best": 1.0, "median": 1.0}}
+        results = {
+            "fast": {"best": 1.2, "median": 1.5},
+            "slow": {"best": 1.5, "median": 1.5},
+            "new": {"best": 9.0, "median": 9.0},
+        }
+
+        regressions = compare(results, baseline, max_regression=0.25)
+
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith("slow: "))
+
+    def test_all_cases_run(self):
+        results = run(list(CASES), agent_counts=[3], dimensions=[4], repeat=1)
+
+        self.assertEqual(set(results), {case_key(name, 3, 4) for name in CASES})
+        self.assertTrue(all(timing["best"] > 0 for timing in results.values()))
+
+    def test_memoization_cases_close_their_connections(self):
+        run(["memoization.fetch_or_compute_hit", "memoization.fetch_or_compute_miss"], agent_counts=[3], dimensions=[4], repeat=1)
+
+        pools = [pool for filename, pool in SQLiteConnectionPool._pools.items() if filename.endswith("cache-3-4.db")]
+        self.assertTrue(pools)
+        self.assertTrue(all(pool._opened == 0 for pool in pools))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import unittest
+from unittest.mock import AsyncMock, Mock, patch
+from agents.agent_evaluation import AgentEvaluator
+from integrations.async_openaiwrapper import AsyncOpenAIAPIWrapper
+from integrations.model_routing import DEFAULT_ROUTE, EVALUATION_ROUTE, REACT_ROUTE, ModelRouter, Route
+from integrations.openaiwrapper import OpenAIAPIWrapper, create_endpoint_clients
+from integrations.retry_policy import RetryPolicy
+
+def completion(content, prompt_tokens=10, completion_tokens=1):
+    return Mock(choices=[Mock(message=Mock(content=content))], usage=Mock(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens))
+
+class TestModelRouter(unittest.TestCase):
+
+    @patch.dict(os.environ, {"OPENAI_FAST_MODEL": "gpt-3.5-turbo", "OPENAI_FAST_DEPLOYMENT": "fast-deployment"})
+    def test_fast_model_serves_classification_routes(self):
+        router = ModelRouter.from_environment("gpt-4")
+
+        evaluation = router.resolve(EVALUATION_ROUTE)
+        self.assertEqual((evaluation.model, evaluation.deployment, evaluation.timeout), ("gpt-3.5-turbo", "fast-deployment", 20))
+        self.assertEqual(router.resolve(REACT_ROUTE).model, "gpt-4")
+
+    @patch.dict(os.environ, {
+        "OPENAI_ROUTES": '{"react": {"model": "gpt-4-turbo", "endpoint": "west", "timeout": 90}, "evolution": {"timeout": 30}}',
+        "OPENAI_ENDPOINTS": '{"west": {"base_url": "https://west.example.com/v1"}}'
+    })
+    def test_routes_from_environment(self):
+        router = ModelRouter.from_environment("gpt-4")
+
+        react = router.resolve(REACT_ROUTE)
+        self.assertEqual((react.model, react.deployment, react.endpoint, react.timeout), ("gpt-4-turbo", "gpt-4-turbo", "west", 90))
+        self.assertEqual((router.resolve("evolution").model, router.resolve("evolution").timeout), ("gpt-4", 30))
+
+    @patch.dict(os.environ, {"OPENAI_ROUTES": '{"react": {"endpoint": "missing"}}'})
+    def test_unknown_endpoint_is_rejected(self):
+        with self.assertRaises(ValueError):
+            ModelRouter.from_environment("gpt-4")
+
+    def test_unrouted_call_sites_use_default_settings(self):
+        router = ModelRouter("gpt-4", {DEFAULT_ROUTE: Route(DEFAULT_ROUTE, "gpt-4", timeout=5)})
+
+        route = router.resolve("something")
+
+        self.assertEqual((route.name, route.model, route.timeout), ("something", "gpt-4", 5))
+
+    def test_attempt_timeout_is_the_shorter_one(self):
+        route = Route("react", "gpt-4", timeout=10)
+        self.assertEqual((route.attempt_timeout(None), route.attempt_timeout(5), route.attempt_timeout(30)), (10, 5, 10))
+        self.assertIsNone(Route("react", "gpt-4").attempt_timeout(None))
+
+    @patch.dict(os.environ, {"OPENAI_ENDPOINTS": '{"east": {"base_url": "https://east.example.com/v1"}, "azure": {"azure": true, "azure_endpoint": "https://x.openai.azure.com", "api_key": "k", "api_version": "2024-03-01-preview"}}'})
+    def test_endpoint_clients_inherit_default_settings(self):
+        clients = create_endpoint_clients(False, {"api_key": "secret"})
+
+        self.assertEqual(clients["east"].api_key, "secret")
+        self.assertEqual(str(clients["east"].base_url), "https://east.example.com/v1/")
+        self.assertEqual(clients["azure"].api_key, "k")
+
+class TestWrapperRouting(unittest.TestCase):
+
+    def setUp(self):
+        self.default_client, self.fast_client = Mock(), Mock()
+        self.fast_client.chat.completions.create.return_value = completion("5")
+        self.router = ModelRouter("gpt-4", {EVALUATION_ROUTE: Route(EVALUATION_ROUTE, "gpt-3.5-turbo", "fast-deployment", "fast", 15)}, {"fast": self.fast_client})
+        self.wrapper = OpenAIAPIWrapper(self.default_client, retry_policy=RetryPolicy(base_delay=0), completion_cache=Mock(), embedding_cache=Mock(), router=self.router)
+        self.wrapper.completion_cache.key_for.return_value = None
+
+    def test_routes_call_to_deployment_endpoint_and_timeout(self):
+        self.assertTrue(AgentEvaluator(self.wrapper).evaluate("input", "prompt", "output"))
+
+        kwargs = self.fast_client.chat.completions.create.call_args.kwargs
+        self.assertEqual((kwargs["model"], kwargs["timeout"]), ("fast-deployment", 15))
+        self.default_client.chat.completions.create.assert_not_called()
+
+    def test_reports_usage_per_route(self):
+        self.default_client.chat.completions.create.return_value = completion("answer", 100, 20)
+
+        self.wrapper.chat_completion(messages=[], route=EVALUATION_ROUTE)
+        self.wrapper.chat_completion(messages=[], route=REACT_ROUTE)
+
+        stats = self.router.stats()
+        self.assertEqual(stats[EVALUATION_ROUTE]["models"], {"gpt-3.5-turbo": 11})
+        self.assertEqual((stats[REACT_ROUTE]["calls"], stats[REACT_ROUTE]["total_tokens"]), (1, 120))
+        self.assertIn("react: 1 calls", self.router.summary())
+
+    def test_async_wrapper_routes_calls(self):
+        self.fast_client.chat.completions.create = AsyncMock(return_value=completion("5"))
+        wrapper = AsyncOpenAIAPIWrapper(Mock(), retry_policy=RetryPolicy(base_delay=0), completion_cache=Mock(), embedding_cache=Mock(), router=self.router)
+        wrapper.completion_cache.key_for.return_value = None
+
+        self.assertEqual(asyncio.run(wrapper.chat_completion(messages=[], route=EVALUATION_ROUTE)), "5")
+        self.assertEqual(self.fast_client.chat.completions.create.call_args.kwargs["model"], "fast-deployment")
+        self.assertEqual(self.router.stats()[EVALUATION_ROUTE]["calls"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import threading
+import time
+import unittest
+from unittest.mock import Mock
+from agents.agent_scheduler import AgentScheduler
+from agents.parallel_agent_executor import ParallelAgentExecutor
+from agents.race_statistics import RaceStatistics
+from integrations.usage_tracking import CallUsage, UsageTotals
+
+class RacingAgent:
+    """An agent that answers after a delay and may fail to become a working agent."""
+
+    def __init__(self, delay, succeeds, release=None, tokens=0, children=()):
+        self.delay = delay
+        self.succeeds = succeeds
+        self.release = release
+        self.working = False
+        self.deleted = False
+        self.evolve_count = 0
+        self.children = list(children)
+        self.usage = UsageTotals()
+        if tokens:
+            self.usage.add(CallUsage("gpt-4", "chat", tokens, 0, latency=tokens / 1000))
+
+    def respond(self, input_text):
+        if self.release is not None:
+            self.release.wait()
+        time.sleep(self.delay)
+        self.working = self.succeeds
+        return f"answer after {self.delay}"
+
+    def is_working_agent(self):
+        return self.working
+
+    def set_agent_deleted(self):
+        self.deleted = True
+
+    def get_children(self):
+        return self.children
+
+def executor_for(racers, **kwargs):
+    initial_agent = Mock()
+    initial_agent.is_working_agent.return_value = False
+    initial_agent.purpose_embedding = None
+    manager = Mock()
+    manager.get_or_create_agent.side_effect = [initial_agent] + racers
+    executor = ParallelAgentExecutor(manager, max_parallel_agents=len(racers), scheduler=AgentScheduler(4), race_statistics=kwargs.pop("race_statistics", RaceStatistics()), **kwargs)
+    executor.agent_name_evaluator = Mock()
+    executor.agent_name_evaluator.evaluate.return_value = True
+    return executor
+
+class TestParallelAgentExecutor(unittest.TestCase):
+
+    def test_first_successful_agent_wins(self):
+        racers = [RacingAgent(0.2, True), RacingAgent(0.01, False), RacingAgent(0.05, True)]
+
+        response = executor_for(racers).create_and_run_agents("Purpose", 2, "input")
+
+        self.assertEqual(response, "answer after 0.05")
+        self.assertEqual([racer.deleted for racer in racers], [True, True, False])
+
+    def test_losers_and_their_delegates_are_cancelled_and_savings_reported(self):
+        grandchild = RacingAgent(0, False, tokens=50)
+        loser = RacingAgent(1, True, tokens=100, children=[RacingAgent(0, False, tokens=50, children=[grandchild])])
+        winner = RacingAgent(0.01, True, tokens=1000)
+        executor = executor_for([winner, loser])
+
+        executor.create_and_run_agents("Purpose", 2, "input")
+
+        self.assertTrue(grandchild.deleted and loser.deleted)
+        self.assertFalse(winner.deleted)
+        self.assertEqual(executor.cancellation_report["agents"], 3)
+        self.assertEqual(executor.cancellation_report["tokens_used"], 200)
+        self.assertEqual(executor.cancellation_report["tokens_saved"], 800)
+        self.assertAlmostEqual(executor.cancellation_report["api_seconds_saved"], 0.8)
+
+    def test_purposes_that_usually_succeed_race_a_single_agent(self):
+        statistics = RaceStatistics()
+        cluster = statistics.cluster_for("Purpose")
+        for _ in range(10):
+            statistics.record(cluster, [(True, 0)], 1.0)
+        racers = [RacingAgent(0.01, True), RacingAgent(0.01, True)]
+
+        executor = executor_for(racers, race_statistics=statistics)
+        response = executor.create_and_run_agents("Purpose", 2, "input")
+
+        self.assertEqual(response, "answer after 0.01")
+        self.assertEqual(len(executor.agents_and_futures), 1)
+        self.assertEqual((cluster.races, cluster.successes), (11, 11))
+
+    def test_racers_cut_short_are_left_out_of_the_history(self):
+        statistics = RaceStatistics()
+        racers = [RacingAgent(0.5, True), RacingAgent(0.01, False), RacingAgent(0.05, True)]
+
+        executor_for(racers, race_statistics=statistics).create_and_run_agents("Purpose", 2, "input")
+
+        cluster = statistics.cluster_for("Purpose")
+        self.assertEqual((cluster.races, cluster.attempts, cluster.successes), (1, 2, 1))
+
+    def test_races_narrow_as_their_agents_keep_succeeding(self):
+        statistics = RaceStatistics()
+        widths = []
+        for _ in range(10):
+            racers = [RacingAgent(0.01, True), RacingAgent(0.3, True), RacingAgent(0.3, True)]
+            executor = executor_for(racers, race_statistics=statistics)
+            executor.create_and_run_agents("Purpose", 2, "input")
+            widths.append(len(executor.agents_and_futures))
+
+        self.assertEqual(widths[0], 3)
+        self.assertEqual(widths, sorted(widths, reverse=True))
+        self.assertEqual(widths[-1], 1)
+
+    def test_no_winner_when_every_agent_fails(self):
+        racers = [RacingAgent(0.01, False), RacingAgent(0.02, False)]
+        self.assertIsNone(executor_for(racers).create_and_run_agents("Purpose", 2, "input"))
+
+    def test_waiting_uses_no_cpu(self):
+        racers = [RacingAgent(0.3, True)]
+
+        started = time.process_time()
+        executor_for(racers).create_and_run_agents("Purpose", 2, "input")
+
+        self.assertLess(time.process_time() - started, 0.1)
+
+    def test_deadline_stops_waiting(self):
+        release = threading.Event()
+        racers = [RacingAgent(0, True, release)]
+
+        started = time.monotonic()
+        response = executor_for(racers, deadline=0.1).create_and_run_agents("Purpose", 2, "input")
+        release.set()
+
+        self.assertIsNone(response)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertTrue(racers[0].deleted)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import unittest
+from unittest.mock import patch
+import numpy as np
+from agents.race_statistics import RaceStatistics
+
+class TestRaceStatistics(unittest.TestCase):
+
+    def setUp(self):
+        self.statistics = RaceStatistics(success_target=0.9, budget=4)
+
+    def test_unknown_purposes_race_at_full_width(self):
+        cluster = self.statistics.cluster_for("Weather Agent")
+        self.assertEqual(self.statistics.race_width(cluster, 3), 3)
+
+    def test_reliable_purposes_race_one_agent(self):
+        cluster = self.statistics.cluster_for("Weather Agent")
+        for _ in range(10):
+            self.statistics.record(cluster, [(True, 0)], 1.0)
+
+        self.assertEqual(self.statistics.race_width(cluster, 3), 1)
+        self.assertEqual(cluster.stats()["mean_latency"], 1.0)
+
+    def test_flaky_purposes_race_more_agents(self):
+        reliable, flaky = self.statistics.cluster_for("a"), self.statistics.cluster_for("b")
+        for _ in range(4):
+            self.statistics.record(reliable, [(True, 1)], 1.0)
+            self.statistics.record(flaky, [(False, 3), (False, 3), (True, 2)], 5.0)
+
+        self.assertEqual(self.statistics.race_width(reliable, 8), 2)
+        self.assertEqual(self.statistics.race_width(flaky, 8), 6)
+        self.assertAlmostEqual(flaky.stats()["mean_evolutions"], 8 / 3)
+
+    def test_similar_purposes_share_a_cluster(self):
+        weather = self.statistics.cluster_for("Weather Agent", np.array([1.0, 0.0]))
+
+        self.assertIs(self.statistics.cluster_for("Weather Forecast Agent", np.array([0.99, 0.05])), weather)
+        self.assertIsNot(self.statistics.cluster_for("Stock Agent", np.array([0.0, 1.0])), weather)
+        self.assertIs(self.statistics.cluster_for("Weather Agent"), weather)
+
+    def test_budget_limits_concurrent_racers(self):
+        cluster = self.statistics.cluster_for("Weather Agent")
+
+        widths = [self.statistics.acquire_width(cluster, 3) for _ in range(3)]
+        self.statistics.release_width(widths[0])
+
+        self.assertEqual(widths, [3, 3, 1])
+        self.assertEqual(self.statistics.acquire_width(cluster, 3), 3)
+
+    @patch.dict(os.environ, {"MICROAGENTS_RACE_SUCCESS_TARGET": "0.8", "MICROAGENTS_RACE_BUDGET": "2"})
+    def test_configured_from_environment(self):
+        statistics = RaceStatistics.from_environment()
+        self.assertEqual((statistics.success_target, statistics.budget), (0.8, 2))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import asyncio
+import unittest
+from unittest.mock import Mock, patch
+import openai
+from integrations.openaiwrapper import OpenAIAPIWrapper
+from integrations.retry_policy import RetryPolicy
+from integrations.rate_limiter import (
+    ModelRateLimiter, RateLimiter, estimate_request_tokens, retry_after_seconds
+)
+
+def rate_limit_error(headers):
+    return Mock(status_code=429, response=Mock(headers=headers))
+
+class TestModelRateLimiter(unittest.TestCase):
+
+    def test_unlimited_limiter_never_waits(self):
+        limiter = ModelRateLimiter()
+        self.assertEqual([limiter.reserve(10_000) for _ in range(100)], [0.0] * 100)
+
+    def test_requests_beyond_burst_are_spaced_in_arrival_order(self):
+        limiter = ModelRateLimiter(requests_per_minute=60)
+        waits = [limiter.reserve(1) for _ in range(63)]
+
+        self.assertEqual(waits[:60], [0.0] * 60)
+        for expected, wait in zip([1.0, 2.0, 3.0], waits[60:]):
+            self.assertAlmostEqual(wait, expected, delta=0.05)
+
+    def test_token_budget_limits_large_requests(self):
+        limiter = ModelRateLimiter(tokens_per_minute=600)
+        self.assertEqual(limiter.reserve(600), 0.0)
+        self.assertAlmostEqual(limiter.reserve(300), 30.0, delta=0.05)
+
+    def test_penalize_pauses_model(self):
+        limiter = ModelRateLimiter()
+        limiter.penalize(5)
+
+        self.assertAlmostEqual(limiter.reserve(1), 5.0, delta=0.05)
+        self.assertEqual(limiter.stats()["rate_limited"], 1)
+
+    def test_stats_report_waits(self):
+        limiter = ModelRateLimiter(requests_per_minute=60)
+        limiter.reserve(1)
+        limiter.penalize(2)
+        limiter.reserve(1)
+
+        stats = limiter.stats()
+        self.assertEqual(stats["requests"], 2)
+        self.assertEqual(stats["waits"], 1)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertAlmostEqual(stats["max_wait_time"], 2.0, delta=0.05)
+
+    def test_acquire_async_tracks_queue_depth(self):
+        limiter = ModelRateLimiter()
+        limiter.penalize(0.05)
+
+        async def run():
+            task = asyncio.ensure_future(limiter.acquire_async(1))
+            await asyncio.sleep(0.01)
+            depth = limiter.stats()["queue_depth"]
+            await task
+            return depth
+
+        self.assertEqual(asyncio.run(run()), 1)
+        self.assertEqual(limiter.stats()["queue_depth"], 0)
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_model_limits_override_defaults(self):
+        limiter = RateLimiter(requests_per_minute=100, model_limits={"gpt-4": {"rpm": 10}})
+
+        self.assertEqual(limiter.for_model("gpt-4").requests_per_minute, 10)
+        self.assertEqual(limiter.for_model("gpt-3.5").requests_per_minute, 100)
+        self.assertIs(limiter.for_model("gpt-4"), limiter.for_model("gpt-4"))
+
+    def test_penalize_honours_retry_after(self):
+        limiter = RateLimiter()
+        self.assertEqual(limiter.penalize("gpt-4", rate_limit_error({"retry-after": "3"})), 3.0)
+
+    def test_retry_after_formats(self):
+        self.assertEqual(retry_after_seconds(rate_limit_error({"retry-after-ms": "1500"})), 1.5)
+        self.assertEqual(retry_after_seconds(rate_limit_error({"retry-after": "Thu, 01 Jan 1970 00:00:00 GMT"})), 0)
+        self.assertIsNone(retry_after_seconds(openai.OpenAIError("boom")))
+
+    def test_estimate_request_tokens_includes_completion(self):
+        kwargs = {"messages": [{"role": "user", "content": "x" * 400}], "max_tokens": 50}
+        self.assertEqual(estimate_request_tokens(kwargs), 101 + 4 + 50)
+
+class TestWrapperRateLimiting(unittest.TestCase):
+
+    def test_rate_limit_error_pauses_model_and_retries(self):
+        client = Mock()
+        error = openai.OpenAIError("Rate limit reached")
+        client.chat.completions.create.side_effect = [error, Mock(choices=[Mock(message=Mock(content="ok"))])]
+        limiter = RateLimiter()
+        wrapper = OpenAIAPIWrapper(client, embedding_cache=Mock(), rate_limiter=limiter, retry_policy=RetryPolicy(base_delay=0))
+
+        with patch("integrations.rate_limiter.RATE_LIMIT_SLEEP_DURATION", 0.01):
+            self.assertEqual(wrapper.chat_completion(model="gpt-4", messages=[]), "ok")
+
+        stats = limiter.stats()["gpt-4"]
+        self.assertEqual(stats["requests"], 2)
+        self.assertEqual(stats["rate_limited"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
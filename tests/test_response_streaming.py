@@ -0,0 +1,98 @@
+import unittest
+from unittest.mock import Mock
+from agents.agent_response import AgentResponse
+from agents.response_streaming import action_end, agent_invocations, current_token_listener, read_until_action, stream_tokens_to
+from integrations.openaiwrapper import OpenAIAPIWrapper
+
+def chunk(content):
+    return Mock(choices=[Mock(delta=Mock(content=content))])
+
+class ClosableStream:
+    def __init__(self, items):
+        self.items = items
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        for item in self.items:
+            self.read += 1
+            yield item
+
+    def close(self):
+        self.closed = True
+
+class TestResponseStreaming(unittest.TestCase):
+
+    def test_action_end(self):
+        self.assertIsNone(action_end("Thought: I should Use Agent[Weather"))
+        self.assertIsNone(action_end("Use Agent[Weather:Paris] and"))
+        self.assertEqual(action_end("Use Agent[Weather:Paris]\nObservation: sunny"), len("Use Agent[Weather:Paris]"))
+        self.assertEqual(action_end("Use Agent[A:1] and Use Agent[B:2]\nOutput: made up"), len("Use Agent[A:1] and Use Agent[B:2]"))
+        self.assertIsNone(action_end("```python\nprint(1)\n"))
+        self.assertEqual(action_end("```python\nprint(1)\n``` trailing"), len("```python\nprint(1)\n```"))
+
+    def test_read_until_action_stops_early(self):
+        stream = ClosableStream(["Thought: ask. ", "Use Agent[Wea", "ther:Paris]", "\nObservation: made up", " more"])
+        tokens = []
+
+        response = read_until_action(stream, tokens.append)
+
+        self.assertEqual(response, "Thought: ask. Use Agent[Weather:Paris]")
+        self.assertEqual(stream.read, 4)
+        self.assertTrue(stream.closed)
+        self.assertEqual(tokens, stream.items[:4])
+
+    def test_agent_invocations_of_the_action(self):
+        step = "Thought: split. Use Agent[A:1]\n2. Use Agent[B:2]\nObservation: Use Agent[C:3]"
+        self.assertEqual(agent_invocations(step), ["Use Agent[A:1]", "Use Agent[B:2]"])
+        self.assertEqual(agent_invocations("No action"), [])
+
+    def test_read_until_action_reads_whole_step_without_action(self):
+        self.assertEqual(read_until_action(ClosableStream(["Query ", "Solved "])), "Query Solved")
+
+    def test_listener_is_scoped(self):
+        listener = Mock()
+        with stream_tokens_to(listener):
+            self.assertIs(current_token_listener(), listener)
+            with stream_tokens_to(None):
+                self.assertIsNone(current_token_listener())
+        self.assertIsNone(current_token_listener())
+
+class TestWrapperStreaming(unittest.TestCase):
+
+    def test_chat_completion_stream_yields_content_and_closes(self):
+        client = Mock()
+        stream = ClosableStream([chunk("Hel"), Mock(choices=[]), chunk(None), chunk("lo")])
+        client.chat.completions.create.return_value = stream
+        wrapper = OpenAIAPIWrapper(client, embedding_cache=Mock())
+
+        self.assertEqual(list(wrapper.chat_completion_stream(messages=[])), ["Hel", "lo"])
+        self.assertTrue(client.chat.completions.create.call_args.kwargs["stream"])
+        self.assertTrue(stream.closed)
+
+class TestAgentResponseStreaming(unittest.TestCase):
+
+    def test_final_answer_is_streamed_to_listener(self):
+        openai_wrapper = Mock()
+        openai_wrapper.chat_completion_stream.return_value = iter(["The answer", " is 42. "])
+        agent = Mock(purpose="Bootstrap Agent")
+        response = AgentResponse(openai_wrapper, None, None, agent, None, 1)
+        tokens = []
+
+        with stream_tokens_to(lambda token, is_final_answer: tokens.append((token, is_final_answer))):
+            output = response._conclude_output("conversation", "question")
+
+        self.assertEqual(output, "The answer is 42.")
+        self.assertEqual(tokens, [("The answer", True), (" is 42. ", True)])
+        openai_wrapper.chat_completion.assert_not_called()
+
+    def test_without_listener_or_flag_responses_are_not_streamed(self):
+        openai_wrapper = Mock()
+        openai_wrapper.chat_completion.return_value = "Use Agent[Weather:Paris]"
+        response = AgentResponse(openai_wrapper, None, None, Mock(), None, 1)
+
+        self.assertEqual(response._generate_chat_response("system", "react"), "Use Agent[Weather:Paris]")
+        openai_wrapper.chat_completion_stream.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import asyncio
+import unittest
+from unittest.mock import Mock
+import httpx
+import openai
+from integrations.retry_policy import RetryPolicy, is_retryable_error
+
+def status_error(status_code):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(status_code, request=request)
+    return openai.APIStatusError("error", response=response, body=None)
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_backoff_is_jittered_below_exponential_cap(self):
+        policy = RetryPolicy(base_delay=1, max_delay=5)
+
+        for attempt, cap in [(1, 1), (2, 2), (3, 4), (4, 5), (10, 5)]:
+            delays = [policy.backoff(attempt) for _ in range(50)]
+            self.assertTrue(all(0 <= delay <= cap for delay in delays))
+            self.assertGreater(len(set(delays)), 1)
+
+    def test_retries_until_success(self):
+        request = Mock(side_effect=[openai.OpenAIError("boom"), openai.OpenAIError("boom"), "ok"])
+        policy = RetryPolicy(base_delay=0)
+
+        self.assertEqual(policy.run(request), "ok")
+        self.assertEqual(request.call_count, 3)
+        stats = policy.stats()
+        self.assertEqual((stats["attempts"], stats["retries"], stats["failures"]), (3, 2, 0))
+
+    def test_gives_up_after_max_attempts(self):
+        request = Mock(side_effect=openai.OpenAIError("boom"))
+
+        with self.assertRaises(openai.OpenAIError):
+            RetryPolicy(max_attempts=3, base_delay=0).run(request)
+        self.assertEqual(request.call_count, 3)
+
+    def test_fatal_errors_are_not_retried(self):
+        request = Mock(side_effect=status_error(401))
+
+        with self.assertRaises(openai.APIStatusError):
+            RetryPolicy(base_delay=0).run(request)
+        self.assertEqual(request.call_count, 1)
+
+    def test_error_classification(self):
+        self.assertTrue(is_retryable_error(status_error(429)))
+        self.assertTrue(is_retryable_error(status_error(503)))
+        self.assertFalse(is_retryable_error(status_error(400)))
+        self.assertFalse(is_retryable_error(ValueError("bug")))
+
+    def test_deadline_stops_retries(self):
+        request = Mock(side_effect=openai.OpenAIError("Rate limit reached"))
+        policy = RetryPolicy(base_delay=0, deadline=1)
+
+        with self.assertRaises(TimeoutError):
+            policy.run(request, on_error=lambda error: 5)
+        self.assertEqual(request.call_count, 1)
+
+    def test_attempt_timeout_is_passed_to_request(self):
+        request = Mock(return_value="ok")
+
+        RetryPolicy(attempt_timeout=2, deadline=10).run(request)
+        self.assertAlmostEqual(request.call_args.args[0], 2, delta=0.01)
+        RetryPolicy().run(request)
+        self.assertIsNone(request.call_args.args[0])
+
+    def test_run_async(self):
+        calls = []
+
+        async def request(timeout):
+            calls.append(timeout)
+            if len(calls) == 1:
+                raise openai.OpenAIError("boom")
+            return "ok"
+
+        self.assertEqual(asyncio.run(RetryPolicy(base_delay=0).run_async(request)), "ok")
+        self.assertEqual(len(calls), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import numpy as np
+from agents.agent_embedding_index import AgentEmbeddingIndex
+from agents.similarity_threshold import (
+    SimilarityThresholdEstimator, DEFAULT_SIMILARITY_THRESHOLD, MIN_AGENTS_FOR_THRESHOLD
+)
+
+class IndexedAgent:
+    def __init__(self, agent_id, embedding):
+        self.id = agent_id
+        self.purpose = agent_id
+        self.purpose_embedding = embedding
+
+def exact_threshold(embeddings):
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    gram = normalized @ normalized.T
+    return np.percentile(gram[np.triu_indices(len(embeddings), k=1)], 98)
+
+class TestSimilarityThresholdEstimator(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.embeddings = rng.normal(size=(MIN_AGENTS_FOR_THRESHOLD + 50, 16))
+        self.agents = [IndexedAgent(str(i), e) for i, e in enumerate(self.embeddings)]
+
+    def test_default_threshold_below_minimum_agent_count(self):
+        index = AgentEmbeddingIndex()
+        for agent in self.agents[:10]:
+            index.add(agent)
+        self.assertEqual(index.similarity_threshold, DEFAULT_SIMILARITY_THRESHOLD)
+
+    def test_sketch_matches_exact_percentile(self):
+        index = AgentEmbeddingIndex()
+        for agent in self.agents:
+            index.add(agent)
+
+        self.assertAlmostEqual(index.similarity_threshold, exact_threshold(self.embeddings), delta=2e-3)
+
+    def test_removal_updates_threshold(self):
+        index = AgentEmbeddingIndex()
+        for agent in self.agents:
+            index.add(agent)
+        for agent in self.agents[:20]:
+            index.remove(agent)
+
+        self.assertEqual(index.threshold_estimator.pair_count, (len(self.agents) - 20) * (len(self.agents) - 21) // 2)
+        self.assertAlmostEqual(index.similarity_threshold, exact_threshold(self.embeddings[20:]), delta=2e-3)
+
+    def test_exact_recompute_is_preferred_while_current(self):
+        index = AgentEmbeddingIndex(SimilarityThresholdEstimator())
+        for agent in self.agents:
+            index.add(agent)
+
+        exact = index.threshold_estimator.recompute_exact(index.snapshot())
+
+        self.assertEqual(index.similarity_threshold, exact)
+        self.assertAlmostEqual(exact, exact_threshold(self.embeddings), places=6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import Mock
+from integrations.openaiwrapper import OpenAIAPIWrapper
+from integrations.single_flight import AsyncSingleFlight, SingleFlight
+
+def completion(content):
+    return Mock(choices=[Mock(message=Mock(content=content))])
+
+def run_concurrently(func, count):
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(i):
+        barrier.wait()
+        results[i] = func()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        func = Mock(side_effect=lambda: time.sleep(0.1) or "result")
+
+        results = run_concurrently(lambda: flight.do("key", func), 5)
+
+        self.assertEqual(results, ["result"] * 5)
+        self.assertEqual(func.call_count, 1)
+        self.assertEqual(flight.stats(), {"executions": 1, "coalesced": 4, "in_flight": 0})
+
+    def test_sequential_calls_are_not_cached(self):
+        flight = SingleFlight()
+        func = Mock(return_value="result")
+
+        flight.do("key", func)
+        flight.do("key", func)
+
+        self.assertEqual(func.call_count, 2)
+
+    def test_errors_are_shared_and_cleared(self):
+        flight = SingleFlight()
+
+        with self.assertRaises(ValueError):
+            flight.do("key", Mock(side_effect=ValueError("boom")))
+        self.assertEqual(flight.do("key", lambda: "ok"), "ok")
+
+    def test_async_calls_share_one_execution(self):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def request():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        async def run():
+            return await asyncio.gather(*[flight.do("key", request) for _ in range(5)])
+
+        self.assertEqual(asyncio.run(run()), ["result"] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_async_call_is_cancelled_with_its_last_waiter(self):
+        flight = AsyncSingleFlight()
+        started, cancelled = asyncio.Event(), []
+
+        async def request():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+
+        async def run():
+            first, second = asyncio.ensure_future(flight.do("key", request)), asyncio.ensure_future(flight.do("key", request))
+            await started.wait()
+            first.cancel()
+            await asyncio.sleep(0.01)
+            self.assertEqual(cancelled, [])
+            second.cancel()
+            await asyncio.gather(first, second, return_exceptions=True)
+            await asyncio.sleep(0.01)
+
+        asyncio.run(run())
+        self.assertEqual(cancelled, [1])
+        self.assertEqual(flight.stats()["in_flight"], 0)
+
+class TestWrapperSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Mock()
+        self.client.chat.completions.create.side_effect = lambda **kwargs: time.sleep(0.1) or completion("answer")
+        embedding_cache = Mock()
+        embedding_cache.get.return_value = None
+        completion_cache = Mock()
+        completion_cache.key_for.return_value = None
+        self.wrapper = OpenAIAPIWrapper(self.client, embedding_cache=embedding_cache, completion_cache=completion_cache)
+
+    def test_identical_deterministic_completions_are_coalesced(self):
+        results = run_concurrently(lambda: self.wrapper.chat_completion(messages=[], temperature=0), 4)
+
+        self.assertEqual(results, ["answer"] * 4)
+        self.assertEqual(self.client.chat.completions.create.call_count, 1)
+
+    def test_sampled_completions_are_not_coalesced(self):
+        run_concurrently(lambda: self.wrapper.chat_completion(messages=[]), 3)
+
+        self.assertEqual(self.client.chat.completions.create.call_count, 3)
+
+    def test_identical_embeddings_are_coalesced(self):
+        response = Mock(model="ada", usage=Mock(prompt_tokens=1, total_tokens=1), data=[Mock(embedding=[0.1], index=0)])
+        self.client.embeddings.create.side_effect = lambda **kwargs: time.sleep(0.1) or response
+
+        results = run_concurrently(lambda: self.wrapper.get_embedding("purpose"), 4)
+
+        self.assertEqual(self.client.embeddings.create.call_count, 1)
+        self.assertTrue(all(result["data"][0]["embedding"] == [0.1] for result in results))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
 import unittest
+import unittest.mock
 from unittest.mock import MagicMock
-from integrations.memoize import SQLiteMemoization, memoize_to_sqlite
+from integrations.embedding_cache import SQLiteEmbeddingCache
+from integrations.memoize import SQLiteMemoization, SQLiteConnectionPool, memoize_to_sqlite
 import uuid
 import os
 
@@ -14,6 +16,7 @@ class TestSQLiteMemoization(unittest.TestCase):
     @classmethod
     def tearDownClass(cls):
         cls.memoizer.__exit__(None, None, None)
+        SQLiteConnectionPool.close_all()
         os.remove(cls.db_file)
 
     def test_initialization_creates_cache_table(self):
@@ -46,6 +49,33 @@ class TestSQLiteMemoization(unittest.TestCase):
         self.assertEqual(ping(unique_arg), "pong")
         return_pong.assert_not_called()
 
+    def test_memoization_decorator_serves_hot_keys_from_memory(self):
+        return_pong = MagicMock(return_value={"answer": "pong"})
+        unique_arg = uuid.uuid4().hex
+
+        @memoize_to_sqlite('test_lru_func', self.db_file)
+        def ping(arg):
+            return return_pong(arg)
+
+        ping(unique_arg)
+        with unittest.mock.patch.object(SQLiteMemoization, '_fetch_from_cache') as fetch:
+            self.assertEqual(ping(unique_arg), {"answer": "pong"})
+            fetch.assert_not_called()
+        return_pong.assert_called_once()
+
+    def test_connections_are_reused_across_calls(self):
+        with SQLiteMemoization(self.db_file) as memoizer:
+            first_connection = memoizer.connection
+        with SQLiteMemoization(self.db_file) as memoizer:
+            self.assertIs(memoizer.connection, first_connection)
+
+    def test_stores_sharing_the_file_each_get_their_schema(self):
+        embedding_cache = SQLiteEmbeddingCache(self.db_file)
+
+        embedding_cache.put("ada", "shared", [1.0, 2.0])
+
+        self.assertEqual(list(embedding_cache.get("ada", "shared")), [1.0, 2.0])
+
     def test_resource_management_closes_connection(self):
         with SQLiteMemoization(self.db_file) as memoizer:
             self.assertIsNotNone(memoizer.connection, "Connection should be established")
@@ -0,0 +1,109 @@
+import threading
+import unittest
+from unittest.mock import Mock
+import openai
+from agents.agent_serializer import AgentSerializer
+from agents.microagent import MicroAgent
+from integrations.fake_llm import FakeOpenAIClient, SyntheticBackend
+from integrations.openaiwrapper import OpenAIAPIWrapper
+from integrations.retry_policy import RetryPolicy
+from integrations.usage_tracking import CallUsage, UsageTotals, estimate_cost, record_usage, track_agent, track_request
+
+class TestUsageTotals(unittest.TestCase):
+
+    def test_adds_calls(self):
+        totals = UsageTotals()
+        totals.add(CallUsage("gpt-4", "chat", 1000, 500, latency=2.0, retries=1))
+        totals.add(CallUsage("gpt-4", "chat", cached=True))
+
+        self.assertEqual((totals.calls, totals.cached_calls, totals.total_tokens, totals.retries), (2, 1, 1500, 1))
+        self.assertAlmostEqual(totals.cost, 0.06)
+        self.assertEqual(totals.models, {"gpt-4": 1500})
+
+    def test_round_trips_through_dict(self):
+        totals = UsageTotals()
+        totals.add(CallUsage("gpt-4", "chat", 10, 5, latency=0.5))
+
+        restored = UsageTotals.from_dict(totals.to_dict())
+
+        self.assertEqual(restored.to_dict(), totals.to_dict())
+        self.assertEqual(UsageTotals.from_dict({}).calls, 0)
+
+    def test_unknown_models_cost_nothing(self):
+        self.assertEqual(estimate_cost("my-azure-deployment", 1000, 1000), 0.0)
+
+class TestAttribution(unittest.TestCase):
+
+    def test_calls_are_charged_to_innermost_agent_and_all_requests(self):
+        request, parent, child = UsageTotals(), UsageTotals(), UsageTotals()
+
+        with track_request(request):
+            with track_agent(parent):
+                record_usage(CallUsage("gpt-4", "chat", 10, 0))
+                with track_agent(child):
+                    record_usage(CallUsage("gpt-4", "chat", 20, 0))
+                record_usage(CallUsage("gpt-4", "chat", 30, 0))
+        record_usage(CallUsage("gpt-4", "chat", 40, 0))
+
+        self.assertEqual((request.total_tokens, parent.total_tokens, child.total_tokens), (60, 40, 20))
+
+    def test_other_threads_are_not_tracked(self):
+        request = UsageTotals()
+        with track_request(request):
+            thread = threading.Thread(target=record_usage, args=(CallUsage("gpt-4", "chat", 10, 0),))
+            thread.start()
+            thread.join()
+        self.assertEqual(request.calls, 0)
+
+class TestWrapperUsage(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Mock()
+        self.wrapper = OpenAIAPIWrapper(self.client, retry_policy=RetryPolicy(base_delay=0), completion_cache=Mock(), embedding_cache=Mock())
+        self.wrapper.completion_cache.key_for.return_value = None
+        self.wrapper.embedding_cache.get.return_value = None
+
+    def test_records_completion_tokens_and_retries(self):
+        response = Mock(choices=[Mock(message=Mock(content="answer"))], usage=Mock(prompt_tokens=12, completion_tokens=3))
+        self.client.chat.completions.create.side_effect = [openai.APIConnectionError(request=Mock()), response]
+
+        with track_request(UsageTotals()) as usage:
+            self.assertEqual(self.wrapper.chat_completion(model="gpt-4", messages=[{"role": "user", "content": "hi"}]), "answer")
+
+        self.assertEqual((usage.calls, usage.prompt_tokens, usage.completion_tokens, usage.retries), (1, 12, 3, 1))
+        self.assertEqual(usage.models, {"gpt-4": 15})
+
+    def test_records_cached_completions_without_tokens(self):
+        self.wrapper.completion_cache.key_for.return_value = "key"
+        self.wrapper.completion_cache.get.return_value = "cached answer"
+
+        with track_request(UsageTotals()) as usage:
+            self.wrapper.chat_completion(model="gpt-4", messages=[], temperature=0, cache=True)
+
+        self.assertEqual((usage.calls, usage.cached_calls, usage.total_tokens), (1, 1, 0))
+
+    def test_records_embeddings_and_estimated_stream_tokens(self):
+        wrapper = OpenAIAPIWrapper(FakeOpenAIClient(SyntheticBackend(embedding_dimensions=4)), completion_cache=Mock(), embedding_cache=Mock())
+        wrapper.embedding_cache.get.return_value = None
+
+        with track_request(UsageTotals()) as usage:
+            wrapper.get_embedding("hello world")
+            "".join(wrapper.chat_completion_stream(messages=[{"role": "system", "content": "Please rate this"}]))
+
+        self.assertEqual(usage.calls, 2)
+        self.assertEqual(usage.completion_tokens, 1)
+        self.assertGreater(usage.prompt_tokens, 0)
+
+class TestAgentUsage(unittest.TestCase):
+
+    def test_agent_usage_is_persisted(self):
+        wrapper = OpenAIAPIWrapper("api_key")
+        agent = MicroAgent("prompt", "purpose", 2, Mock(), wrapper)
+        agent.usage.add(CallUsage("gpt-4", "chat", 100, 20))
+
+        restored = AgentSerializer.from_dict(AgentSerializer.to_dict(agent), Mock(), wrapper)
+
+        self.assertEqual(restored.usage.total_tokens, 120)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -27,7 +27,7 @@ class MicroAgentsTable(DataTable):
 
     def add_columns(self):
         """Adds columns to the table."""
-        headers = ("Agent", "Evolve\nCount", "Code\nExecutions", "Active\nAgents",
+        headers = ("Agent", "Evolve\nCount", "Code\nExecutions", "Tokens", "Cost\n($)", "Active\nAgents",
                    "Usage\nCount", "Depth", "Working?", "Last\nInput", "Status")
         for header in headers:
             self.add_column(header)
\ No newline at end of file
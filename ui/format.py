@@ -20,6 +20,7 @@ def display_agent_info(manager, stop_event, outputs):
             "👤", 
             "🔁", 
             "💻", 
+            "🪙", 
             "📈", 
             "🌟", 
             "💡", 
@@ -38,6 +39,7 @@ def display_agent_info(manager, stop_event, outputs):
                 active_agents, 
                 agent.evolve_count, 
                 agent.number_of_code_executions,
+                agent.usage.total_tokens,
                 agent.usage_count,
                 agent.depth,
                 "✅" if agent.working_agent else "❌",
@@ -73,6 +75,7 @@ def print_agent_statistics(agent):
     stats = [
         f"🔁 Evolve Count: {agent.evolve_count}",
         f"💻 Code Executions: {agent.number_of_code_executions}",
+        f"🪙 API Usage: {agent.usage.summary()}",
         f"👥 Active Agents: {agent.active_agents}",
         f"📈 Usage Count: {agent.usage_count}",
         f"🏔️ Max Depth: {agent.max_depth}",
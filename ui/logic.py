@@ -5,6 +5,8 @@ from ui.format import format_text
 from rich.text import Text
 from utils.utility import get_env_variable
 from integrations.openaiwrapper import get_configured_openai_wrapper
+from agents.response_streaming import stream_tokens_to
+from integrations.usage_tracking import UsageTotals, track_request
 
 class MicroAgentsLogic:
     def __init__(self, app):
@@ -31,8 +33,27 @@ class MicroAgentsLogic:
         self.app.run_worker(self.get_agent_info, thread=True, group="display_agent_info")
 
         self.app.sub_title = user_input
-        agent = self.manager.get_or_create_agent("Bootstrap Agent", depth=1, sample_input=user_input)
-        return agent.respond(user_input)
+        usage = UsageTotals()
+        with track_request(usage):
+            agent = self.manager.get_or_create_agent("Bootstrap Agent", depth=1, sample_input=user_input)
+            with stream_tokens_to(self._react_step_writer()):
+                response = agent.respond(user_input)
+        self.app.call_from_thread(self.app.rlog.write, f"🪙 API usage: {usage.summary()}")
+        return response
+
+    def _react_step_writer(self):
+        """Returns a token listener writing streamed ReAct steps to the log line by line."""
+        pending = [""]
+
+        def listener(token, is_final_answer):
+            if is_final_answer:
+                return
+            *lines, pending[0] = (pending[0] + token).split("\n")
+            for line in lines:
+                if line.strip():
+                    self.app.call_from_thread(self.app.rlog.write, line)
+
+        return listener
 
     def on_worker_state_changed(self, event: Worker.StateChanged):
         if event.state in (WorkerState.SUCCESS,):
@@ -75,6 +96,8 @@ class MicroAgentsLogic:
             table_data.append([agent.purpose,
                                agent.evolve_count,
                                agent.number_of_code_executions,
+                               agent.usage.total_tokens,
+                               f"{agent.usage.cost:.4f}",
                                active_agents,
                                agent.usage_count,
                                agent.depth,
@@ -95,6 +118,7 @@ class MicroAgentsLogic:
             self.app.rlog.write(f"📊 Stats for {agent.purpose} :")
             self.app.rlog.write(f"🔁 Evolve Count: {agent.evolve_count}")
             self.app.rlog.write(f"💻 Code Executions: {agent.number_of_code_executions}")
+            self.app.rlog.write(f"🪙 API Usage: {agent.usage.summary()}")
             self.app.rlog.write(f"👥 Active Agents: {agent.active_agents}")
             self.app.rlog.write(f"📈 Usage Count: {agent.usage_count}")
             self.app.rlog.write(f"🏔 Max Depth:  {agent.max_depth}")